@@ -0,0 +1,312 @@
+"""
+Hyperliquid Rebalancer V2 - Rapport d'analyse des rééquilibrages
+==================================================
+Lit l'historique colonnaire (snapshots et exécutions, voir snapshot_store.py) et calcule,
+par actif et par wallet, sur la fenêtre demandée :
+
+- rebalances    : nombre d'ordres exécutés (achats / ventes)
+- turnover      : volume échangé en USD, et en multiple de la cible moyenne (hold_usd)
+- frais         : somme de notional * fee_pct ; "drag" = frais / cible moyenne
+- dans la bande : part du temps où la déviation reste entre -buy_threshold et +sell_threshold
+                  (pondérée par la durée entre deux cycles, plafonnée par --max-gap)
+- slippage      : écart du prix moyen d'exécution au mid de décision, en bps
+                  (positif = défavorable), pondéré par le notionnel
+
+Les colonnes sont chargées avec numpy.fromfile et tous les agrégats sont calculés par
+np.bincount sur une clé (wallet, actif, type), sans boucle Python par ligne.
+
+Usage:
+    python analytics.py                       # Tous les wallets, 30 derniers jours
+    python analytics.py --wallet 3 --days 90  # Un wallet, 90 jours
+    python analytics.py --csv rapport.csv     # Export de toutes les lignes par actif
+"""
+
+import os
+import csv
+import time
+import argparse
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from snapshot_store import (
+    SnapshotStore, COLUMNS, FILL_COLUMNS, FILLS_TABLE, KIND_PERP, DEFAULT_SNAPSHOT_DIR
+)
+
+try:
+    import numpy as np
+except ImportError:
+    print("❌ Erreur: La dépendance 'numpy' n'est pas installée (nécessaire pour analytics.py).")
+    print("   Veuillez exécuter : pip install numpy")
+    exit(1)
+
+# Durée maximale (secondes) comptée entre deux cycles consécutifs d'un actif (bot arrêté au-delà)
+DEFAULT_MAX_GAP_SECONDS = 600
+
+SNAPSHOT_FIELDS = ["ts", "asset", "kind", "notional", "target", "deviation", "buy_thr", "sell_thr"]
+FILL_FIELDS = ["ts", "asset", "kind", "side", "notional", "price", "mid", "fee_pct"]
+
+
+def _np_dtype(typecode: str) -> "np.dtype":
+    """dtype numpy équivalent à un typecode `array` (même taille d'élément)"""
+    itemsize = array(typecode).itemsize
+    if typecode in ("f", "d"):
+        return np.dtype(f"f{itemsize}")
+    if typecode in ("b", "h", "i", "l", "q"):
+        return np.dtype(f"i{itemsize}")
+    return np.dtype(f"u{itemsize}")
+
+
+def _load_partition(directory: str, fields: List[str], columns: Dict[str, str],
+                    start_ts: float, end_ts: float) -> Optional[Dict[str, "np.ndarray"]]:
+    """Colonnes d'une partition restreintes à [start_ts, end_ts] (None si absente ou vide)"""
+    loaded = {}
+    for name in fields:
+        path = os.path.join(directory, f"{name}.col")
+        if not os.path.exists(path):
+            return None
+        loaded[name] = np.fromfile(path, dtype=_np_dtype(columns[name]))
+    length = min(len(values) for values in loaded.values())
+    if length == 0:
+        return None
+    ts = loaded["ts"][:length]
+    lo = np.searchsorted(ts, start_ts, side="left")
+    hi = np.searchsorted(ts, end_ts, side="right")
+    if hi <= lo:
+        return None
+    return {name: values[lo:hi] for name, values in loaded.items()}
+
+
+def _load_wallet(store: SnapshotStore, wallet_id: int, table: str, fields: List[str],
+                 start_ts: float, end_ts: float) -> Optional[Dict[str, "np.ndarray"]]:
+    """Concatène les partitions d'un wallet (ordre chronologique)"""
+    columns = FILL_COLUMNS if table == FILLS_TABLE else COLUMNS
+    parts = []
+    for day in store.days(wallet_id, start_ts, end_ts):
+        part = _load_partition(store.partition_dir(wallet_id, day, table), fields, columns, start_ts, end_ts)
+        if part is not None:
+            parts.append(part)
+    if not parts:
+        return None
+    return {name: np.concatenate([p[name] for p in parts]) for name in fields}
+
+
+def _bincount(keys: "np.ndarray", weights: Optional["np.ndarray"], size: int) -> "np.ndarray":
+    return np.bincount(keys, weights=weights, minlength=size)[:size].astype(np.float64)
+
+# =============================================================================
+# ACCUMULATION
+# =============================================================================
+
+class Report:
+    """
+    Agrégats par clé (wallet, actif, type). Chaque wallet est traité puis libéré,
+    la mémoire reste bornée par l'historique d'un seul wallet.
+    """
+
+    SUMS = ["samples", "target_sum", "abs_dev_sum", "in_band_s", "observed_s",
+            "fills", "buys", "turnover", "fees", "slip_weighted"]
+
+    def __init__(self):
+        self.labels: List[Tuple[int, str, str]] = []  # (wallet_id, actif, "spot"/"perp")
+        self.max_abs_dev: List["np.ndarray"] = []
+        self.chunks: Dict[str, List["np.ndarray"]] = {name: [] for name in self.SUMS}
+
+    def add_wallet(self, store: SnapshotStore, wallet_id: int, start_ts: float, end_ts: float,
+                   max_gap: float) -> None:
+        snaps = _load_wallet(store, wallet_id, "", SNAPSHOT_FIELDS, start_ts, end_ts)
+        fills = _load_wallet(store, wallet_id, FILLS_TABLE, FILL_FIELDS, start_ts, end_ts)
+        # Le dictionnaire est lu après les données : un id écrit y est toujours déjà déclaré
+        names = store.assets(wallet_id)
+        if not names or (snaps is None and fills is None):
+            return
+        # Clé locale : asset_id * 2 + kind (un même nom peut exister en spot et en perp)
+        size = len(names) * 2
+        sums = {name: np.zeros(size) for name in self.SUMS}
+        max_abs_dev = np.zeros(size)
+
+        if snaps is not None:
+            keys = snaps["asset"].astype(np.int64) * 2 + snaps["kind"]
+            deviation = snaps["deviation"]
+            sums["samples"] = _bincount(keys, None, size)
+            sums["target_sum"] = _bincount(keys, snaps["target"], size)
+            sums["abs_dev_sum"] = _bincount(keys, np.abs(deviation), size)
+            np.maximum.at(max_abs_dev, keys, np.abs(deviation))
+
+            # Durée de chaque intervalle (cycle i -> cycle suivant du même actif), attribuée à l'état du cycle i
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            ts = snaps["ts"][order]
+            same = sorted_keys[1:] == sorted_keys[:-1]
+            dt = np.where(same, np.minimum(np.diff(ts), max_gap), 0.0)
+            dev = deviation[order][:-1]
+            in_band = (dev > -snaps["buy_thr"][order][:-1]) & (dev < snaps["sell_thr"][order][:-1])
+            sums["observed_s"] = _bincount(sorted_keys[:-1], dt, size)
+            sums["in_band_s"] = _bincount(sorted_keys[:-1], dt * in_band, size)
+
+        if fills is not None:
+            keys = fills["asset"].astype(np.int64) * 2 + fills["kind"]
+            notional = fills["notional"]
+            mid = fills["mid"]
+            # Slippage signé : achat au-dessus du mid / vente en dessous = défavorable (> 0)
+            slippage_bps = np.where(mid > 0, fills["side"] * (fills["price"] - mid) / np.where(mid > 0, mid, 1.0), 0.0) * 1e4
+            sums["fills"] = _bincount(keys, None, size)
+            sums["buys"] = _bincount(keys, (fills["side"] > 0).astype(np.float64), size)
+            sums["turnover"] = _bincount(keys, notional, size)
+            sums["fees"] = _bincount(keys, notional * fills["fee_pct"] / 100, size)
+            sums["slip_weighted"] = _bincount(keys, slippage_bps * notional, size)
+
+        present = np.nonzero((sums["samples"] > 0) | (sums["fills"] > 0))[0]
+        for key in present:
+            self.labels.append((wallet_id, names[key // 2], "perp" if key % 2 == KIND_PERP else "spot"))
+        for name in self.SUMS:
+            self.chunks[name].append(sums[name][present])
+        self.max_abs_dev.append(max_abs_dev[present])
+
+    def table(self) -> Dict[str, "np.ndarray"]:
+        """Statistiques par actif (tableaux alignés sur self.labels)"""
+        if not self.labels:
+            return {}
+        s = {name: np.concatenate(chunks) for name, chunks in self.chunks.items()}
+        samples = np.maximum(s["samples"], 1)
+        mean_target = s["target_sum"] / samples
+        safe_target = np.where(mean_target > 0, mean_target, np.nan)
+        return {
+            "wallet": np.array([label[0] for label in self.labels]),
+            "fills": s["fills"],
+            "buys": s["buys"],
+            "sells": s["fills"] - s["buys"],
+            "turnover": s["turnover"],
+            "turnover_x": s["turnover"] / safe_target,
+            "fees": s["fees"],
+            "fee_drag_pct": s["fees"] / safe_target * 100,
+            "in_band_pct": np.where(s["observed_s"] > 0, s["in_band_s"] / np.maximum(s["observed_s"], 1e-9) * 100, np.nan),
+            "mean_abs_dev": s["abs_dev_sum"] / samples,
+            "max_abs_dev": np.concatenate(self.max_abs_dev),
+            "slippage_bps": np.where(s["turnover"] > 0, s["slip_weighted"] / np.maximum(s["turnover"], 1e-12), np.nan),
+            "mean_target": mean_target,
+            # Sommes brutes pour l'agrégation par wallet
+            "_in_band_s": s["in_band_s"],
+            "_observed_s": s["observed_s"],
+            "_slip_weighted": s["slip_weighted"],
+        }
+
+
+def wallet_table(stats: Dict[str, "np.ndarray"]) -> Dict[str, "np.ndarray"]:
+    """Agrège les statistiques par actif au niveau wallet"""
+    wallets, index = np.unique(stats["wallet"], return_inverse=True)
+    n = len(wallets)
+
+    def total(column: str) -> "np.ndarray":
+        return np.bincount(index, weights=np.nan_to_num(stats[column]), minlength=n)
+
+    turnover = total("turnover")
+    fees = total("fees")
+    targets = total("mean_target")
+    observed = total("_observed_s")
+    safe_targets = np.where(targets > 0, targets, np.nan)
+    return {
+        "wallet": wallets,
+        "assets": np.bincount(index, minlength=n).astype(np.float64),
+        "fills": total("fills"),
+        "turnover": turnover,
+        "turnover_x": turnover / safe_targets,
+        "fees": fees,
+        "fee_drag_pct": fees / safe_targets * 100,
+        "in_band_pct": np.where(observed > 0, total("_in_band_s") / np.maximum(observed, 1e-9) * 100, np.nan),
+        "slippage_bps": np.where(turnover > 0, total("_slip_weighted") / np.maximum(turnover, 1e-12), np.nan),
+        "mean_target": targets,
+    }
+
+# =============================================================================
+# AFFICHAGE
+# =============================================================================
+
+def _fmt(value: float, spec: str) -> str:
+    return "-" if np.isnan(value) else format(value, spec)
+
+
+def print_asset_table(labels: List[Tuple[int, str, str]], stats: Dict[str, "np.ndarray"], top: int) -> None:
+    order = np.argsort(-stats["fees"], kind="stable")[:top]
+    print(f"\n{'wallet':>6} {'actif':<14} {'type':<5} {'ordres':>7} {'turnover $':>12} {'x cible':>8} "
+          f"{'frais $':>9} {'drag %':>7} {'bande %':>8} {'|dév| moy':>9} {'slip bps':>9}")
+    for i in order:
+        wallet_id, asset, kind = labels[i]
+        print(f"{wallet_id:>6} {asset:<14} {kind:<5} {int(stats['fills'][i]):>7} {stats['turnover'][i]:>12.2f} "
+              f"{_fmt(stats['turnover_x'][i], '>8.2f')} {stats['fees'][i]:>9.2f} {_fmt(stats['fee_drag_pct'][i], '>7.3f')} "
+              f"{_fmt(stats['in_band_pct'][i], '>8.1f')} {stats['mean_abs_dev'][i]:>9.1f} {_fmt(stats['slippage_bps'][i], '>9.1f')}")
+    if len(labels) > top:
+        print(f"   ... {len(labels) - top} autre(s) actif(s) (--top pour en afficher plus)")
+
+
+def print_wallet_table(wallets: Dict[str, "np.ndarray"], top: int) -> None:
+    order = np.argsort(-wallets["fees"], kind="stable")[:top]
+    print(f"\n{'wallet':>6} {'actifs':>6} {'ordres':>7} {'turnover $':>12} {'x cible':>8} "
+          f"{'frais $':>9} {'drag %':>7} {'bande %':>8} {'slip bps':>9}")
+    for i in order:
+        print(f"{int(wallets['wallet'][i]):>6} {int(wallets['assets'][i]):>6} {int(wallets['fills'][i]):>7} "
+              f"{wallets['turnover'][i]:>12.2f} {_fmt(wallets['turnover_x'][i], '>8.2f')} {wallets['fees'][i]:>9.2f} "
+              f"{_fmt(wallets['fee_drag_pct'][i], '>7.3f')} {_fmt(wallets['in_band_pct'][i], '>8.1f')} "
+              f"{_fmt(wallets['slippage_bps'][i], '>9.1f')}")
+    if len(wallets["wallet"]) > top:
+        print(f"   ... {len(wallets['wallet']) - top} autre(s) wallet(s)")
+
+
+def write_csv(path: str, labels: List[Tuple[int, str, str]], stats: Dict[str, "np.ndarray"]) -> None:
+    columns = [c for c in stats if not c.startswith("_") and c != "wallet"]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["wallet", "asset", "kind"] + columns)
+        for i, (wallet_id, asset, kind) in enumerate(labels):
+            writer.writerow([wallet_id, asset, kind] + [
+                "" if np.isnan(stats[c][i]) else round(float(stats[c][i]), 6) for c in columns
+            ])
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapport d'analyse des rééquilibrages (turnover, frais, bande, slippage)")
+    parser.add_argument("--dir", default=DEFAULT_SNAPSHOT_DIR, help="Répertoire des snapshots")
+    parser.add_argument("--wallet", type=int, action="append", help="Wallet(s) à analyser (défaut: tous)")
+    parser.add_argument("--days", type=float, default=30, help="Fenêtre en jours (depuis maintenant)")
+    parser.add_argument("--max-gap", type=float, default=DEFAULT_MAX_GAP_SECONDS,
+                        help="Durée max (s) comptée entre deux cycles pour le temps dans la bande")
+    parser.add_argument("--top", type=int, default=20, help="Nombre de lignes affichées par tableau")
+    parser.add_argument("--csv", help="Exporte toutes les statistiques par actif dans ce fichier CSV")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = SnapshotStore(args.dir)
+    wallet_ids = args.wallet or store.wallets()
+    if not wallet_ids:
+        print(f"❌ Aucun historique trouvé dans '{args.dir}'. Lancez bot.py (sans --no-snapshots) d'abord.")
+        return
+
+    end_ts = time.time()
+    start_ts = end_ts - args.days * 86400
+    report = Report()
+    for wallet_id in wallet_ids:
+        report.add_wallet(store, wallet_id, start_ts, end_ts, args.max_gap)
+
+    stats = report.table()
+    if not stats:
+        print(f"Aucune donnée sur les {args.days:g} dernier(s) jour(s).")
+        return
+    wallets = wallet_table(stats)
+
+    print(f"📊 Rapport sur {args.days:g} jour(s) : {len(wallets['wallet'])} wallet(s), {len(report.labels)} actif(s)")
+    print("\n--- Par actif (tri par frais) ---")
+    print_asset_table(report.labels, stats, args.top)
+    print("\n--- Par wallet (tri par frais) ---")
+    print_wallet_table(wallets, args.top)
+
+    print(f"\nTotal : {int(wallets['fills'].sum())} ordres | turnover ${wallets['turnover'].sum():,.2f} | "
+          f"frais ${wallets['fees'].sum():,.2f}")
+    if args.csv:
+        write_csv(args.csv, report.labels, stats)
+        print(f"💾 Statistiques par actif exportées dans {args.csv}")
+    print(f"⏱️  Calculé en {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    main()
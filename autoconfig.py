@@ -6,14 +6,21 @@ Détecte les tokens Spot et les positions Futures ouvertes.
 
 Usage:
     python autoconfig.py
+    python autoconfig.py --profile  # Profil par échantillonnage (rapport tous les 10 wallets et en fin de run)
 """
 
 import os
 import json
 import requests
+import argparse
 from typing import Dict, Any, Optional, Tuple, List
 from dotenv import load_dotenv
 
+from market_state import MarketState, PerpPosition
+from dex_registry import DexRegistry
+from circuit_breaker import BreakerBoard
+from profiler import SamplingProfiler, DEFAULT_INTERVAL_MS, DEFAULT_REPORT_EVERY, DEFAULT_PROFILE_DIR
+
 # Charger les variables du fichier .env
 load_dotenv()
 
@@ -21,7 +28,8 @@ load_dotenv()
 # CONFIGURATION ET UTILITAIRES
 # =============================================================================
 
-API_URL = "https://api.hyperliquid.xyz/info"
+# HL_API_URL permet de viser un serveur local de test (loadgen.py)
+API_URL = f"{os.getenv('HL_API_URL', 'https://api.hyperliquid.xyz').rstrip('/')}/info"
 
 def api_call(payload: Dict) -> Any:
     """Appel API Hyperliquid pour l'endpoint info"""
@@ -29,6 +37,12 @@ def api_call(payload: Dict) -> Any:
     r.raise_for_status()
     return r.json()
 
+# Registre des DEXs HIP-3 (découverts via perpDexs, cache partagé avec bot.py)
+dex_registry = DexRegistry(api_call)
+
+# Un DEX en échec n'est pas réinterrogé pour les wallets suivants (circuit ouvert 5 min)
+dex_breakers = BreakerBoard(failure_threshold=1, base_backoff=300)
+
 def load_config(wallet_id: int) -> Dict[str, Any]:
     """Charge la configuration depuis config_wallet_X.json"""
     config_file = f"config_wallet_{wallet_id}.json"
@@ -111,113 +125,71 @@ def get_perp_account_summary(address: str, dex_name: str = "") -> Dict[str, Any]
         payload["dex"] = dex_name
     return api_call(payload)
 
-def get_all_perp_positions(address: str) -> List[Tuple[str, Dict[str, Any]]]:
+def get_all_perp_positions(address: str) -> List[PerpPosition]:
     """
     Récupère toutes les positions futures de tous les DEX (main + HIP-3).
-    Retourne une liste de tuples (dex_name, position_data)
+    Retourne une liste de PerpPosition (dex = "main" ou nom du DEX HIP-3)
     """
-    dexs_to_check = ["", "flx", "hyna", "vntl", "xyz"]
+    dexs_to_check = dex_registry.all_dexs()
     all_positions = []
     
     for dex_name in dexs_to_check:
+        breaker = dex_breakers.get("clearinghouseState", dex_name)
+        if not breaker.allow():
+            print(f"   ⏭️  DEX '{dex_name if dex_name else 'main'}' ignoré (indisponible)")
+            continue
         try:
             perp_summary = get_perp_account_summary(address, dex_name)
-            positions = perp_summary.get("assetPositions", [])
-            if positions:
-                for asset_pos in positions:
-                    pos = asset_pos.get("position", {})
-                    szi = float(pos.get("szi", 0))
-                    if abs(szi) > 1e-8:  # Ignorer les positions vides
-                        all_positions.append((dex_name if dex_name else "main", pos))
+            breaker.record_success()
+            for asset_pos in perp_summary.get("assetPositions", []):
+                position = PerpPosition.from_api(dex_name if dex_name else "main", asset_pos.get("position", {}))
+                if abs(position.szi) > 1e-8:  # Ignorer les positions vides
+                    all_positions.append(position)
         except Exception as e:
             # Continuer même si un DEX échoue
+            breaker.record_failure()
             print(f"   ⚠️  Erreur lors de la récupération du DEX '{dex_name if dex_name else 'main'}': {e}")
             continue
     
     return all_positions
 
-def get_perp_meta_and_contexts() -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    """Récupère les métadonnées et les contextes d'actifs (prix, etc.) depuis tous les DEXs"""
+def get_perp_meta_and_contexts(mids: Optional[Dict[str, float]] = None) -> MarketState:
+    """
+    Récupère les métadonnées et les contextes d'actifs (markPx, szDecimals) depuis tous les DEXs,
+    sous forme compacte (MarketState).
+    """
+    market = MarketState()
     
     # Récupérer depuis le main DEX
-    payload = {"type": "metaAndAssetCtxs"}
-    data = api_call(payload)
-    
-    perp_meta = data[0]
-    asset_contexts = data[1]
-    
-    asset_ctx_map = {}
-    for ctx in asset_contexts:
-        # CORRECTION: Vérifier si 'sName' existe avant d'y accéder
-        if "sName" in ctx:
-            asset_ctx_map[ctx["sName"]] = ctx
+    market.add_dex("", api_call({"type": "metaAndAssetCtxs"}))
     
     # Aussi récupérer depuis les DEXs HIP-3
-    hip3_dexs = ["flx", "hyna", "vntl", "xyz"]
-    for dex_name in hip3_dexs:
+    for dex_name in dex_registry.hip3_dexs():
+        breaker = dex_breakers.get("metaAndAssetCtxs", dex_name)
+        if not breaker.allow():
+            continue
         try:
-            dex_data = api_call({"type": "metaAndAssetCtxs", "dex": dex_name})
-            dex_meta = dex_data[0]
-            dex_contexts = dex_data[1]
-            
-            # Ajouter au perp_meta.universe les assets HIP-3
-            for asset in dex_meta.get("universe", []):
-                asset_name = asset.get("name", "")
-                if asset_name and asset_name not in [a.get("name") for a in perp_meta.get("universe", [])]:
-                    perp_meta.setdefault("universe", []).append(asset)
-            
-            # Ajouter les contextes
-            for ctx in dex_contexts:
-                if "sName" in ctx and ctx["sName"] not in asset_ctx_map:
-                    asset_ctx_map[ctx["sName"]] = ctx
+            market.add_dex(dex_name, api_call({"type": "metaAndAssetCtxs", "dex": dex_name}))
+            breaker.record_success()
         except Exception:
+            breaker.record_failure()
             continue
     
     # Aussi récupérer depuis allMids pour les tokens qui ne sont pas dans assetContexts
     try:
-        mids = get_all_mids()
-        for coin, price in mids.items():
-            # Ajouter seulement si pas déjà présent (allMids peut avoir des clés différentes)
-            if coin not in asset_ctx_map and not coin.startswith("@"):
-                try:
-                    # Créer un contexte minimal avec le prix
-                    asset_ctx_map[coin] = {"sName": coin, "markPx": float(price)}
-                except (ValueError, TypeError):
-                    pass
+        market.add_mids(mids if mids is not None else get_all_mids())
     except Exception:
         pass
     
-    return perp_meta, asset_ctx_map
+    return market
 
-def get_perp_info(asset_name: str, perp_meta: Dict) -> Tuple[Optional[int], int]:
+def get_perp_info(asset_name: str, market: MarketState) -> Tuple[Optional[int], int]:
     """
     Retourne (asset_index, sz_decimals) pour un actif perpétuel.
-    Cherche dans le perp_meta (qui inclut maintenant les HIP-3)
+    asset_index est la position de l'actif dans l'univers de son DEX.
     """
-    asset_index = None
-    sz_decimals = 3  # Valeur par défaut plus adaptée aux HIP-3
-    
-    for asset in perp_meta.get("universe", []):
-        if asset.get("name") == asset_name:
-            asset_index = asset.get("index")
-            sz_decimals = asset.get("szDecimals", 3)
-            break
-    
-    # Si pas trouvé dans universe principal, chercher dans les DEXs HIP-3
-    if asset_index is None and ":" in asset_name:
-        dex_name = asset_name.split(":")[0]
-        try:
-            dex_data = api_call({"type": "metaAndAssetCtxs", "dex": dex_name})
-            dex_meta = dex_data[0]
-            for asset in dex_meta.get("universe", []):
-                if asset.get("name") == asset_name:
-                    asset_index = asset.get("index")
-                    sz_decimals = asset.get("szDecimals", 3)
-                    break
-        except Exception:
-            pass
-    
-    return asset_index, sz_decimals
+    # Valeur par défaut plus adaptée aux HIP-3
+    return market.asset_info(asset_name, default_sz_decimals=3)
 
 # Cache pour les métadonnées
 _metadata_cache: Dict[str, Any] = {}
@@ -235,26 +207,10 @@ def get_token_id_to_name() -> Dict[int, str]:
 
 def get_dex_quote_asset(dex_name: str) -> str:
     """
-    Récupère dynamiquement le quote asset (collateral) pour un DEX HIP-3.
-    - flx, vntl -> USDH
-    - xyz -> USDC
-    - hyna -> USDE
+    Retourne le quote asset (collateral) pour un DEX HIP-3,
+    dérivé du collateralToken découvert par le registre des DEXs.
     """
-    global _metadata_cache
-    
-    cache_key = f"dex_quote_{dex_name}"
-    if cache_key not in _metadata_cache:
-        try:
-            dex_data = api_call({"type": "metaAndAssetCtxs", "dex": dex_name})
-            collateral_id = dex_data[0].get("collateralToken", 0)
-            token_mapping = get_token_id_to_name()
-            _metadata_cache[cache_key] = token_mapping.get(collateral_id, "USDC")
-        except Exception:
-            # Fallback basé sur les DEX connus
-            fallback = {"flx": "USDH", "vntl": "USDH", "xyz": "USDC", "hyna": "USDE"}
-            _metadata_cache[cache_key] = fallback.get(dex_name, "USDC")
-    
-    return _metadata_cache[cache_key]
+    return dex_registry.quote_asset(dex_name)
 
 def get_spot_pair_quote_asset(pair_index: int) -> str:
     """Récupère dynamiquement le quote asset pour une paire spot"""
@@ -289,7 +245,7 @@ def get_quote_asset_for_coin(coin: str, pair_index: Optional[int] = None) -> str
     
     - Spot (@pair_index) : Dépend de la paire (USDC, USDT, USDH...)
     - Perp Main : USDC
-    - Perp HIP-3 (dex:asset) : Dépend du DEX (flx/vntl=USDH, xyz=USDC, hyna=USDE)
+    - Perp HIP-3 (dex:asset) : Dépend du DEX (collateral découvert via le registre)
     """
     # Perp HIP-3 : contient ":"
     if ":" in coin:
@@ -303,10 +259,12 @@ def get_quote_asset_for_coin(coin: str, pair_index: Optional[int] = None) -> str
 # LOGIQUE DE GÉNÉRATION
 # =============================================================================
 
-def generate_config_file(wallet_id: int) -> None:
+def generate_config_file(wallet_id: int, profiler: Optional[SamplingProfiler] = None) -> None:
     """Génère la config pour un wallet spécifique, incluant Spot et Futures"""
+    profiler = profiler or SamplingProfiler()
     
-    address = os.getenv(f"HL_ADDRESS_{wallet_id}")
+    # Sous-compte / vault (mode flotte) : états lus à HL_VAULT_ADDRESS_X
+    address = os.getenv(f"HL_VAULT_ADDRESS_{wallet_id}") or os.getenv(f"HL_ADDRESS_{wallet_id}")
     if not address:
         raise ValueError(f"❌ HL_ADDRESS_{wallet_id} non trouvé!")
     
@@ -314,11 +272,12 @@ def generate_config_file(wallet_id: int) -> None:
     
     # 1. Récupérer les données
     try:
-        balances = get_spot_balances(address)
-        spot_meta = get_spot_meta()
-        perp_meta, asset_ctx_map = get_perp_meta_and_contexts()
-        mids = get_all_mids()
-        all_perp_positions = get_all_perp_positions(address)
+        with profiler.stage("fetch"):
+            balances = get_spot_balances(address)
+            spot_meta = get_spot_meta()
+            mids = get_all_mids()
+            market = get_perp_meta_and_contexts(mids)
+            all_perp_positions = get_all_perp_positions(address)
     except requests.exceptions.RequestException as e:
         print(f"❌ Erreur de connexion à l'API Hyperliquid: {e}")
         return
@@ -387,37 +346,30 @@ def generate_config_file(wallet_id: int) -> None:
     if not all_perp_positions:
         print("\n   Aucune position future détectée")
     else:
-        for dex_name, pos in all_perp_positions:
-            asset_name = pos.get("coin")
-            szi = float(pos.get("szi", 0))
+        for pos in all_perp_positions:
+            dex_name = pos.dex
+            asset_name = pos.coin
+            szi = pos.szi
             
             if not asset_name or abs(szi) < 1e-8:
                 continue
             
             # Récupérer les métadonnées
-            asset_index, sz_decimals = get_perp_info(asset_name, perp_meta)
+            asset_index, sz_decimals = get_perp_info(asset_name, market)
             
             # Récupérer le prix pour calculer la valeur notionnelle actuelle
-            # Essayer d'abord depuis asset_ctx_map, puis depuis la position elle-même
-            mark_price = 0
-            if asset_name in asset_ctx_map:
-                mark_price = float(asset_ctx_map[asset_name].get("markPx", 0))
+            # Essayer d'abord depuis les contextes d'actifs, puis depuis la position elle-même
+            mark_price = market.mark_price(asset_name)
             
             if mark_price == 0:
                 # Essayer depuis la position directement
-                mark_from_pos = pos.get("markPx", 0)
-                if mark_from_pos and mark_from_pos != "N/A":
-                    try:
-                        mark_price = float(mark_from_pos)
-                    except (ValueError, TypeError):
-                        pass
+                mark_price = pos.mark_px
             
             # Si toujours pas de prix, utiliser le prix d'entrée comme approximation
             if mark_price == 0:
-                entry_price = float(pos.get("entryPx", 0))
-                mark_price = entry_price if entry_price > 0 else 0
+                mark_price = pos.entry_px if pos.entry_px > 0 else 0
             
-            current_notional_usd = abs(szi * mark_price) if mark_price > 0 else abs(szi * float(pos.get("entryPx", 0)))
+            current_notional_usd = abs(szi * mark_price) if mark_price > 0 else abs(szi * pos.entry_px)
             
             dex_label = f"[{dex_name}]" if dex_name != "main" else "[Main]"
             print(f"\n📈 {asset_name} {dex_label}:")
@@ -469,10 +421,20 @@ def generate_config_file(wallet_id: int) -> None:
 # =============================================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Hyperliquid Rebalancer V2 - Générateur de configuration")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profilage par échantillonnage (temps par étape et par fonction, piles repliées)")
+    parser.add_argument("--profile-every", type=int, default=DEFAULT_REPORT_EVERY,
+                        help="Écrit un rapport de profil tous les K wallets")
+    parser.add_argument("--profile-interval-ms", type=float, default=DEFAULT_INTERVAL_MS,
+                        help="Pas d'échantillonnage du profileur (ms)")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="Répertoire des rapports de profil")
+    args = parser.parse_args()
+    
     # Déterminer les wallets à traiter
     wallet_ids = []
     i = 1
-    while os.getenv(f"HL_ADDRESS_{i}"):
+    while os.getenv(f"HL_ADDRESS_{i}") or os.getenv(f"HL_VAULT_ADDRESS_{i}"):
         wallet_ids.append(i)
         i += 1
     
@@ -481,11 +443,23 @@ def main():
         return
 
     print("--- Mode Génération de Configuration ---")
+    # Liste des DEXs HIP-3 rafraîchie une fois (les lectures suivantes ne font pas de requête)
+    dex_registry.refresh()
+    profiler = SamplingProfiler(args.profile_interval_ms, args.profile_every, args.profile_dir)
+    if args.profile:
+        profiler.start()
     for wid in wallet_ids:
         try:
-            generate_config_file(wid)
+            with profiler.stage("config"):
+                generate_config_file(wid, profiler)
         except Exception as e:
             print(f"❌ Erreur lors de la génération pour Wallet {wid}: {e}")
+        profiler.end_cycle()
+    
+    # Rapport final (wallets restants depuis le dernier rapport)
+    if args.profile:
+        profiler.stop()
+        profiler.write_report()
 
 if __name__ == "__main__":
     main()
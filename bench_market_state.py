@@ -0,0 +1,139 @@
+"""
+Hyperliquid Rebalancer V2 - Benchmark mémoire de l'état de marché
+==================================================
+Compare la mémoire retenue (tracemalloc) et le coût des lectures de prix entre :
+- l'approche historique : dicts JSON de metaAndAssetCtxs gardés tels quels
+  + un dict {"sName", "markPx"} par coin de allMids, floats re-parsés à la lecture
+- MarketState : colonnes `array`, floats parsés une seule fois
+
+Les payloads sont synthétiques (même forme que l'API), aucun appel réseau.
+
+Usage:
+    python bench_market_state.py
+    python bench_market_state.py --assets 400 --dexs 5 --mids 2000
+"""
+
+import gc
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from typing import Dict, Any, List, Tuple, Callable
+
+from market_state import MarketState
+
+# =============================================================================
+# PAYLOADS SYNTHÉTIQUES
+# =============================================================================
+
+def make_meta_and_ctxs(dex: str, n_assets: int, rng: random.Random) -> str:
+    """Génère une réponse metaAndAssetCtxs (JSON texte) pour un DEX"""
+    prefix = f"{dex}:" if dex else ""
+    universe = []
+    contexts = []
+    for i in range(n_assets):
+        px = rng.uniform(0.01, 50000)
+        universe.append({"name": f"{prefix}A{i}", "szDecimals": rng.randint(0, 5), "maxLeverage": 20})
+        contexts.append({
+            "funding": f"{rng.uniform(-1e-4, 1e-4):.8f}",
+            "openInterest": f"{rng.uniform(0, 1e6):.2f}",
+            "prevDayPx": f"{px * 0.99:.5g}",
+            "dayNtlVlm": f"{rng.uniform(0, 1e8):.2f}",
+            "premium": f"{rng.uniform(-1e-3, 1e-3):.8f}",
+            "oraclePx": f"{px:.5g}",
+            "markPx": f"{px:.5g}",
+            "midPx": f"{px:.5g}",
+            "impactPxs": [f"{px * 0.999:.5g}", f"{px * 1.001:.5g}"],
+            "dayBaseVlm": f"{rng.uniform(0, 1e6):.2f}",
+        })
+    return json.dumps([{"universe": universe, "collateralToken": 0}, contexts])
+
+
+def make_all_mids(n_mids: int, rng: random.Random) -> str:
+    """Génère une réponse allMids (JSON texte) : coins perp + paires spot @i"""
+    mids = {}
+    for i in range(n_mids):
+        key = f"@{i}" if i % 2 else f"M{i}"
+        mids[key] = f"{rng.uniform(0.01, 50000):.5g}"
+    return json.dumps(mids)
+
+# =============================================================================
+# CONSTRUCTIONS COMPARÉES
+# =============================================================================
+
+def build_legacy(payloads: List[Tuple[str, str]], mids_text: str) -> Dict[str, Any]:
+    """Approche historique : contextes bruts indexés par nom + dicts minimaux pour allMids"""
+    asset_ctx_map: Dict[str, Any] = {}
+    for _dex, text in payloads:
+        meta, contexts = json.loads(text)
+        for asset, ctx in zip(meta["universe"], contexts):
+            if asset["name"] not in asset_ctx_map:
+                ctx["szDecimals"] = asset["szDecimals"]
+                asset_ctx_map[asset["name"]] = ctx
+    mids = {k: float(v) for k, v in json.loads(mids_text).items()}
+    for coin, price in mids.items():
+        if coin not in asset_ctx_map and not coin.startswith("@"):
+            asset_ctx_map[coin] = {"sName": coin, "markPx": float(price)}
+    return asset_ctx_map
+
+
+def build_compact(payloads: List[Tuple[str, str]], mids_text: str) -> MarketState:
+    market = MarketState()
+    for dex, text in payloads:
+        market.add_dex(dex, json.loads(text))
+    market.add_mids({k: float(v) for k, v in json.loads(mids_text).items()})
+    return market
+
+
+def retained_bytes(build: Callable[[], Any]) -> Tuple[int, int, Any]:
+    """Retourne (octets retenus après construction, pic pendant la construction, objet construit)"""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, obj
+
+
+def time_lookups(lookup: Callable[[str], float], names: List[str], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for name in names:
+            lookup(name)
+    return time.perf_counter() - start
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mémoire : dicts JSON vs MarketState")
+    parser.add_argument("--assets", type=int, default=250, help="Actifs par DEX")
+    parser.add_argument("--dexs", type=int, default=5, help="Nombre de DEXs (main inclus)")
+    parser.add_argument("--mids", type=int, default=1500, help="Entrées dans allMids")
+    parser.add_argument("--rounds", type=int, default=200, help="Passes de lecture de prix")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    dex_names = [""] + [f"dex{i}" for i in range(1, args.dexs)]
+    payloads = [(dex, make_meta_and_ctxs(dex, args.assets, rng)) for dex in dex_names]
+    mids_text = make_all_mids(args.mids, rng)
+
+    legacy_bytes, legacy_peak, legacy = retained_bytes(lambda: build_legacy(payloads, mids_text))
+    compact_bytes, compact_peak, compact = retained_bytes(lambda: build_compact(payloads, mids_text))
+
+    names = list(legacy.keys())
+    legacy_time = time_lookups(lambda n: float(legacy[n].get("markPx", 0)), names, args.rounds)
+    compact_time = time_lookups(compact.mark_price, names, args.rounds)
+
+    print(f"Actifs: {len(names)} ({args.dexs} DEXs x {args.assets} + allMids {args.mids})")
+    print(f"{'':<22}{'retenu':>12}{'pic':>12}{'lectures':>12}")
+    print(f"{'dicts JSON (legacy)':<22}{legacy_bytes / 1024:>10.1f}KB{legacy_peak / 1024:>10.1f}KB{legacy_time * 1000:>10.1f}ms")
+    print(f"{'MarketState':<22}{compact_bytes / 1024:>10.1f}KB{compact_peak / 1024:>10.1f}KB{compact_time * 1000:>10.1f}ms")
+    print(f"Ratio mémoire retenue: x{legacy_bytes / max(compact_bytes, 1):.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -7,18 +7,62 @@ Usage:
     python bot.py              # Lance tous les wallets configurés
     python bot.py --dry-run    # Mode simulation (pas d'ordres réels)
     python bot.py --wallet 1   # Lance uniquement le wallet 1
+    python bot.py --metrics-file metrics.json  # Écrit les métriques à chaque cycle
+    python bot.py --sign-workers 8  # Processus de signature du pipeline d'ordres (0 = sans processus)
+    python bot.py --paper --paper-cash 1000  # Paper trading : comptes virtuels exécutés au mid du cycle
+    python bot.py --profile --profile-every 10  # Profil par échantillonnage (rapport tous les 10 cycles)
+    python bot.py --control-port 8765  # API locale de statut/contrôle (curl localhost:8765/status)
+    HL_API_URL=http://127.0.0.1:8080 python bot.py --dry-run  # Contre un serveur local de test
+    python bot.py --info-endpoint http://mon-noeud:3001 --info-endpoint https://api.hyperliquid.xyz  # Info couvertes
+    python bot.py --wallet 1 --info-cache  # allMids/metaAndAssetCtxs via le cache partagé de l'hôte (info_cache.py)
+    HL_AGENT_KEY=0x... HL_VAULT_ADDRESS_1=0x... python bot.py  # Sous-comptes / vaults signés par une seule clé d'agent
+    python bot.py --fast-path --fast-path-epsilon-bps 5  # Actifs inchangés ni réévalués ni affichés
 """
 
 import os
 import json
 import time
-import math
 import requests
+import threading
 import argparse
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, Tuple, List
 from dotenv import load_dotenv
 
+from market_state import MarketState, PerpPosition
+from dex_registry import DexRegistry
+from order_specs import OrderSpec, compile_order_specs, HIP3_ASSET_OFFSET
+from query_planner import (
+    CycleData, CyclePlan, WalletPlan, LastGoodCache, UserStateBatcher, FetchDeadlineError, ALL_MIDS,
+    plan_wallet, execute_plan, perp_dex_for
+)
+from circuit_breaker import BreakerBoard, CircuitOpenError
+from metrics import metrics
+from snapshot_store import SnapshotWriter, SnapshotRow, FillRow, KIND_SPOT, KIND_PERP, DEFAULT_SNAPSHOT_DIR
+from fills import OrderFill, order_error, parse_order_fill
+from order_pipeline import OrderPipeline, OrderTicket, DEFAULT_SIGN_WORKERS
+from position_cache import PositionCache, DEFAULT_RECONCILE_SECONDS
+from order_tracker import (
+    InFlightTable, OrderAmbiguousError, INFLIGHT_FILE, FILLED, classify_order_status, is_ambiguous_error,
+    PendingSettlement, SETTLE_QUOTE_DUE, SETTLE_QUOTE_SENT
+)
+from paper_exchange import PaperExchange, DEFAULT_SLIPPAGE_BPS
+from profiler import SamplingProfiler, DEFAULT_INTERVAL_MS, DEFAULT_REPORT_EVERY, DEFAULT_PROFILE_DIR
+from control_api import (
+    ControlServer, DEFAULT_CONTROL_PORT, DEFAULT_CONTROL_SOCKET, CMD_CYCLE, CMD_PAUSE, CMD_RESUME
+)
+from dispatch import (
+    OrderCandidate, DispatchQueue, RateLimiter, threshold_excess, DEFAULT_ORDER_RATE, DEFAULT_ORDER_BURST
+)
+from sizing import SizingPolicy, DEFAULT_SLIPPAGE_BUDGET_BPS
+from order_book import L2BookCache, DEFAULT_L2_BUFFER_BPS, DEFAULT_L2_MAX_AGE_SECONDS
+from endpoints import EndpointPool
+from info_cache import InfoCacheClient, DEFAULT_SOCKET_PATH
+from netting import (
+    NettingMatch, SkipLimiter, match_candidates, apply_matches, exposures, format_exposures,
+    NETTING_OFF, NETTING_REPORT, NETTING_TRANSFER, NETTING_MODES, DEFAULT_MAX_SKIP_TICKS
+)
+
 # Charger les variables d'environnement depuis .env
 load_dotenv()
 
@@ -28,6 +72,7 @@ try:
     from hyperliquid.exchange import Exchange
     from hyperliquid.info import Info
     from hyperliquid.utils import constants
+    from hyperliquid.utils.types import Cloid
     from eth_account import Account
 except ImportError:
     print("❌ Erreur: Les dépendances 'hyperliquid-python-sdk' et 'eth-account' ne sont pas installées.")
@@ -39,10 +84,18 @@ except ImportError:
 # CONFIGURATION ET UTILITAIRES
 # =============================================================================
 
-API_URL = "https://api.hyperliquid.xyz/info"
+# URL de base de l'API (HL_API_URL permet de viser un serveur local de test) : endpoint unique des ordres
+API_BASE_URL = os.getenv("HL_API_URL", constants.MAINNET_API_URL).rstrip("/")
+
+# Endpoints des requêtes info (HL_INFO_URLS=url1,url2 : API publique, noeud ou proxy), API_BASE_URL par défaut
+INFO_URLS = [u.strip() for u in os.getenv("HL_INFO_URLS", "").split(",") if u.strip()] or [API_BASE_URL]
+
+# Requêtes info exécutées en parallèle par cycle (connexions HTTP réutilisées)
+DEFAULT_FETCH_WORKERS = 8
+info_endpoints = EndpointPool(INFO_URLS, timeout=10, pool_size=DEFAULT_FETCH_WORKERS)
 
-# Liste des DEXs HIP-3 connus (nécessaire pour initialiser Exchange correctement)
-HIP3_DEXS = ["flx", "hyna", "vntl", "xyz"]
+# Cache info partagé entre les processus de l'hôte (--info-cache), None = requêtes directes
+info_cache: Optional[InfoCacheClient] = None
 
 # Cache global pour l'Exchange initialisé (évite de recréer à chaque ordre)
 _exchange_cache: Dict[str, Exchange] = {}
@@ -50,11 +103,84 @@ _exchange_cache: Dict[str, Exchange] = {}
 # Cache pour les métadonnées des marchés (quote assets, tick sizes, etc.)
 _market_metadata_cache: Dict[str, Any] = {}
 
+# Specs d'ordres précompilées par coin (spot, main et HIP-3), reconstruites avec les métadonnées
+_order_specs: Dict[str, OrderSpec] = {}
+
+# Durée de vie des métadonnées d'un Exchange avant reconstruction (et recompilation des specs)
+METADATA_REFRESH_SECONDS = 3600
+_exchange_created_at: Dict[str, float] = {}
+
+# Timeout (secondes) des envois d'ordres : un timeout rend le résultat ambigu (résolu via orderStatus)
+ORDER_TIMEOUT_SECONDS = 10
+
+# Les Exchange sont partagés par clé de signature : le vault_address n'est posé que le temps d'un appel
+_vault_lock = threading.Lock()
+
+def exchange_call(exchange: Exchange, vault_address: Optional[str], method: str, *args, **kwargs) -> Any:
+    """
+    Appelle une méthode de l'Exchange partagé avec le vaultAddress de cet appel (None : compte signataire).
+    Le SDK joint exchange.vault_address à chaque action : il est remis à None après l'appel pour
+    qu'aucun ordre ou spotSend suivant de la même clé ne parte au nom d'un autre sous-compte / vault.
+    """
+    with _vault_lock:
+        exchange.vault_address = vault_address
+        try:
+            return getattr(exchange, method)(*args, **kwargs)
+        finally:
+            exchange.vault_address = None
+
+def wallet_credentials(wallet_id: int) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    (adresse du compte, clé de signature, vault_address) d'un wallet.
+    Mode flotte : HL_VAULT_ADDRESS_X désigne un sous-compte ou un vault, signé par HL_AGENT_KEY
+    (ou HL_PRIVATE_KEY_X) ; les ordres portent alors vaultAddress et les états sont lus à cette adresse.
+    """
+    vault_address = os.getenv(f"HL_VAULT_ADDRESS_{wallet_id}")
+    address = vault_address or os.getenv(f"HL_ADDRESS_{wallet_id}")
+    private_key = os.getenv(f"HL_PRIVATE_KEY_{wallet_id}") or (os.getenv("HL_AGENT_KEY") if vault_address else None)
+    return address, private_key, vault_address
+
+def configured_wallet_ids() -> List[int]:
+    """Wallets configurés : HL_ADDRESS_X ou HL_VAULT_ADDRESS_X, X = 1, 2, ... sans trou"""
+    wallet_ids = []
+    i = 1
+    while os.getenv(f"HL_ADDRESS_{i}") or os.getenv(f"HL_VAULT_ADDRESS_{i}"):
+        wallet_ids.append(i)
+        i += 1
+    return wallet_ids
+
 def api_call(payload: Dict) -> Any:
-    """Appel API Hyperliquid pour l'endpoint info"""
-    r = requests.post(API_URL, json=payload, timeout=10)
-    r.raise_for_status()
-    return r.json()
+    """Appel API Hyperliquid pour l'endpoint info (meilleur endpoint, couvert par le suivant si lent)"""
+    if info_cache is not None:
+        # Sidecar absent : None, la requête part directement vers l'API ;
+        # échec amont remonté par le sidecar : InfoCacheUpstreamError (breaker et repli habituels)
+        result = info_cache.get(payload)
+        if result is not None:
+            return result
+    return info_endpoints.call(payload)
+
+# Registre des DEXs HIP-3 (découverts via perpDexs, cache avec TTL)
+dex_registry = DexRegistry(api_call)
+
+# Circuit breakers par (endpoint, DEX) et dernières réponses valides pour le repli
+info_breakers = BreakerBoard()
+info_last_good = LastGoodCache()
+
+# Regroupement des clearinghouseState de plusieurs wallets (batchClearinghouseStates si supporté)
+info_batcher = UserStateBatcher()
+
+# Âge maximum (secondes) des données en cache utilisables quand un endpoint est indisponible
+DEFAULT_MAX_STALE_SECONDS = 120
+
+# Erreurs d'une requête info (réseau, circuit ouvert, échéance du cycle dépassée)
+INFO_ERRORS = (requests.exceptions.RequestException, CircuitOpenError, FetchDeadlineError)
+
+# Budgets de temps (secondes) d'un cycle et de ses étapes (0 = sans limite) :
+# une requête lente ne retarde plus tous les wallets suivants
+DEFAULT_CYCLE_BUDGET_SECONDS = 45.0
+DEFAULT_FETCH_BUDGET_SECONDS = 8.0
+DEFAULT_WALLETS_BUDGET_SECONDS = 20.0
+DEFAULT_DISPATCH_BUDGET_SECONDS = 15.0
 
 def load_config(wallet_id: int) -> Dict[str, Any]:
     """Charge la configuration depuis config_wallet_X.json"""
@@ -66,30 +192,6 @@ def load_config(wallet_id: int) -> Dict[str, Any]:
 # API HYPERLIQUID - DONNÉES
 # =============================================================================
 
-def get_all_mids() -> Dict[str, float]:
-    """Récupère tous les mid prices (Spot et Perpétuels)"""
-    data = api_call({"type": "allMids"})
-    return {k: float(v) for k, v in data.items()}
-
-def get_spot_balances(address: str) -> Dict[str, float]:
-    """Récupère les balances spot + USDC perp withdrawable"""
-    # Balances spot (inclut USDC, USDH, et tous les tokens)
-    data = api_call({"type": "spotClearinghouseState", "user": address})
-    balances = {}
-    for bal in data.get("balances", []):
-        token = bal.get("coin", "")
-        total = float(bal.get("total", 0))
-        if total > 0:
-            balances[token] = total
-    
-    # Ajouter USDC withdrawable depuis perp (main DEX)
-    perp_data = get_perp_account_summary(address)
-    withdrawable = float(perp_data.get("withdrawable", 0))
-    if withdrawable > 0:
-        balances["USDC"] = balances.get("USDC", 0) + withdrawable
-    
-    return balances
-
 def get_token_id_to_name() -> Dict[int, str]:
     """Récupère le mapping token_id -> nom depuis spotMeta (cache)"""
     global _market_metadata_cache
@@ -103,26 +205,10 @@ def get_token_id_to_name() -> Dict[int, str]:
 
 def get_dex_quote_asset(dex_name: str) -> str:
     """
-    Récupère dynamiquement le quote asset (collateral) pour un DEX HIP-3.
-    - flx, vntl -> USDH
-    - xyz -> USDC
-    - hyna -> USDE
+    Retourne le quote asset (collateral) pour un DEX HIP-3,
+    dérivé du collateralToken découvert par le registre des DEXs.
     """
-    global _market_metadata_cache
-    
-    cache_key = f"dex_quote_{dex_name}"
-    if cache_key not in _market_metadata_cache:
-        try:
-            dex_data = api_call({"type": "metaAndAssetCtxs", "dex": dex_name})
-            collateral_id = dex_data[0].get("collateralToken", 0)
-            token_mapping = get_token_id_to_name()
-            _market_metadata_cache[cache_key] = token_mapping.get(collateral_id, "USDC")
-        except Exception:
-            # Fallback basé sur les DEX connus
-            fallback = {"flx": "USDH", "vntl": "USDH", "xyz": "USDC", "hyna": "USDE"}
-            _market_metadata_cache[cache_key] = fallback.get(dex_name, "USDC")
-    
-    return _market_metadata_cache[cache_key]
+    return dex_registry.quote_asset(dex_name)
 
 def get_spot_pair_quote_asset(pair_index: int) -> str:
     """Récupère dynamiquement le quote asset pour une paire spot"""
@@ -157,7 +243,7 @@ def get_quote_asset_for_coin(coin: str, pair_index: Optional[int] = None) -> str
     
     - Spot (@pair_index) : Dépend de la paire (USDC, USDT, USDH...)
     - Perp Main : USDC
-    - Perp HIP-3 (dex:asset) : Dépend du DEX (flx/vntl=USDH, xyz=USDC, hyna=USDE)
+    - Perp HIP-3 (dex:asset) : Dépend du DEX (collateral découvert via le registre)
     """
     # Spot : commence par "@"
     if coin.startswith("@"):
@@ -173,119 +259,25 @@ def get_quote_asset_for_coin(coin: str, pair_index: Optional[int] = None) -> str
     # Perp Main : USDC
     return "USDC"
 
+def get_spot_token_wire(token: str) -> Optional[str]:
+    """Identifiant d'un token spot pour spotSend ("NOM:tokenId"), depuis spotMeta (cache)"""
+    global _market_metadata_cache
+    
+    if "token_wires" not in _market_metadata_cache:
+        spot_meta = api_call({"type": "spotMeta"})
+        _market_metadata_cache["token_wires"] = {
+            t["name"]: f"{t['name']}:{t['tokenId']}" for t in spot_meta.get("tokens", []) if "tokenId" in t
+        }
+    return _market_metadata_cache["token_wires"].get(token)
+
 def get_spot_meta() -> Dict[str, Any]:
     """Récupère les métadonnées spot (pour szDecimals)"""
     return api_call({"type": "spotMeta"})
 
-def get_perp_account_summary(address: str, dex_name: str = "") -> Dict[str, Any]:
-    """Récupère le résumé du compte perpétuel de l'utilisateur (positions, marge) pour un DEX spécifique"""
-    payload = {"type": "clearinghouseState", "user": address}
-    if dex_name:
-        payload["dex"] = dex_name
-    return api_call(payload)
-
-def get_all_perp_positions(address: str) -> List[Tuple[str, Dict[str, Any]]]:
-    """
-    Récupère toutes les positions futures de tous les DEX (main + HIP-3).
-    Retourne une liste de tuples (dex_name, position_data)
-    """
-    dexs_to_check = ["", "flx", "hyna", "vntl", "xyz"]
-    all_positions = []
-    
-    for dex_name in dexs_to_check:
-        try:
-            perp_summary = get_perp_account_summary(address, dex_name)
-            positions = perp_summary.get("assetPositions", [])
-            if positions:
-                for asset_pos in positions:
-                    pos = asset_pos.get("position", {})
-                    szi = float(pos.get("szi", 0))
-                    if abs(szi) > 1e-8:  # Ignorer les positions vides
-                        all_positions.append((dex_name if dex_name else "main", pos))
-        except Exception:
-            # Continuer même si un DEX échoue
-            continue
-    
-    return all_positions
-
-def get_perp_meta_and_contexts() -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    """Récupère les métadonnées et les contextes d'actifs (prix, funding, etc.)"""
-    payload = {"type": "metaAndAssetCtxs"}
-    data = api_call(payload)
-    
-    perp_meta = data[0]
-    asset_contexts = data[1]
-    
-    asset_ctx_map = {}
-    for ctx in asset_contexts:
-        if "sName" in ctx:
-            asset_ctx_map[ctx["sName"]] = ctx
-    
-    # Aussi récupérer depuis allMids pour les tokens qui ne sont pas dans assetContexts
-    try:
-        mids = get_all_mids()
-        for coin, price in mids.items():
-            # Ajouter seulement si pas déjà présent (allMids peut avoir des clés différentes)
-            if coin not in asset_ctx_map and not coin.startswith("@"):
-                try:
-                    # Créer un contexte minimal avec le prix
-                    asset_ctx_map[coin] = {"sName": coin, "markPx": float(price)}
-                except (ValueError, TypeError):
-                    pass
-    except Exception:
-        pass
-    
-    return perp_meta, asset_ctx_map
-
 # =============================================================================
 # EXECUTION DES ORDRES ET LOGIQUE DE REBALANCING
 # =============================================================================
 
-def round_price_to_tick(price: float, tick_size: Optional[float] = None) -> float:
-    """
-    Arrondit le prix au tick size valide.
-    Si tick_size est fourni, l'utilise. Sinon, utilise la règle des 5 significant figures.
-    """
-    if price <= 0:
-        return price
-    
-    if tick_size and tick_size > 0:
-        # Arrondir au tick size
-        rounded = round(price / tick_size) * tick_size
-        # Déterminer le nombre de décimales pour éviter les erreurs de float
-        if tick_size >= 1:
-            decimals = 0
-        else:
-            decimals = -int(math.floor(math.log10(tick_size) - 0.001))
-        return round(rounded, decimals)
-    
-    # Fallback: 5 significant figures
-    magnitude = math.floor(math.log10(price))
-    tick = 10 ** (magnitude - 4)
-    rounded = round(price / tick) * tick
-    
-    if tick >= 1:
-        decimals = 0
-    else:
-        decimals = -int(math.floor(math.log10(tick)))
-    
-    return round(rounded, decimals)
-
-def get_asset_tick_size(exchange: Exchange, coin: str) -> Optional[float]:
-    """
-    Récupère le tick size pour un asset depuis le SDK.
-    Retourne None si non trouvé.
-    """
-    try:
-        asset_id = exchange.info.name_to_asset(coin)
-        # Le SDK stocke les prix decimals qui permettent de calculer le tick size
-        px_decimals = exchange.info.asset_to_px_decimals.get(asset_id)
-        if px_decimals is not None:
-            return 10 ** (-px_decimals)
-    except Exception:
-        pass
-    return None
-
 def get_exchange(private_key: str, use_hip3: bool = False) -> Exchange:
     """
     Retourne une instance Exchange initialisée.
@@ -293,30 +285,95 @@ def get_exchange(private_key: str, use_hip3: bool = False) -> Exchange:
     - use_hip3=True: pour les DEXs HIP-3 (flx:TSLA, vntl:X, etc.)
     
     Utilise un cache pour éviter de recréer l'instance à chaque appel.
+    À chaque (re)création, les specs d'ordres sont recompilées depuis les métadonnées du SDK.
     """
     global _exchange_cache
     
     # Créer une clé unique incluant le type d'exchange (main vs hip3)
     cache_key = f"{private_key[:10]}_{'hip3' if use_hip3 else 'main'}"
     
+    # Métadonnées trop anciennes : reconstruire l'Exchange
+    if cache_key in _exchange_cache and time.time() - _exchange_created_at.get(cache_key, 0) > METADATA_REFRESH_SECONDS:
+        del _exchange_cache[cache_key]
+    
     if cache_key not in _exchange_cache:
         account = Account.from_key(private_key)
+        spot_meta = get_spot_meta()
         if use_hip3:
-            # Exchange pour les DEXs HIP-3
-            _exchange_cache[cache_key] = Exchange(
+            # Exchange pour les DEXs HIP-3 découverts
+            exchange = Exchange(
                 wallet=account,
-                base_url=constants.MAINNET_API_URL,
-                perp_dexs=HIP3_DEXS
+                base_url=API_BASE_URL,
+                spot_meta=spot_meta,
+                perp_dexs=dex_registry.hip3_dexs(),
+                timeout=ORDER_TIMEOUT_SECONDS
             )
         else:
             # Exchange pour le main DEX (sans perp_dexs)
-            _exchange_cache[cache_key] = Exchange(
+            exchange = Exchange(
                 wallet=account,
-                base_url=constants.MAINNET_API_URL
+                base_url=API_BASE_URL,
+                spot_meta=spot_meta,
+                timeout=ORDER_TIMEOUT_SECONDS
             )
+        _order_specs.update(compile_order_specs(exchange.info, spot_meta, get_dex_quote_asset))
+        _exchange_cache[cache_key] = exchange
+        _exchange_created_at[cache_key] = time.time()
     
     return _exchange_cache[cache_key]
 
+def get_order_spec(coin: str) -> Optional[OrderSpec]:
+    """Spec d'ordre précompilée pour un coin ("@pair_index", "BTC", "flx:TSLA"), None si inconnue"""
+    return _order_specs.get(coin)
+
+def get_order_quote_asset(coin: str, pair_index: Optional[int] = None) -> str:
+    """Quote asset d'un coin : depuis la spec précompilée si disponible, sinon via l'API"""
+    spec = _order_specs.get(coin)
+    if spec is not None:
+        return spec.quote_asset
+    return get_quote_asset_for_coin(coin, pair_index)
+
+def prepare_order_specs(private_key: str, use_hip3: bool) -> None:
+    """Initialise les Exchange (et compile les specs d'ordres) au démarrage"""
+    get_exchange(private_key, use_hip3=False)
+    if use_hip3:
+        get_exchange(private_key, use_hip3=True)
+
+def _on_dex_list_change(dexs: List[str]) -> None:
+    """Invalide les Exchange HIP-3 en cache quand la liste des DEXs change"""
+    for key in [k for k in _exchange_cache if k.endswith("_hip3")]:
+        del _exchange_cache[key]
+    for coin in [c for c, spec in _order_specs.items() if spec.asset_id >= HIP3_ASSET_OFFSET]:
+        del _order_specs[coin]
+    print(f"🔎 DEXs HIP-3 mis à jour: {', '.join(dexs) if dexs else 'aucun'}")
+
+dex_registry.on_change(_on_dex_list_change)
+
+def prepare_order(private_key: str, coin: str, is_buy: bool, size_tokens: float, limit_price: float,
+                  sz_decimals: int, is_perp: bool,
+                  slippage_bps: float = DEFAULT_SLIPPAGE_BUDGET_BPS) -> Tuple[Exchange, OrderSpec, float, float]:
+    """
+    Exchange, spec et (taille, prix limite) arrondis d'un ordre IOC.
+    Le prix limite inclut un buffer (1% par défaut, budget de slippage de l'actif) pour garantir l'exécution.
+    """
+    # Récupérer le bon exchange selon le type d'asset (HIP-3 si le coin contient ":" comme "flx:TSLA")
+    exchange = get_exchange(private_key, use_hip3=":" in coin)
+    
+    # Spec précompilée depuis le SDK (plus fiable) ; repli sur les décimales de la config
+    spec = _order_specs.get(coin)
+    if spec is None:
+        spec = OrderSpec.build(coin, -1, sz_decimals, not is_perp, get_quote_asset_for_coin(coin))
+    
+    # Arrondir la taille au bon nombre de décimales
+    size_rounded = spec.quantize_size(size_tokens)
+    
+    # Prix avec buffer pour garantir l'exécution IOC
+    buffer = slippage_bps / 10000
+    price_with_buffer = limit_price * (1 + buffer) if is_buy else limit_price * (1 - buffer)
+    
+    # Arrondir le prix (5 chiffres significatifs et tick du marché)
+    return exchange, spec, size_rounded, spec.quantize_price(price_with_buffer)
+
 def place_order(
     private_key: str,
     coin: str, # Pour spot: "@pair_index", Pour perp: "ASSET_NAME" ou "DEX:ASSET_NAME"
@@ -326,72 +383,56 @@ def place_order(
     sz_decimals: int,
     is_perp: bool,
     dry_run: bool = False,
-    dex: str = ""  # DEX name pour les positions HIP-3 (flx, vntl, etc.)
-) -> Tuple[bool, str]:
+    dex: str = "",  # DEX name pour les positions HIP-3 (flx, vntl, etc.)
+    cloid: Optional[Cloid] = None,
+    slippage_bps: float = DEFAULT_SLIPPAGE_BUDGET_BPS,
+    vault_address: Optional[str] = None  # Sous-compte / vault pour lequel la clé signe
+) -> Tuple[bool, str, Optional[OrderFill]]:
     """
     Place un ordre spot ou perpétuel IOC.
-    Retourne (success, message)
+    Retourne (success, message, exécution) ; l'exécution est None en dry-run ou si rien n'a été rempli
+    Avec un cloid, un envoi sans réponse exploitable (timeout, 5xx) lève OrderAmbiguousError :
+    l'ordre a pu être exécuté et doit être vérifié avant tout nouvel essai.
     """
     action = "BUY" if is_buy else "SELL"
     market_type = "PERP" if is_perp else "SPOT"
     dex_label = f"[{dex}]" if dex else ""
     
     try:
-        # Déterminer si c'est un asset HIP-3 (contient ":" comme "flx:TSLA")
-        is_hip3 = ":" in coin
-        
-        # Récupérer le bon exchange selon le type d'asset
-        exchange = get_exchange(private_key, use_hip3=is_hip3)
-        
-        # Récupérer sz_decimals et tick_size depuis le SDK (plus fiable)
-        sdk_sz_decimals = sz_decimals
-        tick_size = None
-        try:
-            asset_id = exchange.info.name_to_asset(coin)
-            sdk_sz_decimals = exchange.info.asset_to_sz_decimals.get(asset_id, sz_decimals)
-            tick_size = get_asset_tick_size(exchange, coin)
-        except Exception:
-            pass
-        
-        # Arrondir la taille au bon nombre de décimales
-        size_rounded = round(size_tokens, sdk_sz_decimals)
-        
-        # Prix avec 1% de buffer pour garantir l'exécution IOC
-        price_with_buffer = limit_price * 1.01 if is_buy else limit_price * 0.99
-        
-        # Arrondir le prix au tick size (utilise le tick_size du SDK si disponible)
-        price_rounded = round_price_to_tick(price_with_buffer, tick_size)
+        exchange, spec, size_rounded, price_rounded = prepare_order(
+            private_key, coin, is_buy, size_tokens, limit_price, sz_decimals, is_perp, slippage_bps
+        )
         
         if dry_run:
-            return True, f"[DRY RUN] {market_type} {action} {size_rounded} {coin} {dex_label}@ ${price_rounded}"
+            return True, f"[DRY RUN] {market_type} {action} {size_rounded} {coin} {dex_label}@ ${price_rounded}", None
         
         order_type = {"limit": {"tif": "Ioc"}}
         
         # Pour les positions HIP-3, le coin doit être au format "DEX:ASSET" (ex: "flx:TSLA")
         # Le SDK Hyperliquid détecte automatiquement spot/perp selon le format du coin
         # (spot commence par "@", perp est le nom de l'asset)
-        result = exchange.order(
-            name=coin,                      # name (peut être "flx:TSLA" pour HIP-3 ou "@pair_index" pour spot)
+        # Exchange partagé par tous les comptes de la clé : vaultAddress de cet ordre uniquement
+        result = exchange_call(
+            exchange, vault_address, "order",
+            name=spec.coin,                 # name ("flx:TSLA" pour HIP-3, nom SDK de la paire pour spot)
             is_buy=is_buy,                  # is_buy
             sz=size_rounded,                # sz (float)
             limit_px=price_rounded,         # limit_px (float)
             order_type=order_type,          # order_type IOC
-            reduce_only=False               # reduce_only
+            reduce_only=False,              # reduce_only
+            cloid=cloid                     # identifiant client (idempotence)
         )
         
-        # Vérifier le résultat
-        if result.get("status") == "ok":
-            # Vérifier si l'ordre a été rempli ou s'il y a une erreur dans les statuses
-            response = result.get("response", {})
-            statuses = response.get("data", {}).get("statuses", [])
-            if statuses and "error" in statuses[0]:
-                return False, f"❌ Erreur {market_type}: {statuses[0]['error']}"
-            return True, f"✅ {market_type} {action} exécuté: {result}"
-        else:
-            return False, f"❌ Erreur {market_type}: {result}"
+        # Vérifier le résultat (erreur globale ou dans les statuses)
+        error = order_error(result)
+        if error is not None:
+            return False, f"❌ Erreur {market_type}: {error}", None
+        return True, f"✅ {market_type} {action} exécuté: {result}", parse_order_fill(result, coin, is_buy)
             
     except Exception as e:
-        return False, f"❌ Exception {market_type}: {e}"
+        if cloid is not None and is_ambiguous_error(e):
+            raise OrderAmbiguousError(str(e)) from e
+        return False, f"❌ Exception {market_type}: {e}", None
 
 class CooldownManager:
     """Gère les cooldowns par token/actif"""
@@ -441,42 +482,358 @@ def check_rebalance(current_usd: float, target_usd: float,
 class WalletBot:
     """Bot pour un wallet individuel"""
     
-    def __init__(self, wallet_id: int, config: Dict, dry_run: bool = False):
+    def __init__(self, wallet_id: int, config: Dict, dry_run: bool = False,
+                 snapshot_writer: Optional[SnapshotWriter] = None,
+                 order_pipeline: Optional[OrderPipeline] = None,
+                 use_position_cache: bool = True,
+                 inflight: Optional[InFlightTable] = None,
+                 paper: Optional[PaperExchange] = None,
+                 order_limiter: Optional[RateLimiter] = None,
+                 l2_books: Optional[L2BookCache] = None,
+                 fast_path_epsilon_bps: Optional[float] = None):
         self.wallet_id = wallet_id
         self.config = config
         self.dry_run = dry_run
         
-        # Récupération des clés/adresses
-        self.address = os.getenv(f"HL_ADDRESS_{wallet_id}")
-        self.private_key = os.getenv(f"HL_PRIVATE_KEY_{wallet_id}")
+        # Historique colonnaire des cycles (optionnel)
+        self.snapshot_writer = snapshot_writer
+        self._snapshot_rows: List[SnapshotRow] = []
+        
+        # Pipeline de signature/envoi partagé entre wallets (sinon ordres synchrones)
+        self.order_pipeline = order_pipeline
+        
+        # Ordres envoyés au résultat encore inconnu (cloids), partagés entre wallets et persistés
+        self.inflight = inflight if inflight is not None else InFlightTable(cache_file=None)
+        
+        # Exchange simulé (dry-run) : balances et positions virtuelles alimentées par les ordres
+        self.paper = paper
+        
+        # Instantanés l2Book partagés (prix limite depuis le carnet), sinon mid ± budget de slippage
+        self.l2_books = l2_books
+        
+        # Chemin rapide (--fast-path) : un actif dont prix, balance, cible, cooldown et pause n'ont pas
+        # bougé (à l'epsilon près) depuis sa dernière évaluation sans action n'est ni réévalué ni affiché
+        self.fast_path_epsilon = fast_path_epsilon_bps / 10000 if fast_path_epsilon_bps is not None else None
+        # actif -> (prix, balance, cible, en cooldown, en pause, ligne d'instantané) du dernier calcul complet
+        self._last_inputs: Dict[str, Tuple[float, float, float, bool, bool, SnapshotRow]] = {}
+        self.unchanged = 0
+        
+        # État exposé par l'API de contrôle : actifs en pause ("*" = tous), dernier ordre, latence du cycle
+        self.paused: set = set()
+        self.last_order: Optional[Dict[str, Any]] = None
+        self.last_cycle_ms = 0.0
+        self.last_cycle_at = 0.0
+        
+        # Actions décidées pendant le cycle, envoyées ensuite par priorité (écart au-delà du seuil)
+        self._candidates: List[OrderCandidate] = []
+        # Limiteur de débit des ordres (partagé par toute la flotte dans la boucle principale)
+        self.order_limiter = order_limiter if order_limiter is not None else RateLimiter()
+        
+        # Actifs ignorés au dernier cycle faute de données complètes et fraîches : (actif, donnée manquante)
+        self.skipped: List[Tuple[str, str]] = []
+        self._spot_state_missing = False
+        
+        # Récupération des clés/adresses (sous-compte / vault : clé d'agent partagée + vault_address)
+        self.address, self.private_key, self.vault_address = wallet_credentials(wallet_id)
         
         if not self.address or not self.private_key:
+            if self.vault_address:
+                raise ValueError(f"HL_AGENT_KEY ou HL_PRIVATE_KEY_{wallet_id} non configuré pour le vault/sous-compte "
+                                 f"HL_VAULT_ADDRESS_{wallet_id}.")
             raise ValueError(f"HL_ADDRESS_{wallet_id} ou HL_PRIVATE_KEY_{wallet_id} non configuré dans les variables d'environnement.")
         
         settings = config.get("settings", {})
         self.order_size = settings.get("order_size_usd", 11)
         self.cooldown_min = settings.get("cooldown_minutes", 15)
         self.check_interval = settings.get("check_interval_seconds", 60)
+        self.max_stale_seconds = settings.get("max_stale_data_seconds", DEFAULT_MAX_STALE_SECONDS)
+        self.default_fee_pct = settings.get("default_fee_pct", 0.07)
+        # Taille des ordres : order_size_usd fixe, ou notionnel jusqu'à la cible (sizing_mode = "target")
+        self.sizing = SizingPolicy(settings, self.order_size)
         
         self.cooldowns = CooldownManager(self.cooldown_min)
+        
+        # Vue locale du compte pendant le cycle, mise à jour à chaque exécution
+        self.balances: Dict[str, float] = {}
+        self.positions: Dict[Tuple[str, str], PerpPosition] = {}
+        
+        # Cache de positions/balances tenu à jour par le flux d'exécutions (évite les états complets)
+        self.position_cache = PositionCache(
+            settings.get("position_reconcile_seconds", DEFAULT_RECONCILE_SECONDS)
+        ) if use_position_cache else None
+        self._last_plan: Optional[WalletPlan] = None
+    
+    def uses_hip3(self) -> bool:
+        """True si au moins un perp activé est sur un DEX HIP-3"""
+        return any(
+            tc.get("enabled", False) and perp_dex_for(asset_name, tc)
+            for asset_name, tc in self.config.get("perpetuals", {}).items()
+        )
+    
+    def plan(self) -> WalletPlan:
+        """
+        Requêtes info minimales pour ce wallet (selon les actifs activés).
+        Avec un cache de positions à jour, les états complets sont remplacés par le flux d'exécutions.
+        """
+        plan = plan_wallet(self.wallet_id, self.address, self.config)
+        if self.paper is not None and self.paper.account(self.wallet_id) is not None:
+            plan.use_local_state()
+        elif self.position_cache is not None and self.position_cache.is_fresh():
+            plan.use_fill_stream(self.position_cache.last_fill_ms)
+        self._last_plan = plan
+        return plan
+    
+    def is_paused(self, asset: str) -> bool:
+        return "*" in self.paused or asset in self.paused
+    
+    def status(self) -> Dict[str, Any]:
+        """Instantané du dernier cycle pour l'API de contrôle (dict autonome, publié tel quel)"""
+        now = time.time()
+        assets = []
+        for row in self._snapshot_rows:
+            remaining = self.cooldowns.remaining(row.asset)
+            assets.append({
+                "asset": row.asset,
+                "kind": "spot" if row.kind == KIND_SPOT else "perp",
+                "balance": row.balance,
+                "price": row.price,
+                "current_usd": round(row.notional, 2),
+                "target_usd": row.target,
+                "deviation": round(row.deviation, 2),
+                "cooldown_until": now + remaining if remaining else 0.0,
+                "paused": self.is_paused(row.asset),
+            })
+        return {
+            "wallet": self.wallet_id,
+            "address": self.address,
+            "vault": self.vault_address is not None,
+            "updated_at": self.last_cycle_at or now,
+            "cycle_ms": round(self.last_cycle_ms, 1),
+            "assets": assets,
+            "paused": sorted(self.paused),
+            "skipped": [{"asset": asset, "missing": reason} for asset, reason in self.skipped],
+            "last_order": self.last_order,
+        }
+    
+    def _spot_pairs(self) -> Dict[str, Tuple[str, str]]:
+        """Coins spot configurés ("@107" et nom SDK) -> (token, quote asset)"""
+        pairs = {}
+        for token, tc in self.config.get("spot_tokens", {}).items():
+            pair_index = tc.get("pair_index")
+            if pair_index is None:
+                continue
+            coin = f"@{pair_index}"
+            pair = (token, get_order_quote_asset(coin, pair_index))
+            pairs[coin] = pair
+            spec = get_order_spec(coin)
+            if spec is not None:
+                pairs[spec.coin] = pair
+        return pairs
+    
+    def _load_account_state(self, plan: WalletPlan, data: CycleData,
+                            deadline: Optional[float] = None) -> Optional[List[str]]:
+        """
+        Remplit self.balances / self.positions pour le cycle, depuis le flux d'exécutions (cache)
+        ou depuis les états complets. Retourne les DEXs en erreur, None si l'état est inutilisable.
+        Sans état spot, les positions perps restent utilisables (self._spot_state_missing).
+        """
+        self._spot_state_missing = False
+        if self.paper is not None:
+            account = self.paper.account(self.wallet_id)
+            if account is not None:
+                # Copie de l'état virtuel : la vue du cycle évolue avec les ordres, le compte avec les exécutions
+                self.balances, self.positions = account.view()
+                return []
+        
+        cache = self.position_cache
+        if plan.fills_query is not None:
+            try:
+                fills = data.get(plan.fills_query)
+                ledger = data.get(plan.ledger_query)
+            except INFO_ERRORS as e:
+                cache.invalidate("flux indisponible")
+                print(f"❌ Flux d'exécutions indisponible ({e}), réconciliation au prochain cycle")
+                return None
+            cache.apply_ledger(ledger)
+            applied = cache.apply_fills(fills, self._spot_pairs(), get_dex_quote_asset)
+            if cache.is_fresh():
+                if applied:
+                    print(f"\n📥 {applied} exécution(s) externe(s) appliquée(s) au cache")
+                self.balances = cache.balances
+                self.positions = cache.positions
+                return []
+            # Dérive ou mouvement de fonds : état complet immédiat pour ce wallet
+            print(f"\n🔁 Réconciliation ({cache.reconcile_reason})")
+            plan = plan_wallet(self.wallet_id, self.address, self.config)
+            # Prix et contextes déjà disponibles dans `data` : seuls les états sont refaits
+            plan.needs_mids = False
+            plan.meta_dexs = []
+            data = execute_plan(CyclePlan([plan]), api_call, info_breakers, info_last_good, self.max_stale_seconds,
+                                deadline=deadline)
+        
+        # Sans état spot, les balances se limitent à l'USDC withdrawable (achats et tokens spot ignorés)
+        self._spot_state_missing = plan.spot_state is not None and plan.spot_state in data.errors
+        balances = data.spot_balances(self.address) if not self._spot_state_missing else {}
+        all_perp_positions, failed_dexs = data.perp_positions(self.address, plan.perp_states)
+        if self.paper is not None:
+            if failed_dexs or self._spot_state_missing:
+                print(f"⚠️  État réel incomplet, comptes virtuels initialisés au prochain cycle")
+                return None
+            print(f"\n📄 Compte virtuel initialisé depuis l'état réel")
+            self.balances, self.positions = self.paper.seed(self.wallet_id, balances, all_perp_positions).view()
+            return failed_dexs
+        if cache is not None:
+            # Réconcilier uniquement depuis un état complet, frais et sans DEX en erreur
+            if not failed_dexs and not self._spot_state_missing and not data.stale_for(plan.queries()):
+                cache.reconcile(balances, all_perp_positions, data.started_at)
+                self.balances = cache.balances
+                self.positions = cache.positions
+                return failed_dexs
+            cache.invalidate("état incomplet")
+        self.balances = balances
+        self.positions = {(p.dex, p.coin): p for p in all_perp_positions if p.coin}
+        return failed_dexs
+    
+    def run_cycle(self, data: Optional[CycleData] = None, defer_orders: bool = False,
+                  deadline: Optional[float] = None):
+        """
+        Exécute un cycle de rebalancing (Spot et Futures).
+        `data` contient les résultats partagés du cycle ; si absent, le wallet exécute son propre plan.
+        Les actions déclenchées sont envoyées en fin de cycle par priorité ; avec defer_orders, elles
+        restent en attente (take_candidates) pour une file commune à tous les wallets.
+        `deadline` (time.monotonic()) borne les requêtes faites par le wallet lui-même (réconciliation,
+        orderStatus) ; les actifs dont les données manquent sont ignorés et listés dans self.skipped.
+        """
+        self._candidates = []
+        self.skipped = []
+        self.unchanged = 0
+        self._evaluate(data, deadline)
+        if not defer_orders and self._candidates:
+            queue = DispatchQueue()
+            queue.extend(self.take_candidates())
+            queue.dispatch(self.dispatch)
+    
+    def take_candidates(self) -> List[OrderCandidate]:
+        """Actions du dernier cycle non encore envoyées (la liste est vidée)"""
+        candidates, self._candidates = self._candidates, []
+        return candidates
+    
+    def dispatch(self, candidate: OrderCandidate) -> bool:
+        """
+        Envoie une action en attente après avoir revérifié la balance de quote (des ordres plus
+        prioritaires du même wallet ont pu la consommer). Retourne True si l'ordre est parti.
+        """
+        order = candidate.order
+        if order["is_buy"]:
+            quote_asset = order["quote_asset"]
+            quote_balance = self.balances.get(quote_asset, 0)
+            needed = max(self.order_size, order["size_tokens"] * order["price"])
+            if quote_balance < needed:
+                print(f"   [Wallet {self.wallet_id}] ⚠️  {candidate.asset}: {quote_asset} insuffisant "
+                      f"(${quote_balance:.2f} < ${needed:.2f}) après les ordres prioritaires")
+                return False
+        self.order_limiter.acquire()
+        print(f"   [Wallet {self.wallet_id}] {candidate.asset} ({candidate.deviation:+.1f}%, "
+              f"{candidate.excess:+.1f}% au-delà du seuil)")
+        self._execute_order(**order)
+        return True
+    
+    def _queue_order(self, deviation: float, action: str, tc: Dict[str, Any], **order: Any):
+        """Met une action déclenchée en attente d'envoi, avec sa priorité"""
+        excess = threshold_excess(deviation, action, tc.get("buy_threshold_pct", 50), tc.get("sell_threshold_pct", 50))
+        self._candidates.append(OrderCandidate(self.wallet_id, order["asset"], excess, deviation, order))
+        print(f"   ⏩ {action.upper()} en file (priorité {excess:+.1f}% au-delà du seuil)")
+    
+    def _unchanged_row(self, asset: str, price: float, balance: float, target: float) -> Optional[SnapshotRow]:
+        """Ligne du dernier calcul complet si les entrées de l'actif n'ont pas bougé (chemin rapide), sinon None"""
+        if self.fast_path_epsilon is None:
+            return None
+        last = self._last_inputs.get(asset)
+        if last is None:
+            return None
+        last_price, last_balance, last_target, cooling, paused, row = last
+        if target != last_target or cooling == self.cooldowns.can_trade(asset) or paused != self.is_paused(asset):
+            return None
+        eps = self.fast_path_epsilon
+        # Écart mesuré depuis le dernier calcul complet : les petits mouvements ne s'accumulent pas sans limite
+        if abs(price - last_price) > eps * abs(last_price) or abs(balance - last_balance) > eps * abs(last_balance):
+            return None
+        return row
     
-    def run_cycle(self):
-        """Exécute un cycle de rebalancing (Spot et Futures)"""
+    def _remember_inputs(self, asset: str, price: float, balance: float, target: float, row: SnapshotRow):
+        """Entrées d'un actif évalué sans action (OK, cooldown ou pause) : candidat au chemin rapide"""
+        if self.fast_path_epsilon is not None:
+            self._last_inputs[asset] = (price, balance, target, not self.cooldowns.can_trade(asset),
+                                        self.is_paused(asset), row)
+    
+    def _skip(self, asset: str, missing: str):
+        """Actif ignoré ce cycle : une de ses données manque (échec ou échéance dépassée)"""
+        self.skipped.append((asset, missing))
+        metrics.incr("assets_skipped_total", wallet=self.wallet_id, missing=missing)
+    
+    def _skip_all(self, missing: str):
+        """État du compte inutilisable : tous les actifs activés sont ignorés"""
+        for section in ("spot_tokens", "perpetuals"):
+            for asset, tc in self.config.get(section, {}).items():
+                if tc.get("enabled", False):
+                    self._skip(asset, missing)
+    
+    def _evaluate(self, data: Optional[CycleData], deadline: Optional[float] = None):
+        """Charge l'état du cycle, évalue spot et perps et enregistre l'instantané"""
         print(f"\n{'='*60}")
         print(f"🔄 Wallet {self.wallet_id} - {datetime.now().strftime('%H:%M:%S')}")
-        print(f"   {self.address[:10]}...{self.address[-6:]}")
+        vault = " (sous-compte/vault)" if self.vault_address else ""
+        print(f"   {self.address[:10]}...{self.address[-6:]}{vault}")
         print(f"{'='*60}")
         
+        # Plan utilisé par la boucle principale pour `data` (sinon, plan propre au wallet)
+        plan = self._last_plan if data is not None and self._last_plan is not None else self.plan()
+        self._last_plan = None
+        if plan.is_empty():
+            print("\n   Aucun actif activé, rien à faire.")
+            return
+        
         # 1. Récupérer les données de marché (Spot et Perpétuels)
+        if data is None:
+            data = execute_plan(CyclePlan([plan]), api_call, info_breakers, info_last_good, self.max_stale_seconds,
+                                deadline=deadline)
+        
+        # Données sans réponse ni repli récent : seuls les actifs qui n'en dépendent pas sont évalués
+        missing = data.missing_for(plan.queries())
+        if missing:
+            details = ", ".join(
+                f"{q.type}/{q.dex or 'main'}" + (" (délai dépassé)" if isinstance(e, FetchDeadlineError) else "")
+                for q, e in missing.items()
+            )
+            print(f"\n⌛ Données incomplètes: {details}")
+        incomplete = {q.type for q in missing}
         try:
-            mids = get_all_mids()
-            spot_meta = get_spot_meta()
-            all_perp_positions = get_all_perp_positions(self.address)
-            perp_meta, asset_ctx_map = get_perp_meta_and_contexts()
-            balances = get_spot_balances(self.address)
-        except requests.exceptions.RequestException as e:
+            mids = data.mids() if ALL_MIDS not in missing else {}
+            market = data.market()
+            if self.paper is not None:
+                self.paper.refresh_marks(self.wallet_id, mids)
+            failed_dexs = self._load_account_state(plan, data, deadline)
+        except INFO_ERRORS as e:
             print(f"❌ Erreur de connexion à l'API Hyperliquid: {e}")
+            self._skip_all("état du compte")
             return
+        if failed_dexs is None:
+            self._skip_all("état du compte")
+            return
+        if self._spot_state_missing:
+            incomplete.add("spotClearinghouseState")
+        balances = self.balances
+        if self.position_cache is not None:
+            self.position_cache.refresh_marks(market, mids)
+        
+        # Ordres au résultat inconnu : vérifiés avant toute nouvelle décision sur leur actif
+        self._resolve_inflight(deadline)
+        
+        # Signaler les données servies depuis le cache (endpoint/DEX indisponible)
+        stale = data.stale_for(plan.queries())
+        if stale:
+            details = ", ".join(f"{q.type}/{q.dex or 'main'} ({age:.0f}s)" for q, age in stale.items())
+            print(f"\n⏱️  Données en cache utilisées: {details}")
         
         # Afficher les balances des stablecoins disponibles
         usdc = balances.get("USDC", 0)
@@ -491,14 +848,249 @@ class WalletBot:
         print(f"\n💵 Balances: {' | '.join(stables) if stables else 'Aucun stablecoin'}")
         
         # 2. Gérer le rebalancing Spot
-        self._rebalance_spot(balances, mids, spot_meta)
+        self._snapshot_rows = []
+        self._rebalance_spot(balances, mids, incomplete)
+        
+        # 3. Gérer le rebalancing Futures (DEXs configurés uniquement)
+        self._rebalance_perpetuals(market, balances, mids, failed_dexs, incomplete)
         
-        # 3. Gérer le rebalancing Futures (tous DEX inclus)
-        self._rebalance_perpetuals(all_perp_positions, perp_meta, asset_ctx_map, balances, mids)
+        if self.unchanged:
+            print(f"\n⚡ {self.unchanged} actif(s) inchangé(s) depuis leur dernière évaluation, non réévalués")
+            metrics.incr("assets_fast_path_total", self.unchanged, wallet=self.wallet_id)
         
-    def _rebalance_spot(self, balances: Dict, mids: Dict, spot_meta: Dict):
-        """Logique de rebalancing pour les tokens Spot"""
+        if self.skipped:
+            details = ", ".join(f"{asset} ({reason})" for asset, reason in self.skipped)
+            print(f"\n⏭️  {len(self.skipped)} actif(s) ignoré(s) faute de données complètes: {details}")
+        
+        # 4. Enregistrer l'état du cycle dans l'historique
+        if self.snapshot_writer is not None:
+            try:
+                elapsed = self.snapshot_writer.append(self.wallet_id, self._snapshot_rows)
+                metrics.set("snapshot_write_ms", elapsed * 1000, wallet=self.wallet_id)
+            except OSError as e:
+                print(f"⚠️  Écriture de l'historique impossible: {e}")
+    
+    def _resolve_inflight(self, deadline: Optional[float] = None):
+        """
+        Résout via orderStatus (par cloid) les ordres du wallet au résultat inconnu.
+        Rempli : cooldown appliqué (l'exécution arrive par l'état complet ou le flux d'exécutions) ;
+        non exécuté : l'ordre quitte la table et un nouvel essai est permis.
+        Après l'échéance, les ordres restants sont laissés ambigus (leur actif reste bloqué).
+        """
+        for order in self.inflight.unresolved(self.wallet_id):
+            cloid = Cloid(order.cloid)
+            if deadline is not None and time.monotonic() >= deadline:
+                self.inflight.mark_ambiguous(cloid)
+                print(f"   ⌛ {order.asset}: ordre {order.cloid[:10]}… non vérifié (budget du cycle épuisé)")
+                continue
+            try:
+                response = api_call({"type": "orderStatus", "user": self.address, "oid": order.cloid})
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.inflight.mark_ambiguous(cloid)
+                print(f"   ❓ {order.asset}: statut de l'ordre {order.cloid[:10]}… indisponible ({e})")
+                continue
+            outcome, filled = classify_order_status(response, order.age)
+            if outcome is None:
+                self.inflight.mark_ambiguous(cloid)
+                print(f"   ❓ {order.asset}: ordre {order.cloid[:10]}… pas encore visible ({order.age:.0f}s), "
+                      f"nouvel ordre suspendu")
+                continue
+            self.inflight.settle(cloid)
+            metrics.incr("orders_resolved_total", wallet=self.wallet_id, outcome=outcome)
+            if outcome == FILLED:
+                self.cooldowns.record(order.asset)
+                print(f"   🔎 {order.asset}: ordre {order.cloid[:10]}… exécuté ({filled:g}/{order.size:g}), "
+                      f"cooldown appliqué")
+            else:
+                print(f"   🔎 {order.asset}: ordre {order.cloid[:10]}… non exécuté, nouvel essai permis")
+    
+    def _apply_fill(self, asset: str, kind: int, quote_asset: str, fill: OrderFill,
+                    position_key: Optional[Tuple[str, str]] = None):
+        """
+        Met à jour balances et positions locales avec la taille réellement exécutée
+        (un IOC peut n'être rempli que partiellement), sans nouvel appel API.
+        """
+        if kind == KIND_SPOT:
+            self.balances[asset] = self.balances.get(asset, 0) + fill.signed_size
+            quote_delta = -fill.signed_size * fill.avg_px
+        else:
+            key = position_key or ("main", asset)
+            pos = self.positions.get(key)
+            if pos is None:
+                pos = PerpPosition(key[0], key[1], 0.0, 0.0, 0.0)
+                self.positions[key] = pos
+            # Levier x1 : la marge engagée suit le notionnel de la position
+            quote_delta = -pos.apply_fill(fill.signed_size, fill.avg_px)
+        self.balances[quote_asset] = self.balances.get(quote_asset, 0) + quote_delta
+    
+    def _record_order(self, asset: str, kind: int, is_buy: bool, mid: float, fee_pct: float,
+                      success: bool, fill: Optional[OrderFill], quote_asset: str = "USDC",
+                      requested: float = 0.0, position_key: Optional[Tuple[str, str]] = None,
+                      pricing: str = "mid"):
+        """Cooldown (si succès), mise à jour de l'état local et enregistrement de l'exécution"""
+        if requested > 0 and (self.paper is not None or not self.dry_run):
+            self._record_fill_rate(pricing, requested, fill.size if fill is not None else 0.0)
+        self.last_order = {
+            "asset": asset,
+            "side": "buy" if is_buy else "sell",
+            "success": success,
+            "filled": fill.size if fill is not None else 0.0,
+            "avg_px": fill.avg_px if fill is not None else None,
+            "time": time.time(),
+        }
+        if success:
+            self.cooldowns.record(asset)
+        if fill is not None:
+            self._apply_fill(asset, kind, quote_asset, fill, position_key)
+            if self.position_cache is not None:
+                self.position_cache.note_acked(fill.oid)
+            if requested > 0 and fill.size < requested * (1 - 1e-9):
+                print(f"   ⚠️  Exécution partielle {asset}: {fill.size:g}/{requested:g} @ ${fill.avg_px:g}")
+        if fill is not None and self.snapshot_writer is not None:
+            try:
+                self.snapshot_writer.append_fills(self.wallet_id, [
+                    FillRow(asset, kind, is_buy, fill.size, fill.avg_px, mid, fee_pct)
+                ])
+            except OSError as e:
+                print(f"⚠️  Écriture de l'historique impossible: {e}")
+    
+    def _record_fill_rate(self, pricing: str, requested: float, filled: float):
+        """Taux de remplissage des IOC par mode de prix (mid / l2) : tailles cumulées et ratio"""
+        outcome = "full" if filled >= requested * (1 - 1e-9) else ("partial" if filled > 0 else "none")
+        metrics.incr("orders_fill_total", pricing=pricing, fill=outcome)
+        metrics.incr("order_size_requested_total", requested, pricing=pricing)
+        metrics.incr("order_size_filled_total", min(filled, requested), pricing=pricing)
+        total = metrics.get("order_size_requested_total", pricing=pricing)
+        if total > 0:
+            metrics.set("order_fill_rate", metrics.get("order_size_filled_total", pricing=pricing) / total,
+                        pricing=pricing)
+    
+    def _execute_order(self, asset: str, kind: int, coin: str, is_buy: bool, size_tokens: float, price: float,
+                       sz_decimals: int, is_perp: bool, label: str, fee_pct: float, quote_asset: str,
+                       dex: str = "", position_key: Optional[Tuple[str, str]] = None,
+                       slippage_bps: float = DEFAULT_SLIPPAGE_BUDGET_BPS):
+        """
+        Place un ordre IOC. Avec un pipeline (hors dry-run), l'ordre est signé et envoyé en arrière-plan ;
+        le résultat est affiché et enregistré quand la boucle principale draine le pipeline.
+        En attendant, le notionnel maximum d'un achat est réservé sur la balance de quote, pour que
+        les vérifications suivantes du cycle en tiennent compte.
+        """
+        decided_at = time.perf_counter()
+        blocker = self.inflight.blocking(self.wallet_id, asset)
+        if blocker is not None:
+            print(f"   ⏸️  {label}: ordre précédent {blocker.cloid[:10]}… au résultat inconnu, en attente de vérification")
+            return
+        
+        # Prix limite : niveau du carnet couvrant la taille (+ buffer), sinon mid ± budget de slippage
+        limit_price, pricing = price, "mid"
+        if self.l2_books is not None:
+            book_price = self.l2_books.limit_price(coin, is_buy, size_tokens, price, dex)
+            if book_price is not None:
+                limit_price, slippage_bps, pricing = book_price, 0.0, "l2"
+        
+        if self.paper is not None:
+            success, msg, fill, requested = self._paper_order(
+                asset, kind, coin, is_buy, size_tokens, price, sz_decimals, is_perp, fee_pct, quote_asset, position_key,
+                slippage_bps, limit_price
+            )
+            print(f"   🎯 {label}: {msg}")
+            self._record_order(asset, kind, is_buy, price, fee_pct, success, fill, quote_asset, requested, position_key,
+                               pricing)
+            return
+        
+        if self.order_pipeline is None or self.dry_run:
+            cloid = None
+            if not self.dry_run:
+                cloid = self.inflight.begin(self.wallet_id, self.address, asset, coin, is_buy, size_tokens,
+                                            self.cooldown_min * 60)
+            try:
+                success, msg, fill = place_order(
+                    self.private_key, coin, is_buy, size_tokens, limit_price, sz_decimals,
+                    is_perp=is_perp, dry_run=self.dry_run, dex=dex, cloid=cloid, slippage_bps=slippage_bps,
+                    vault_address=self.vault_address
+                )
+            except OrderAmbiguousError as e:
+                self.inflight.mark_ambiguous(cloid)
+                print(f"   🎯 {label}: ❓ Résultat inconnu ({e}), vérification via orderStatus")
+                self._resolve_inflight()
+                return
+            if cloid is not None:
+                self.inflight.settle(cloid)
+            print(f"   🎯 {label}: {msg}")
+            spec = get_order_spec(coin)
+            requested = spec.quantize_size(size_tokens) if spec is not None else size_tokens
+            self._record_order(asset, kind, is_buy, price, fee_pct, success, fill, quote_asset, requested, position_key,
+                               pricing)
+            return
+        
+        market_type = "PERP" if is_perp else "SPOT"
+        try:
+            exchange, spec, size_rounded, price_rounded = prepare_order(
+                self.private_key, coin, is_buy, size_tokens, limit_price, sz_decimals, is_perp, slippage_bps
+            )
+            if spec.asset_id < 0:
+                spec = spec._replace(asset_id=exchange.info.name_to_asset(spec.coin))
+        except Exception as e:
+            print(f"   🎯 {label}: ❌ Exception {market_type}: {e}")
+            return
+        
+        reserved = size_rounded * price_rounded if is_buy else 0.0
+        balances = self.balances
+        
+        cloid = self.inflight.begin(self.wallet_id, self.address, asset, coin, is_buy, size_rounded,
+                                    self.cooldown_min * 60)
+        
+        def on_done(ticket: OrderTicket):
+            # Libérer la réservation (sur les balances du cycle de l'ordre) avant d'appliquer l'exécution réelle
+            balances[quote_asset] = balances.get(quote_asset, 0) + reserved
+            if ticket.ambiguous:
+                self.inflight.mark_ambiguous(cloid)
+                print(f"   [Wallet {self.wallet_id}] 🎯 {label}: ❓ Résultat inconnu ({ticket.error}), "
+                      f"vérification via orderStatus")
+                self._resolve_inflight()
+                return
+            self.inflight.settle(cloid)
+            if ticket.success:
+                filled = f" ({ticket.fill.size:g} @ ${ticket.fill.avg_px:g})" if ticket.fill else ""
+                msg = f"✅ {market_type} exécuté{filled}"
+            else:
+                msg = f"❌ Erreur {market_type}: {ticket.error}"
+            print(f"   [Wallet {self.wallet_id}] 🎯 {label}: {msg} | décision→ack {ticket.ack_ms:.0f}ms")
+            self._record_order(asset, kind, is_buy, price, fee_pct, ticket.success, ticket.fill,
+                               quote_asset, size_rounded, position_key, pricing)
+        
+        ticket = OrderTicket(self.wallet_id, spec, is_buy, size_rounded, price_rounded, on_done, cloid)
+        ticket.decided_at = decided_at
+        balances[quote_asset] = balances.get(quote_asset, 0) - reserved
+        self.order_pipeline.submit(ticket, self.private_key, self.vault_address)
+        print(f"   🎯 {label}: ⏩ envoyé ({market_type} {size_rounded} @ ${price_rounded})")
+        
+    def _paper_order(self, asset: str, kind: int, coin: str, is_buy: bool, size_tokens: float, price: float,
+                     sz_decimals: int, is_perp: bool, fee_pct: float, quote_asset: str,
+                     position_key: Optional[Tuple[str, str]],
+                     slippage_bps: float = DEFAULT_SLIPPAGE_BUDGET_BPS,
+                     limit_price: Optional[float] = None) -> Tuple[bool, str, Optional[OrderFill], float]:
+        """Exécute l'ordre (arrondi comme un ordre réel) sur l'exchange simulé, au mid du cycle"""
+        try:
+            _, spec, size_rounded, price_rounded = prepare_order(
+                self.private_key, coin, is_buy, size_tokens, limit_price or price, sz_decimals, is_perp, slippage_bps
+            )
+        except Exception as e:
+            return False, f"❌ Exception {'PERP' if is_perp else 'SPOT'}: {e}", None, 0.0
+        success, msg, fill = self.paper.execute(
+            self.wallet_id, coin, is_buy, size_rounded, price, price_rounded, fee_pct, quote_asset,
+            base_asset=asset if kind == KIND_SPOT else None,
+            position_key=position_key or ("main", asset)
+        )
+        metrics.incr("paper_orders_total", wallet=self.wallet_id, status="ok" if fill is not None else "rejected")
+        return success, msg, fill, size_rounded
+    
+    def _rebalance_spot(self, balances: Dict, mids: Dict, incomplete: Optional[set] = None):
+        """Logique de rebalancing pour les tokens Spot (`incomplete` : types de requêtes sans données ce cycle)"""
         print("\n--- Rebalancing Spot ---")
+        incomplete = incomplete or set()
+        # Prix ou balances manquants : aucune décision spot sur des données partielles
+        missing = next((m for m in ("allMids", "spotClearinghouseState") if m in incomplete), None)
         
         tokens_config = self.config.get("spot_tokens", {})
         
@@ -514,29 +1106,54 @@ class WalletBot:
                 print(f"\n⚠️  {token}: Métadonnées manquantes, lancez autoconfig.py. Skip.")
                 continue
             
+            if missing:
+                print(f"\n⏭️  {token}: Données incomplètes ({missing}). Skip.")
+                self._skip(token, missing)
+                continue
+            
             # Calculer la valeur actuelle
             amount = balances.get(token, 0)
             price_key = f"@{pair_index}"
             price = mids.get(price_key, mids.get(token, 0))
-            current_usd = amount * price
-            
             target_usd = tc.get("hold_usd", 0)
+            
+            # Chemin rapide : entrées inchangées depuis la dernière évaluation sans action
+            row = self._unchanged_row(token, price, amount, target_usd)
+            if row is not None:
+                self._snapshot_rows.append(row)
+                self.unchanged += 1
+                continue
+            self._last_inputs.pop(token, None)
+            
+            current_usd = amount * price
             deviation = ((current_usd - target_usd) / target_usd * 100) if target_usd > 0 else 0
             
             # Récupérer le quote asset pour cette paire
             coin_key = f"@{pair_index}"
-            quote_asset = get_quote_asset_for_coin(coin_key, pair_index)
+            quote_asset = get_order_quote_asset(coin_key, pair_index)
             quote_balance = balances.get(quote_asset, 0)
             
+            row = SnapshotRow(
+                token, KIND_SPOT, amount, price, current_usd, target_usd, deviation, 0.0,
+                tc.get("buy_threshold_pct", 50), tc.get("sell_threshold_pct", 50)
+            )
+            self._snapshot_rows.append(row)
+            
             # Affichage status
             emoji = "🟢" if abs(deviation) <= 10 else ("🟡" if abs(deviation) <= 30 else "🔴")
             print(f"\n{emoji} {token} (Spot / {quote_asset}):")
             print(f"   {amount:.6f} @ ${price:.4f} = ${current_usd:.2f} | Target: ${target_usd:.2f} ({deviation:+.1f}%)")
             
+            if self.is_paused(token):
+                print(f"   ⏸️  En pause (API de contrôle)")
+                self._remember_inputs(token, price, amount, target_usd, row)
+                continue
+            
             # Vérifier cooldown
             if not self.cooldowns.can_trade(token):
                 remaining = self.cooldowns.remaining(token) / 60
                 print(f"   ⏳ Cooldown: {remaining:.1f}min")
+                self._remember_inputs(token, price, amount, target_usd, row)
                 continue
             
             # Vérifier si action nécessaire
@@ -556,40 +1173,38 @@ class WalletBot:
                     print(f"   ⚠️  {quote_asset} insuffisant (${quote_balance:.2f} < ${self.order_size})")
                     continue
                 
-                # Calculer la taille de l'ordre
-                size_tokens = self.order_size / price
-                
-                # Placer l'ordre
-                success, msg = place_order(
-                    self.private_key,
-                    coin_key,
-                    is_buy,
-                    size_tokens,
-                    price,
-                    sz_decimals,
-                    is_perp=False,
-                    dry_run=self.dry_run
-                )
-                print(f"   🎯 {action.upper()} {size_tokens:.6f} {token} ({quote_asset}): {msg}")
-                if success:
-                    self.cooldowns.record(token)
+                # Calculer la taille de l'ordre (une ou plusieurs tranches selon le mode de sizing)
+                slices = self.sizing.slices(tc, current_usd, target_usd, is_buy, quote_balance)
+                for i, notional in enumerate(slices, 1):
+                    size_tokens = notional / price
+                    part = f" [{i}/{len(slices)}]" if len(slices) > 1 else ""
+                    
+                    # Mettre l'ordre en file (envoi par priorité en fin d'évaluation)
+                    self._queue_order(
+                        deviation, action, tc,
+                        asset=token, kind=KIND_SPOT, coin=coin_key, is_buy=is_buy, size_tokens=size_tokens,
+                        price=price, sz_decimals=sz_decimals, is_perp=False,
+                        label=f"{action.upper()} {size_tokens:.6f} {token} ({quote_asset}){part}",
+                        fee_pct=tc.get("fee_pct", self.default_fee_pct),
+                        quote_asset=quote_asset,
+                        slippage_bps=self.sizing.slippage_bps(tc)
+                    )
             else:
                 print(f"   ✓ OK")
+                self._remember_inputs(token, price, amount, target_usd, row)
 
-    def _rebalance_perpetuals(self, all_perp_positions: List[Tuple[str, Dict]], perp_meta: Dict, asset_ctx_map: Dict, balances: Dict[str, float], mids: Dict[str, float]):
+    def _rebalance_perpetuals(self, market: MarketState, balances: Dict[str, float], mids: Dict[str, float], failed_dexs: Optional[List[str]] = None,
+                              incomplete: Optional[set] = None):
         """Logique de rebalancing pour les contrats perpétuels (tous DEX inclus)"""
         print("\n--- Rebalancing Futures (Main + HIP-3) ---")
+        incomplete = incomplete or set()
         
         # Configuration des perpétuels
         perpetuals_config = self.config.get("perpetuals", {})
         
-        # Créer un dictionnaire des positions ouvertes par (dex, asset_name)
-        # Format: {(dex_name, asset_name): position_data}
-        open_positions = {}
-        for dex_name, pos in all_perp_positions:
-            asset_name = pos.get("coin", "")
-            if asset_name:
-                open_positions[(dex_name, asset_name)] = pos
+        # Positions ouvertes par (dex, asset_name), chargées pour le cycle (état complet ou cache)
+        # Format: {(dex_name, asset_name): PerpPosition}
+        open_positions = self.positions
         
         # Parcourir la configuration pour les actifs à gérer
         for asset_name, tc in perpetuals_config.items():
@@ -604,6 +1219,12 @@ class WalletBot:
                 print(f"\n⚠️  {asset_name}: Métadonnées manquantes, lancez autoconfig.py. Skip.")
                 continue
             
+            # Sans l'état du DEX, la position est inconnue (ne pas la supposer nulle)
+            if failed_dexs and perp_dex_for(asset_name, tc) in failed_dexs:
+                print(f"\n⚠️  {asset_name}: État du DEX '{perp_dex_for(asset_name, tc) or 'main'}' indisponible. Skip.")
+                self._skip(asset_name, f"clearinghouseState/{perp_dex_for(asset_name, tc) or 'main'}")
+                continue
+            
             # Extraire le nom d'asset "pur" (sans préfixe dex) pour la recherche
             # Ex: "flx:TSLA" -> "TSLA", "BTC" -> "BTC"
             if ":" in asset_name:
@@ -637,11 +1258,11 @@ class WalletBot:
                             dex_name = d
                             break
             
-            szi = float(pos.get("szi", 0)) if pos else 0
+            szi = pos.szi if pos else 0
             
             # Récupérer le prix d'entrée et le PnL non réalisé depuis la position
-            entry_price = float(pos.get("entryPx", 0)) if pos else 0
-            unrealized_pnl = float(pos.get("unrealizedPnl", 0)) if pos else 0
+            entry_price = pos.entry_px if pos else 0
+            unrealized_pnl = pos.unrealized_pnl if pos else 0
             
             # Récupérer le prix mark - PRIORITÉ aux mids (plus fiable et à jour)
             mark_price = 0
@@ -655,19 +1276,19 @@ class WalletBot:
             # 3. Essayer avec le nom pur (pour main DEX)
             elif pure_asset_name in mids:
                 mark_price = mids[pure_asset_name]
-            # 4. Fallback: asset_ctx_map
+            # 4. Fallback: contextes d'actifs (markPx déjà parsé)
             if mark_price == 0:
-                asset_ctx = asset_ctx_map.get(pure_asset_name, asset_ctx_map.get(asset_name, {}))
-                mark_price = float(asset_ctx.get("markPx", 0))
+                mark_price = market.mark_price(pure_asset_name, market.mark_price(asset_name))
+            
+            # Sans allMids ni contexte d'actif, les prix dérivés de la position ne sont pas assez frais
+            if mark_price == 0 and "allMids" in incomplete:
+                print(f"\n⏭️  {asset_name}: Données incomplètes (allMids). Skip.")
+                self._skip(asset_name, "allMids")
+                continue
             
             # 5. Si pas de prix, essayer depuis la position
             if mark_price == 0 and pos:
-                mark_from_pos = pos.get("markPx", 0)
-                if mark_from_pos and mark_from_pos != "N/A":
-                    try:
-                        mark_price = float(mark_from_pos)
-                    except (ValueError, TypeError):
-                        pass
+                mark_price = pos.mark_px
             
             # 6. CALCUL INTELLIGENT: Déduire le mark_price à partir du unrealized_pnl
             # Pour long: pnl = szi * (mark - entry) => mark = entry + (pnl / szi)
@@ -686,6 +1307,15 @@ class WalletBot:
                 print(f"\n⚠️  {asset_name}: Prix mark non disponible. Skip.")
                 continue
             
+            # Chemin rapide : entrées inchangées depuis la dernière évaluation sans action
+            target_usd = tc.get("hold_usd", 0)
+            row = self._unchanged_row(asset_name, mark_price, szi, target_usd)
+            if row is not None:
+                self._snapshot_rows.append(row)
+                self.unchanged += 1
+                continue
+            self._last_inputs.pop(asset_name, None)
+            
             # Calculer le PnL en pourcentage
             # Méthode 1: Basé sur unrealized_pnl de l'API (plus précis, inclut funding)
             # PnL % = unrealized_pnl / valeur_initiale_position
@@ -702,7 +1332,6 @@ class WalletBot:
             
             # Valeur notionnelle actuelle (Current Notional Value)
             current_notional_usd = abs(szi) * mark_price
-            target_usd = tc.get("hold_usd", 0)
             
             if target_usd <= 0:
                 print(f"   [SKIP] {asset_name}: hold_usd <= 0.")
@@ -711,6 +1340,12 @@ class WalletBot:
             # Calcul de la déviation
             deviation = ((current_notional_usd - target_usd) / target_usd * 100) if target_usd > 0 else 0
             
+            row = SnapshotRow(
+                asset_name, KIND_PERP, szi, mark_price, current_notional_usd, target_usd, deviation, unrealized_pnl,
+                tc.get("buy_threshold_pct", 50), tc.get("sell_threshold_pct", 50)
+            )
+            self._snapshot_rows.append(row)
+            
             # Affichage status
             emoji = "🟢" if abs(deviation) <= 10 else ("🟡" if abs(deviation) <= 30 else "🔴")
             dex_label = f"[{dex_name}]" if dex_name != "main" else "[Main]"
@@ -721,10 +1356,16 @@ class WalletBot:
             pnl_emoji = "📈" if unrealized_pnl >= 0 else "📉"
             print(f"   {pnl_emoji} PnL: ${unrealized_pnl:+.2f} ({pnl_pct:+.2f}%) | Target: ${target_usd:.2f} ({deviation:+.1f}%)")
             
+            if self.is_paused(asset_name):
+                print(f"   ⏸️  En pause (API de contrôle)")
+                self._remember_inputs(asset_name, mark_price, szi, target_usd, row)
+                continue
+            
             # Vérifier cooldown
             if not self.cooldowns.can_trade(asset_name):
                 remaining = self.cooldowns.remaining(asset_name) / 60
                 print(f"   ⏳ Cooldown: {remaining:.1f}min")
+                self._remember_inputs(asset_name, mark_price, szi, target_usd, row)
                 continue
             
             # Vérifier si action nécessaire
@@ -745,11 +1386,15 @@ class WalletBot:
                     coin_for_order = asset_name
                 
                 # Déterminer le quote asset pour cet ordre
-                quote_asset = get_quote_asset_for_coin(coin_for_order)
+                quote_asset = get_order_quote_asset(coin_for_order)
                 quote_balance = balances.get(quote_asset, 0)
                 
                 # Vérifier si on a assez de quote asset pour un achat
                 is_buy = action == "buy"
+                if is_buy and "spotClearinghouseState" in incomplete:
+                    print(f"   ⏭️  Achat ignoré: balance {quote_asset} inconnue (spotClearinghouseState)")
+                    self._skip(asset_name, "spotClearinghouseState")
+                    continue
                 if is_buy and quote_balance < self.order_size:
                     print(f"   ⚠️  {quote_asset} insuffisant (${quote_balance:.2f} < ${self.order_size})")
                     continue
@@ -762,29 +1407,28 @@ class WalletBot:
                 
                 # Calculer la taille de l'ordre pour ramener la valeur notionnelle à target_usd
                 
-                # Taille de l'ordre en USD (valeur notionnelle)
-                order_notional_usd = self.order_size
-                
-                # Taille de l'ordre en tokens (sz)
-                size_tokens = order_notional_usd / mark_price
-                
-                # Placer l'ordre
-                success, msg = place_order(
-                    self.private_key,
-                    coin_for_order,
-                    is_buy,
-                    size_tokens,
-                    mark_price,
-                    sz_decimals,
-                    is_perp=True,
-                    dry_run=self.dry_run,
-                    dex=dex_name if dex_name != "main" else ""
-                )
-                print(f"   🎯 {action.upper()} {size_tokens:.6f} {coin_for_order} ({quote_asset}): {msg}")
-                if success:
-                    self.cooldowns.record(asset_name)
+                # Taille des ordres en USD (valeur notionnelle) : order_size_usd, ou tranches jusqu'à la cible
+                slices = self.sizing.slices(tc, current_notional_usd, target_usd, is_buy, quote_balance)
+                for i, order_notional_usd in enumerate(slices, 1):
+                    # Taille de l'ordre en tokens (sz)
+                    size_tokens = order_notional_usd / mark_price
+                    part = f" [{i}/{len(slices)}]" if len(slices) > 1 else ""
+                    
+                    # Mettre l'ordre en file (envoi par priorité en fin d'évaluation)
+                    self._queue_order(
+                        deviation, action, tc,
+                        asset=asset_name, kind=KIND_PERP, coin=coin_for_order, is_buy=is_buy, size_tokens=size_tokens,
+                        price=mark_price, sz_decimals=sz_decimals, is_perp=True,
+                        label=f"{action.upper()} {size_tokens:.6f} {coin_for_order} ({quote_asset}){part}",
+                        fee_pct=tc.get("fee_pct", self.default_fee_pct),
+                        quote_asset=quote_asset,
+                        dex=dex_name if dex_name != "main" else "",
+                        position_key=(pos.dex, pos.coin) if pos else (dex_name, coin_for_order),
+                        slippage_bps=self.sizing.slippage_bps(tc)
+                    )
             else:
                 print(f"   ✓ OK")
+                self._remember_inputs(asset_name, mark_price, szi, target_usd, row)
 
 # =============================================================================
 # MAIN
@@ -794,31 +1438,124 @@ def main():
     parser = argparse.ArgumentParser(description="Hyperliquid Rebalancer V2 (Spot & Futures)")
     parser.add_argument("--dry-run", action="store_true", help="Mode simulation (pas d'ordres réels)")
     parser.add_argument("--wallet", type=int, help="Lance uniquement un wallet spécifique (ID)")
+    parser.add_argument("--metrics-file", help="Écrit les métriques (JSON) dans ce fichier à chaque cycle")
+    parser.add_argument("--snapshot-dir", default=DEFAULT_SNAPSHOT_DIR, help="Répertoire de l'historique des cycles")
+    parser.add_argument("--no-snapshots", action="store_true", help="Désactive l'historique des cycles")
+    parser.add_argument("--sign-workers", type=int, default=DEFAULT_SIGN_WORKERS,
+                        help="Processus de signature des ordres (0 = signature dans les threads d'envoi)")
+    parser.add_argument("--no-pipeline", action="store_true", help="Ordres synchrones, un par un (sans pipeline)")
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS,
+                        help="Requêtes info exécutées en parallèle par cycle (1 = séquentiel)")
+    parser.add_argument("--no-batch", action="store_true", help="Désactive les requêtes multi-utilisateurs")
+    parser.add_argument("--no-position-cache", action="store_true",
+                        help="Récupère l'état complet à chaque cycle (sans cache alimenté par les exécutions)")
+    parser.add_argument("--paper", action="store_true",
+                        help="Paper trading (implique --dry-run) : ordres exécutés sur des comptes virtuels")
+    parser.add_argument("--paper-cash", type=float,
+                        help="Capital de départ virtuel en USDC par wallet (défaut : état réel au premier cycle)")
+    parser.add_argument("--paper-slippage-bps", type=float, default=DEFAULT_SLIPPAGE_BPS,
+                        help="Slippage simulé par rapport au mid (bps)")
+    parser.add_argument("--paper-impact-bps", type=float, default=0.0,
+                        help="Slippage supplémentaire par tranche de $1000 de notionnel (bps)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profilage par échantillonnage (temps par étape et par fonction, piles repliées)")
+    parser.add_argument("--profile-every", type=int, default=DEFAULT_REPORT_EVERY,
+                        help="Écrit un rapport de profil tous les K cycles")
+    parser.add_argument("--profile-interval-ms", type=float, default=DEFAULT_INTERVAL_MS,
+                        help="Pas d'échantillonnage du profileur (ms)")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="Répertoire des rapports de profil")
+    parser.add_argument("--control-port", type=int, nargs="?", const=DEFAULT_CONTROL_PORT,
+                        help=f"Active l'API locale de statut/contrôle sur 127.0.0.1 (port par défaut {DEFAULT_CONTROL_PORT})")
+    parser.add_argument("--control-socket", nargs="?", const=DEFAULT_CONTROL_SOCKET,
+                        help=f"Active l'API de statut/contrôle sur une socket Unix dans un répertoire privé "
+                             f"(par défaut {DEFAULT_CONTROL_SOCKET})")
+    parser.add_argument("--order-rate", type=float, default=DEFAULT_ORDER_RATE,
+                        help="Débit maximum d'envoi des ordres, toute la flotte (ordres/seconde, 0 = illimité)")
+    parser.add_argument("--order-burst", type=int, default=DEFAULT_ORDER_BURST, help="Rafale d'ordres autorisée")
+    parser.add_argument("--l2-pricing", action="store_true",
+                        help="Prix limite IOC depuis un instantané l2Book (niveau couvrant la taille + buffer)")
+    parser.add_argument("--l2-buffer-bps", type=float, default=DEFAULT_L2_BUFFER_BPS,
+                        help="Buffer ajouté au niveau du carnet couvrant la taille (bps)")
+    parser.add_argument("--l2-max-age", type=float, default=DEFAULT_L2_MAX_AGE_SECONDS,
+                        help="Durée de réutilisation d'un instantané l2Book entre wallets (secondes)")
+    parser.add_argument("--netting", choices=NETTING_MODES, default=NETTING_OFF,
+                        help="Ordres opposés entre wallets : report (exposition nette), skip (non envoyés), "
+                             "transfer (transferts spot internes, skip pour les perps)")
+    parser.add_argument("--netting-max-skips", type=int, default=DEFAULT_MAX_SKIP_TICKS,
+                        help="Cycles consécutifs où une même paire est compensée sans transfert, "
+                             "ensuite ses ordres partent (défaut: %(default)s)")
+    parser.add_argument("--info-endpoint", action="append", metavar="URL",
+                        help="Endpoint des requêtes info (répétable ; remplace HL_INFO_URLS). Les ordres restent sur HL_API_URL")
+    parser.add_argument("--no-hedge", action="store_true",
+                        help="Pas de requête couverte : l'endpoint suivant n'est essayé qu'en cas d'échec")
+    parser.add_argument("--info-cache", nargs="?", const=DEFAULT_SOCKET_PATH, metavar="SOCKET",
+                        help=f"allMids/metaAndAssetCtxs via le cache partagé de l'hôte (défaut: {DEFAULT_SOCKET_PATH})")
+    parser.add_argument("--fast-path", action="store_true",
+                        help="Actifs aux entrées inchangées (prix, balance, cible, cooldown) ni réévalués ni affichés")
+    parser.add_argument("--fast-path-epsilon-bps", type=float, default=0.0,
+                        help="Mouvement de prix/balance toléré par le chemin rapide (bps, 0 = strictement inchangé)")
+    parser.add_argument("--cycle-budget", type=float, default=DEFAULT_CYCLE_BUDGET_SECONDS,
+                        help="Échéance d'un cycle (secondes, 0 = sans limite) ; borne aussi chaque étape")
+    parser.add_argument("--fetch-budget", type=float, default=DEFAULT_FETCH_BUDGET_SECONDS,
+                        help="Budget des requêtes info partagées (secondes, 0 = sans limite)")
+    parser.add_argument("--wallets-budget", type=float, default=DEFAULT_WALLETS_BUDGET_SECONDS,
+                        help="Budget de l'évaluation des wallets (secondes, 0 = sans limite)")
+    parser.add_argument("--dispatch-budget", type=float, default=DEFAULT_DISPATCH_BUDGET_SECONDS,
+                        help="Budget de l'envoi des ordres par priorité (secondes, 0 = sans limite)")
     args = parser.parse_args()
+    if args.paper:
+        args.dry_run = True
     
-    # Déterminer les wallets à traiter
-    wallet_ids = []
-    if args.wallet:
-        wallet_ids.append(args.wallet)
-    else:
-        # Chercher les variables d'environnement HL_ADDRESS_X
-        i = 1
-        while os.getenv(f"HL_ADDRESS_{i}"):
-            wallet_ids.append(i)
-            i += 1
+    # Déterminer les wallets à traiter (variables HL_ADDRESS_X ou HL_VAULT_ADDRESS_X)
+    wallet_ids = [args.wallet] if args.wallet else configured_wallet_ids()
     
     if not wallet_ids:
-        print("❌ Aucun wallet trouvé. Assurez-vous que HL_ADDRESS_1, HL_PRIVATE_KEY_1, etc., sont définis.")
+        print("❌ Aucun wallet trouvé. Assurez-vous que HL_ADDRESS_1, HL_PRIVATE_KEY_1 (ou HL_AGENT_KEY et "
+              "HL_VAULT_ADDRESS_1), etc., sont définis.")
         return
 
     print("--- Mode Exécution du Bot ---")
     
+    profiler = SamplingProfiler(args.profile_interval_ms, args.profile_every, args.profile_dir)
+    if args.profile:
+        profiler.start()
+        print(f"📊 Profilage actif (pas {args.profile_interval_ms:g}ms, rapport tous les {args.profile_every} cycles "
+              f"dans {args.profile_dir}/)")
+    
     # Boucle principale du bot
+    snapshot_writer = None if args.no_snapshots else SnapshotWriter(args.snapshot_dir)
+    global info_endpoints, info_cache
+    if args.info_endpoint or args.fetch_workers > DEFAULT_FETCH_WORKERS or args.no_hedge:
+        info_endpoints = EndpointPool(args.info_endpoint or INFO_URLS, timeout=10, hedge=not args.no_hedge,
+                                      pool_size=max(args.fetch_workers, DEFAULT_FETCH_WORKERS))
+    if len(info_endpoints.endpoints) > 1:
+        print(f"🌐 Endpoints info: {', '.join(e.url for e in info_endpoints.endpoints)} "
+              f"({'requêtes couvertes' if info_endpoints.hedge else 'bascule sur échec'}) | ordres: {API_BASE_URL}")
+    if args.info_cache:
+        info_cache = InfoCacheClient(args.info_cache)
+        print(f"🗄️  Cache info partagé: unix:{args.info_cache} (repli sur l'API si indisponible)")
+    order_pipeline = None
+    if not args.dry_run and not args.no_pipeline:
+        order_pipeline = OrderPipeline(API_BASE_URL, sign_workers=args.sign_workers, timeout=ORDER_TIMEOUT_SECONDS)
+    # Ordres en vol persistés : un ordre ambigu d'un run précédent est vérifié avant tout nouvel essai
+    inflight = InFlightTable(None if args.dry_run else INFLIGHT_FILE)
+    order_limiter = RateLimiter(args.order_rate, args.order_burst)
+    paper = None
+    if args.paper:
+        paper = PaperExchange(args.paper_slippage_bps, args.paper_impact_bps, start_cash=args.paper_cash)
+    l2_books = None
+    if args.l2_pricing:
+        l2_books = L2BookCache(api_call, info_breakers, max_age=args.l2_max_age, buffer_bps=args.l2_buffer_bps)
+    # DEXs HIP-3 connus avant la compilation des specs d'ordres (puis rafraîchis en début de cycle)
+    dex_registry.refresh()
     bots = []
     for wid in wallet_ids:
         try:
             config = load_config(wid)
-            bot = WalletBot(wid, config, args.dry_run)
+            bot = WalletBot(wid, config, args.dry_run, snapshot_writer, order_pipeline,
+                            use_position_cache=not args.no_position_cache and paper is None,
+                            inflight=inflight, paper=paper, order_limiter=order_limiter, l2_books=l2_books,
+                            fast_path_epsilon_bps=args.fast_path_epsilon_bps if args.fast_path else None)
             bots.append(bot)
         except FileNotFoundError:
             print(f"❌ Fichier de configuration config_wallet_{wid}.json non trouvé. Lancez 'python autoconfig.py' d'abord.")
@@ -828,18 +1565,410 @@ def main():
     if not bots:
         print("❌ Aucun bot n'a pu être initialisé. Vérifiez les configurations et les variables d'environnement.")
         return
+    
+    # Compiler les specs d'ordres au démarrage (évite les recherches de métadonnées par ordre)
+    for bot in bots:
+        try:
+            prepare_order_specs(bot.private_key, bot.uses_hip3())
+        except Exception as e:
+            print(f"⚠️  Specs d'ordres non précompilées pour Wallet {bot.wallet_id}: {e}")
+    vaults = sum(1 for bot in bots if bot.vault_address)
+    if vaults:
+        # Un Exchange par (clé de signature, groupe de DEX) : les sous-comptes d'une même clé le partagent
+        print(f"🔑 {vaults} sous-compte(s)/vault(s) | {len({bot.private_key for bot in bots})} clé(s) de signature, "
+              f"{len(_exchange_cache)} Exchange(s)")
         
+    # API locale de statut/contrôle (thread dédié, lit les instantanés publiés par la boucle)
+    control = None
+    if args.control_port is not None or args.control_socket:
+        control = ControlServer(args.control_port or DEFAULT_CONTROL_PORT, args.control_socket)
+        try:
+            print(f"🛰️  API de contrôle: {control.start()}")
+        except OSError as e:
+            print(f"⚠️  API de contrôle indisponible: {e}")
+            control = None
+        else:
+            for bot in bots:
+                control.publish(bot.wallet_id, bot.status())
+    bots_by_id = {bot.wallet_id: bot for bot in bots}
+    skip_limiter = SkipLimiter(max(0, args.netting_max_skips))
+    
+    # Wallets du cycle : tous, ou ceux dont un cycle immédiat a été demandé via l'API
+    cycle_bots = bots
+    # Cycle immédiat (sous-ensemble de wallets) : l'échéance du prochain cycle de la flotte ne bouge pas
+    triggered_cycle = False
+    fleet_deadline = 0.0
     while True:
-        for bot in bots:
-            try:
-                bot.run_cycle()
-            except Exception as e:
-                print(f"❌ Erreur critique dans le cycle du Wallet {bot.wallet_id}: {e}")
-                
+        cycle_start = time.perf_counter()
+        # Découverte des DEXs HIP-3 une fois par cycle (TTL) : les lectures du cycle ne touchent pas au réseau
+        dex_registry.refresh()
+        cycle_deadline = time.monotonic() + args.cycle_budget if args.cycle_budget > 0 else None
+        
+        def stage_deadline(budget: float) -> Optional[float]:
+            """Échéance d'une étape démarrant maintenant, bornée par celle du cycle"""
+            deadlines = [d for d in (time.monotonic() + budget if budget > 0 else None, cycle_deadline) if d is not None]
+            return min(deadlines) if deadlines else None
+        
+        # Requêtes info du cycle : planifiées selon les actifs activés et dédupliquées entre wallets
+        with profiler.stage("plan"):
+            plan = CyclePlan(bot.plan() for bot in cycle_bots)
+            max_stale = min(bot.max_stale_seconds for bot in cycle_bots)
+        with profiler.stage("fetch"):
+            data = execute_plan(plan, api_call, info_breakers, info_last_good, max_stale,
+                                max_workers=args.fetch_workers, batcher=None if args.no_batch else info_batcher,
+                                deadline=stage_deadline(args.fetch_budget))
+        print(f"\n[GLOBAL] {len(data.results)}/{len(plan.queries())} requêtes info OK pour {len(cycle_bots)} wallet(s) "
+              f"({data.http_calls} appel(s) HTTP)")
+        late = [q for q, e in data.errors.items() if isinstance(e, FetchDeadlineError)]
+        if late:
+            metrics.incr("cycle_deadline_exceeded_total", stage="fetch")
+            print(f"[GLOBAL] ⌛ {len(late)} requête(s) abandonnée(s) à l'échéance: "
+                  f"{', '.join(q.label() for q in late[:10])}{' ...' if len(late) > 10 else ''}")
+        for name, state in info_breakers.unhealthy().items():
+            print(f"[GLOBAL] ⛔ {name}: {state['state']} (nouvel essai dans {state['retry_in']:.0f}s)")
+        
+        # Wallets non évalués avant l'échéance : passent en tête du cycle suivant
+        lagging: List[WalletBot] = []
+        wallets_deadline = stage_deadline(args.wallets_budget)
+        with profiler.stage("wallets"):
+            for i, bot in enumerate(cycle_bots):
+                if control is not None and control.draining:
+                    print(f"[GLOBAL] 🛑 Drain demandé : Wallet {bot.wallet_id} et suivants ignorés")
+                    break
+                if wallets_deadline is not None and time.monotonic() >= wallets_deadline:
+                    lagging = cycle_bots[i:]
+                    metrics.incr("cycle_deadline_exceeded_total", stage="wallets")
+                    print(f"\n[GLOBAL] ⌛ Budget d'évaluation épuisé : Wallet(s) "
+                          f"{', '.join(str(b.wallet_id) for b in lagging)} ignoré(s), prioritaire(s) au prochain cycle")
+                    break
+                wallet_start = time.perf_counter()
+                try:
+                    bot.run_cycle(data, defer_orders=True, deadline=wallets_deadline)
+                except Exception as e:
+                    print(f"❌ Erreur critique dans le cycle du Wallet {bot.wallet_id}: {e}")
+                bot.last_cycle_ms = (time.perf_counter() - wallet_start) * 1000
+                bot.last_cycle_at = time.time()
+                if control is not None:
+                    control.publish(bot.wallet_id, bot.status())
+        
+        # Actions de toute la flotte, envoyées de la plus urgente à la moins urgente (sous le limiteur)
+        candidates = [c for bot in cycle_bots for c in bot.take_candidates()]
+        if paper is None and not args.dry_run:
+            # Quotes dues de compensations précédentes (refusées ou interrompues par un arrêt)
+            _retry_settlements(inflight, bots_by_id, order_limiter)
+        if args.netting != NETTING_OFF and candidates:
+            candidates = _net_fleet_orders(candidates, args.netting, bots_by_id, paper, order_limiter, skip_limiter)
+        queue = DispatchQueue()
+        queue.extend(candidates)
+        if queue:
+            print(f"\n--- Envoi de {len(queue)} ordre(s) par priorité ---")
+            
+            def send(candidate: OrderCandidate) -> bool:
+                if control is not None and control.draining:
+                    return False
+                try:
+                    return bots_by_id[candidate.wallet_id].dispatch(candidate)
+                except Exception as e:
+                    print(f"❌ Erreur lors de l'envoi pour Wallet {candidate.wallet_id}: {e}")
+                    return False
+            
+            with profiler.stage("dispatch"):
+                queue.dispatch(send, deadline=stage_deadline(args.dispatch_budget))
+            if queue:
+                metrics.incr("cycle_deadline_exceeded_total", stage="dispatch")
+                print(f"[GLOBAL] ⌛ Budget d'envoi épuisé : {len(queue)} ordre(s) non envoyé(s), réévalués au prochain cycle")
+        
+        skipped = sum(len(bot.skipped) for bot in cycle_bots if bot not in lagging)
+        if skipped:
+            print(f"\n[GLOBAL] ⏭️  {skipped} actif(s) ignoré(s) ce cycle faute de données complètes et fraîches")
+        
+        # Résultats des ordres envoyés par le pipeline pendant le cycle
+        if order_pipeline is not None and order_pipeline.pending():
+            print(f"\n--- Résultats des ordres ---")
+            with profiler.stage("orders"):
+                tickets = order_pipeline.drain()
+            if tickets:
+                latencies = sorted(t.ack_ms for t in tickets if t.acked_at)
+                ok = sum(1 for t in tickets if t.success)
+                if latencies:
+                    print(f"\n[GLOBAL] {ok}/{len(tickets)} ordre(s) OK | décision→ack "
+                          f"médiane {latencies[len(latencies) // 2]:.0f}ms, max {latencies[-1]:.0f}ms")
+                else:
+                    print(f"\n[GLOBAL] {ok}/{len(tickets)} ordre(s) OK")
+        if l2_books is not None:
+            rates = [(pricing, metrics.get("order_fill_rate", pricing=pricing)) for pricing in ("l2", "mid")
+                     if metrics.get("order_size_requested_total", pricing=pricing)]
+            if rates:
+                print(f"[GLOBAL] Taux de remplissage IOC (cumulé): "
+                      f"{' | '.join(f'{pricing} {rate * 100:.0f}%' for pricing, rate in rates)}")
+        if len(info_endpoints.endpoints) > 1:
+            hedged = sum(metrics.get("info_hedged_total", endpoint=e.url) for e in info_endpoints.endpoints)
+            print(f"[GLOBAL] 🌐 Endpoints info: {info_endpoints.summary()} | {hedged:.0f} requête(s) couverte(s) (cumulé)")
+        
+        # Dernier ordre connu après l'envoi et les callbacks
+        if control is not None:
+            for bot in cycle_bots:
+                control.publish(bot.wallet_id, bot.status())
+        
+        if paper is not None:
+            totals = paper.totals()
+            print(f"\n[GLOBAL] 📄 Paper: {totals['orders']} exécution(s), {totals['rejected']} rejet(s) | "
+                  f"volume ${totals['volume']:.2f}, frais ${totals['fees']:.2f} ({totals['wallets']} compte(s))")
+        
+        if args.metrics_file:
+            with profiler.stage("metrics"):
+                try:
+                    metrics.write(args.metrics_file)
+                except OSError as e:
+                    print(f"⚠️  Écriture des métriques impossible: {e}")
+        
+        profiler.end_cycle()
+        if control is not None:
+            control.cycle += 1
+            control.last_cycle_ms = round((time.perf_counter() - cycle_start) * 1000, 1)
+        
         # Attendre l'intervalle de vérification (on prend le max des intervalles)
         max_interval = max(bot.check_interval for bot in bots)
-        print(f"\n[GLOBAL] Attente de {max_interval} secondes avant le prochain cycle...")
-        time.sleep(max_interval)
+        cycle_bots = lagging + [bot for bot in bots if bot not in lagging]
+        if control is None:
+            print(f"\n[GLOBAL] Attente de {max_interval} secondes avant le prochain cycle...")
+            with profiler.stage("sleep"):
+                time.sleep(max_interval)
+            continue
+        
+        # Avec l'API : attente interrompue par une commande ; les commandes sont appliquées ici, entre deux cycles
+        if not control.draining:
+            if not triggered_cycle:
+                fleet_deadline = time.monotonic() + max_interval
+            wait_seconds = max(0.0, fleet_deadline - time.monotonic())
+            print(f"\n[GLOBAL] Attente de {wait_seconds:.0f} secondes avant le prochain cycle...")
+            with profiler.stage("sleep"):
+                while True:
+                    triggered = _apply_control_commands(control, bots_by_id)
+                    if triggered or control.draining:
+                        break
+                    remaining = fleet_deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    control.wait(remaining)
+            # Échéance de la flotte atteinte : cycle complet, wallets demandés en tête
+            due = time.monotonic() >= fleet_deadline
+            triggered_cycle = bool(triggered) and not control.draining and not due
+            if triggered and not control.draining:
+                requested = [bots_by_id[wid] for wid in triggered]
+                cycle_bots = requested if triggered_cycle else requested + [b for b in cycle_bots if b not in requested]
+                print(f"\n[GLOBAL] ⚡ Cycle immédiat demandé: Wallet(s) {', '.join(map(str, triggered))}")
+        
+        if control.draining:
+            print("\n[GLOBAL] 🛑 Drain : fin des ordres en vol et arrêt")
+            if order_pipeline is not None:
+                order_pipeline.drain()
+                order_pipeline.close()
+            if snapshot_writer is not None:
+                snapshot_writer.close()
+            if args.metrics_file:
+                try:
+                    metrics.write(args.metrics_file)
+                except OSError as e:
+                    print(f"⚠️  Écriture des métriques impossible: {e}")
+            profiler.stop()
+            control.close()
+            return
+
+def _net_fleet_orders(candidates: List[OrderCandidate], mode: str, bots_by_id: Dict[int, "WalletBot"],
+                      paper: Optional[PaperExchange], order_limiter: RateLimiter,
+                      skip_limiter: SkipLimiter) -> List[OrderCandidate]:
+    """
+    Couche portefeuille : exposition par actif des ordres de toute la flotte et, hors mode report,
+    compensation des ordres opposés entre wallets. Retourne les ordres restant à envoyer :
+    une paire non réglée (transfert impossible, limite de cycles sans transfert) garde ses ordres.
+    """
+    if mode == NETTING_REPORT:
+        by_asset, matches = exposures(candidates), []
+    else:
+        matches, by_asset = match_candidates(candidates)
+    
+    settled = []
+    if matches:
+        print(f"\n--- Compensation entre wallets ({len(matches)} paire(s)) ---")
+    for match in matches:
+        seller, buyer = bots_by_id[match.seller.wallet_id], bots_by_id[match.buyer.wallet_id]
+        transfer = mode == NETTING_TRANSFER and match.seller.order["kind"] == KIND_SPOT
+        if transfer:
+            try:
+                ok = _settle_internal(match, seller, buyer, paper, order_limiter, seller.inflight)
+            except Exception as e:
+                print(f"   ❌ {match.seller.asset}: transfert interne W{seller.wallet_id}→W{buyer.wallet_id} échoué: {e}")
+                ok = False
+            if not ok:
+                print(f"   ↪️  {match.seller.asset}: ordres W{seller.wallet_id}/W{buyer.wallet_id} envoyés normalement")
+        else:
+            ok = skip_limiter.allow(match)
+            if ok:
+                print(f"   🔀 {match.seller.asset}: vente W{seller.wallet_id} / achat W{buyer.wallet_id} compensés "
+                      f"({match.size_tokens:.6f} ≈ ${match.notional:.2f}), non envoyés")
+            else:
+                print(f"   ↪️  {match.seller.asset}: W{seller.wallet_id}/W{buyer.wallet_id} compensés "
+                      f"{skip_limiter.max_ticks} cycle(s) de suite sans transfert, ordres envoyés")
+        if not ok:
+            metrics.incr("netting_unsettled_total", mode="transfer" if transfer else "skip")
+            continue
+        settled.append(match)
+        metrics.incr("netting_matches_total", mode="transfer" if transfer else "skip")
+        metrics.incr("netting_notional_total", match.notional, mode="transfer" if transfer else "skip")
+    skip_limiter.end_tick()
+    
+    kept = apply_matches(candidates, settled, by_asset) if settled else candidates
+    print(f"\n--- Exposition de la flotte ({len(candidates)} ordre(s), {len(candidates) - len(kept)} évité(s)) ---")
+    for line in format_exposures(by_asset):
+        print(line)
+    return kept
+
+def _settle_internal(match: NettingMatch, seller: "WalletBot", buyer: "WalletBot",
+                     paper: Optional[PaperExchange], order_limiter: RateLimiter, inflight: InFlightTable) -> bool:
+    """
+    Règle une compensation spot par deux spotSend : tokens du vendeur vers l'acheteur, puis
+    quote (au mid) de l'acheteur vers le vendeur. Les deux wallets passent en cooldown sur l'actif.
+    Retourne False si aucun token n'a bougé : les deux ordres partent alors normalement.
+    Une quote refusée après le transfert des tokens reste due dans la table des ordres en vol ;
+    sans réponse au transfert des tokens, la paire compte comme réglée (ses ordres ne partent pas)
+    et le cycle suivant repart des balances relues.
+    """
+    order = match.seller.order
+    token, quote_asset = order["asset"], order["quote_asset"]
+    factor = 10 ** order["sz_decimals"]
+    size = int(match.size_tokens * factor + 1e-9) / factor
+    amount = round(size * match.price, 6)
+    route = f"{token}: W{seller.wallet_id}→W{buyer.wallet_id} {size:g} {token} contre ${amount:.2f} {quote_asset}"
+    if size <= 0:
+        return False
+    if seller.balances.get(token, 0) < size or buyer.balances.get(quote_asset, 0) < amount:
+        print(f"   ⚠️  {route}: balances insuffisantes pour un transfert interne")
+        return False
+    
+    if paper is not None:
+        ok, msg = paper.transfer(seller.wallet_id, buyer.wallet_id, token, size)
+        if not ok:
+            print(f"   ❌ {route}: {msg}")
+            return False
+        ok, msg = paper.transfer(buyer.wallet_id, seller.wallet_id, quote_asset, amount)
+        if not ok:
+            print(f"   🚨 {route}: tokens transférés mais règlement {quote_asset} refusé ({msg})")
+            metrics.incr("netting_settlement_failures_total")
+            amount = 0.0
+        else:
+            print(f"   🔀 {route}: ✅ [PAPER] transferts spot internes")
+    elif seller.dry_run:
+        print(f"   🔀 {route}: [DRY RUN] transferts spot internes")
+    else:
+        if seller.vault_address or buyer.vault_address:
+            # spotSend débite le compte signataire : pas de transfert pour un sous-compte / vault
+            print(f"   ⚠️  {route}: sous-compte/vault (clé d'agent), pas de transfert interne")
+            return False
+        token_wire, quote_wire = get_spot_token_wire(token), get_spot_token_wire(quote_asset)
+        if token_wire is None or quote_wire is None:
+            print(f"   ⚠️  {route}: token inconnu de spotMeta, pas de transfert interne")
+            return False
+        # Étapes écrites sur disque avant chaque envoi : un règlement interrompu survit au redémarrage
+        pending = inflight.begin_settlement(seller.wallet_id, buyer.wallet_id, seller.address, buyer.address,
+                                            token, quote_asset, size, amount)
+        order_limiter.acquire()
+        try:
+            result = exchange_call(get_exchange(seller.private_key), None, "spot_transfer", size, buyer.address, token_wire)
+        except Exception as e:
+            # Tokens peut-être transférés : les ordres ne partent pas, le prochain cycle relit les balances
+            print(f"   🚨 {route}: transfert des tokens sans réponse ({e}), à vérifier ({inflight.cache_file})")
+            metrics.incr("netting_settlement_failures_total")
+            return True
+        if not isinstance(result, dict) or result.get("status") != "ok":
+            inflight.end_settlement(pending)
+            print(f"   ❌ {route}: transfert des tokens refusé ({result})")
+            return False
+        inflight.update_settlement(pending, SETTLE_QUOTE_DUE)
+        if not _send_settlement_quote(pending, buyer, order_limiter):
+            # Tokens déjà transférés : les ordres ne doivent plus partir, la quote reste due
+            metrics.incr("netting_settlement_failures_total")
+            amount = 0.0
+        else:
+            print(f"   🔀 {route}: ✅ transferts spot internes")
+    
+    # Vues locales du cycle et cooldowns, comme après une exécution
+    for bot, token_delta, quote_delta in ((seller, -size, amount), (buyer, size, -amount)):
+        bot.balances[token] = bot.balances.get(token, 0) + token_delta
+        bot.balances[quote_asset] = bot.balances.get(quote_asset, 0) + quote_delta
+        bot.cooldowns.record(token)
+        bot.last_order = {"asset": token, "side": "sell" if bot is seller else "buy", "success": True,
+                          "filled": size, "avg_px": match.price, "time": time.time(), "internal": True}
+    return True
+
+def _send_settlement_quote(pending: PendingSettlement, buyer: "WalletBot", order_limiter: RateLimiter) -> bool:
+    """
+    Envoie la quote due d'un règlement (acheteur vers vendeur). Retourne True une fois réglée.
+    Refus : la quote reste due (renvoyée au cycle suivant) ; sans réponse : à vérifier à la main.
+    """
+    inflight = buyer.inflight
+    route = (f"{pending.token}: W{pending.seller_id}→W{pending.buyer_id} {pending.size:g} {pending.token} "
+             f"contre ${pending.amount:.2f} {pending.quote_asset}")
+    quote_wire = get_spot_token_wire(pending.quote_asset)
+    if quote_wire is None:
+        print(f"   🚨 {route}: {pending.quote_asset} inconnu de spotMeta, quote due")
+        return False
+    inflight.update_settlement(pending, SETTLE_QUOTE_SENT)
+    order_limiter.acquire()
+    try:
+        result = exchange_call(get_exchange(buyer.private_key), None, "spot_transfer",
+                               pending.amount, pending.seller_address, quote_wire)
+    except Exception as e:
+        print(f"   🚨 {route}: règlement {pending.quote_asset} sans réponse ({e}), à vérifier ({inflight.cache_file})")
+        return False
+    if not isinstance(result, dict) or result.get("status") != "ok":
+        inflight.update_settlement(pending, SETTLE_QUOTE_DUE)
+        print(f"   🚨 {route}: règlement {pending.quote_asset} refusé ({result}), renvoyé au prochain cycle")
+        return False
+    inflight.end_settlement(pending)
+    return True
+
+def _retry_settlements(inflight: InFlightTable, bots_by_id: Dict[int, "WalletBot"],
+                       order_limiter: RateLimiter) -> None:
+    """Renvoie les quotes dues des compensations (y compris d'un run précédent) ; signale celles à vérifier"""
+    pending_list = inflight.settlements()
+    if not pending_list:
+        return
+    print(f"\n--- Règlements de compensation en cours ({len(pending_list)}) ---")
+    for pending in pending_list:
+        if pending.needs_review:
+            print(f"   🚨 {pending}: transfert sans réponse, à vérifier puis retirer de {inflight.cache_file}")
+            continue
+        buyer = bots_by_id.get(pending.buyer_id)
+        if buyer is None or buyer.address != pending.buyer_address:
+            print(f"   🚨 {pending}: wallet acheteur absent de cette flotte, quote due")
+            continue
+        if _send_settlement_quote(pending, buyer, order_limiter):
+            print(f"   ✅ {pending.token}: quote ${pending.amount:.2f} {pending.quote_asset} réglée "
+                  f"W{pending.buyer_id}→W{pending.seller_id}")
+            metrics.incr("netting_settlement_retries_total")
+
+def _apply_control_commands(control: ControlServer, bots_by_id: Dict[int, "WalletBot"]) -> List[int]:
+    """Applique pause/reprise reçues par l'API ; retourne les wallets dont un cycle immédiat est demandé"""
+    triggered = []
+    for command, wallet_id, asset in control.pop_commands():
+        bot = bots_by_id.get(wallet_id)
+        if bot is None:
+            continue
+        if command == CMD_CYCLE:
+            if wallet_id not in triggered:
+                triggered.append(wallet_id)
+        elif command == CMD_PAUSE:
+            bot.paused.add(asset or "*")
+            print(f"[GLOBAL] ⏸️  Wallet {wallet_id}: {asset or 'tous les actifs'} en pause")
+        elif command == CMD_RESUME:
+            if asset:
+                bot.paused.discard(asset)
+            else:
+                bot.paused.clear()
+            print(f"[GLOBAL] ▶️  Wallet {wallet_id}: reprise de {asset or 'tous les actifs'}")
+        control.publish(wallet_id, bot.status())
+    return triggered
 
 if __name__ == "__main__":
     main()
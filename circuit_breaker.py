@@ -0,0 +1,141 @@
+"""
+Hyperliquid Rebalancer V2 - Circuit breakers par endpoint et DEX
+==================================================
+Quand un DEX HIP-3 (ou un endpoint) est en panne, chaque appel peut bloquer le cycle
+jusqu'au timeout. Un CircuitBreaker par (type de requête, DEX) évite de le réessayer
+à chaque cycle et pour chaque wallet :
+
+- closed    : les appels passent ; après `failure_threshold` échecs consécutifs -> open
+- open      : les appels sont refusés immédiatement pendant le backoff
+- half_open : à la fin du backoff, un seul appel test est autorisé
+              succès -> closed ; échec -> open avec un backoff doublé (plafonné)
+
+L'état de chaque breaker est publié dans les métriques (jauge `circuit_state`).
+"""
+
+import time
+import threading
+from typing import Dict, Any, Tuple
+
+from metrics import metrics
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Valeur numérique publiée dans la jauge circuit_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé car le circuit est ouvert"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"circuit '{name}' ouvert (nouvel essai dans {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Circuit breaker avec backoff exponentiel"""
+
+    def __init__(self, endpoint: str, dex: str = "", failure_threshold: int = 2,
+                 base_backoff: float = 30.0, max_backoff: float = 900.0):
+        self.endpoint = endpoint
+        self.dex = dex
+        self.name = f"{endpoint}/{dex or 'main'}"
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = base_backoff
+        self.open_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set("circuit_state", STATE_VALUES[self.state], endpoint=self.endpoint, dex=self.dex or "main")
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.open_until = time.time() + self.backoff
+        self._publish()
+        print(f"⛔ Circuit {self.name} ouvert pour {self.backoff:.0f}s ({self.failures} échec(s))")
+
+    def allow(self) -> bool:
+        """True si l'appel peut être tenté maintenant"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.time() < self.open_until:
+                    metrics.incr("circuit_rejected_total", endpoint=self.endpoint, dex=self.dex or "main")
+                    return False
+                self.state = HALF_OPEN
+                self._publish()
+            # half_open : un seul appel test à la fois
+            if self._probe_in_flight:
+                metrics.incr("circuit_rejected_total", endpoint=self.endpoint, dex=self.dex or "main")
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = 0
+            self.backoff = self.base_backoff
+            self._probe_in_flight = False
+            self._publish()
+        if recovered:
+            print(f"✅ Circuit {self.name} refermé")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            metrics.incr("circuit_failures_total", endpoint=self.endpoint, dex=self.dex or "main")
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def retry_in(self) -> float:
+        return max(0.0, self.open_until - time.time())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "backoff": self.backoff,
+                "retry_in": round(self.retry_in(), 1) if self.state == OPEN else 0}
+
+
+class BreakerBoard:
+    """Un CircuitBreaker par (endpoint, dex), créé à la demande"""
+
+    def __init__(self, **breaker_kwargs: Any):
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str, dex: str = "") -> CircuitBreaker:
+        key = (endpoint, dex or "")
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(endpoint, dex or "", **self._breaker_kwargs)
+                self._breakers[key] = breaker
+            return breaker
+
+    def unhealthy(self) -> Dict[str, Dict[str, Any]]:
+        """Breakers non fermés, pour l'affichage"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.snapshot() for b in breakers if b.state != CLOSED}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.snapshot() for b in breakers}
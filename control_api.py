@@ -0,0 +1,278 @@
+"""
+Hyperliquid Rebalancer V2 - API locale de contrôle et de statut
+==================================================
+Expose l'état du bot en cours d'exécution et quelques commandes, sur HTTP local
+(127.0.0.1 uniquement) ou sur une socket Unix :
+
+    GET  /status                          état global (cycle, wallets, commandes en attente, drain)
+    GET  /wallets/<id>                    dernier instantané du wallet : actifs (déviation, cooldown restant,
+                                          pause), dernier ordre, latence du dernier cycle
+    GET  /metrics                         instantané des métriques
+    POST /wallets/<id>/cycle              déclenche immédiatement un cycle pour ce wallet
+    POST /wallets/<id>/pause?asset=BTC    met un actif en pause (sans asset : tous les actifs du wallet)
+    POST /wallets/<id>/resume?asset=BTC   reprend un actif (sans asset : tous les actifs du wallet)
+    POST /drain                           arrêt propre : fin du wallet en cours, ordres en vol drainés, sortie
+
+    curl -s localhost:8765/wallets/1
+    curl -s -X POST -H "Authorization: Bearer $(cat <runtime>/hl-bot-<uid>/control.token)" localhost:8765/drain
+    curl -s --unix-socket <runtime>/hl-bot-<uid>/control.sock -X POST localhost/wallets/1/cycle
+
+Les commandes pilotent un bot qui trade : elles sont réservées à l'utilisateur du bot.
+- HTTP : chaque POST porte le jeton (Authorization: Bearer), lu dans HL_CONTROL_TOKEN ou généré
+  au démarrage dans <runtime>/hl-bot-<uid>/control.token (0600). Un en-tête personnalisé ne peut pas
+  être envoyé par une page web sans pré-vérification CORS (jamais acceptée ici), et l'en-tête Host
+  doit désigner 127.0.0.1 ou localhost (pas de rebinding DNS).
+- Socket Unix : répertoire privé (0700, refus d'un répertoire où d'autres peuvent écrire comme /tmp),
+  socket en 0600 et uid du client vérifié (SO_PEERCRED), comme le cache info partagé.
+
+Les requêtes sont servies par un thread dédié et ne lisent que des instantanés publiés par
+la boucle principale (dicts déjà construits) ; les commandes sont mises en file et appliquées
+par la boucle principale entre deux wallets, sans verrou sur le chemin critique.
+"""
+
+import os
+import hmac
+import json
+import stat
+import time
+import queue
+import secrets
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, List, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from metrics import metrics
+from info_cache import runtime_dir, prepare_socket_dir, peer_uid
+
+DEFAULT_CONTROL_PORT = 8765
+DEFAULT_CONTROL_DIR = runtime_dir("hl-bot")
+DEFAULT_CONTROL_SOCKET = os.path.join(DEFAULT_CONTROL_DIR, "control.sock")
+DEFAULT_TOKEN_FILE = os.path.join(DEFAULT_CONTROL_DIR, "control.token")
+
+# Commandes (appliquées par la boucle principale)
+CMD_CYCLE = "cycle"
+CMD_PAUSE = "pause"
+CMD_RESUME = "resume"
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def verify_request(self, request, client_address) -> bool:
+        """Seuls l'utilisateur du bot (et root) peuvent se connecter"""
+        uid = peer_uid(request)
+        return uid is None or uid in (os.getuid(), 0)
+
+
+def load_or_create_token(token_file: str = DEFAULT_TOKEN_FILE) -> str:
+    """Jeton des commandes HTTP : HL_CONTROL_TOKEN, sinon nouveau jeton écrit en 0600 dans un répertoire privé"""
+    token = os.getenv("HL_CONTROL_TOKEN")
+    if token:
+        return token
+    prepare_socket_dir(token_file)
+    token = secrets.token_urlsafe(32)
+    fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token + "\n")
+    os.chmod(token_file, 0o600)
+    return token
+
+
+class ControlServer:
+    """Serveur de contrôle (thread dédié) et état partagé avec la boucle principale"""
+
+    def __init__(self, port: Optional[int] = DEFAULT_CONTROL_PORT, socket_path: Optional[str] = None,
+                 token_file: str = DEFAULT_TOKEN_FILE):
+        self.port = port
+        self.socket_path = socket_path
+        self.token_file = token_file
+        # Jeton exigé sur les POST HTTP (None sur socket Unix : l'uid du client est vérifié)
+        self.token: Optional[str] = None
+        self.started_at = time.time()
+        self.draining = False
+        self.cycle = 0
+        self.last_cycle_ms = 0.0
+        self._wallets: Dict[int, Dict[str, Any]] = {}
+        self._commands: "queue.Queue[Tuple[str, int, Optional[str]]]" = queue.Queue()
+        # Réveille la boucle principale pendant son attente entre deux cycles
+        self._wakeup = threading.Event()
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------------------------------------------------------
+    # Cycle de vie
+    # -------------------------------------------------------------------------
+
+    def start(self) -> str:
+        """Démarre le serveur en arrière-plan, retourne l'adresse d'écoute"""
+        handler = self._handler_class()
+        if self.socket_path:
+            prepare_socket_dir(self.socket_path)
+            if os.path.lexists(self.socket_path):
+                # Seule une ancienne socket est remplacée, jamais un fichier désigné par erreur
+                if not stat.S_ISSOCK(os.lstat(self.socket_path).st_mode):
+                    raise FileExistsError(f"{self.socket_path} existe et n'est pas une socket")
+                os.unlink(self.socket_path)
+            self._server = _UnixHTTPServer(self.socket_path, handler)
+            os.chmod(self.socket_path, 0o600)
+            address = f"unix:{self.socket_path}"
+        else:
+            self.token = load_or_create_token(self.token_file)
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), handler)
+            address = f"http://127.0.0.1:{self._server.server_address[1]}"
+            if not os.getenv("HL_CONTROL_TOKEN"):
+                address += f" (jeton des commandes: {self.token_file})"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="control-api", daemon=True)
+        self._thread.start()
+        return address
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if self.socket_path and os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    # -------------------------------------------------------------------------
+    # Côté boucle principale
+    # -------------------------------------------------------------------------
+
+    def publish(self, wallet_id: int, status: Dict[str, Any]) -> None:
+        """Remplace l'instantané d'un wallet (dict construit par la boucle principale, non modifié ensuite)"""
+        self._wallets[wallet_id] = status
+
+    def pop_commands(self) -> List[Tuple[str, int, Optional[str]]]:
+        """Commandes reçues depuis le dernier appel (commande, wallet, actif)"""
+        commands = []
+        while True:
+            try:
+                commands.append(self._commands.get_nowait())
+            except queue.Empty:
+                return commands
+
+    def wait(self, timeout: float) -> None:
+        """Attente entre deux cycles, interrompue par une commande ou un drain"""
+        if self._commands.empty() and not self.draining:
+            self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    # -------------------------------------------------------------------------
+    # Côté serveur
+    # -------------------------------------------------------------------------
+
+    def _submit(self, command: str, wallet_id: int, asset: Optional[str] = None) -> None:
+        self._commands.put((command, wallet_id, asset))
+        self._wakeup.set()
+
+    def _drain(self) -> None:
+        self.draining = True
+        self._wakeup.set()
+
+    def _status(self) -> Dict[str, Any]:
+        now = time.time()
+        wallets = {}
+        for wallet_id, status in list(self._wallets.items()):
+            assets = status.get("assets", [])
+            wallets[wallet_id] = {
+                "updated_ago": round(now - status.get("updated_at", now), 1),
+                "cycle_ms": status.get("cycle_ms"),
+                "assets": len(assets),
+                "max_abs_deviation": max((abs(a["deviation"]) for a in assets), default=0.0),
+                "paused": status.get("paused", []),
+                "last_order": status.get("last_order"),
+            }
+        return {
+            "uptime": round(now - self.started_at),
+            "cycle": self.cycle,
+            "last_cycle_ms": self.last_cycle_ms,
+            "draining": self.draining,
+            "pending_commands": self._commands.qsize(),
+            "wallets": wallets,
+        }
+
+    def _wallet(self, wallet_id: int) -> Optional[Dict[str, Any]]:
+        status = self._wallets.get(wallet_id)
+        if status is None:
+            return None
+        now = time.time()
+        assets = []
+        for asset in status.get("assets", []):
+            asset = dict(asset)
+            asset["cooldown_remaining"] = round(max(0.0, asset.pop("cooldown_until", 0.0) - now), 1)
+            assets.append(asset)
+        return dict(status, assets=assets, updated_ago=round(now - status.get("updated_at", now), 1))
+
+    def _handler_class(self):
+        control = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code: int, body: Any) -> None:
+                out = json.dumps(body, indent=2, default=str).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _host_allowed(self) -> bool:
+                """Host local uniquement (HTTP) : une page servie par un nom DNS rebindé est refusée"""
+                if control.socket_path:
+                    return True
+                host = (self.headers.get("Host") or "").strip().lower()
+                name, sep, port = host.rpartition(":")
+                if not sep or not port.isdigit():
+                    name, port = host, ""
+                return name in ("127.0.0.1", "localhost") and (not port or int(port) == self.server.server_address[1])
+
+            def _authorized(self) -> bool:
+                """Commande HTTP : jeton attendu dans Authorization: Bearer"""
+                if control.token is None:
+                    return True
+                auth = self.headers.get("Authorization") or ""
+                scheme, _, token = auth.partition(" ")
+                return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), control.token.encode())
+
+            def _route(self) -> Tuple[List[str], Dict[str, List[str]]]:
+                url = urlparse(self.path)
+                return [p for p in url.path.split("/") if p], parse_qs(url.query)
+
+            def do_GET(self):
+                if not self._host_allowed():
+                    return self._reply(403, {"error": "Host non local"})
+                parts, _ = self._route()
+                if parts == ["status"]:
+                    return self._reply(200, control._status())
+                if parts == ["metrics"]:
+                    return self._reply(200, metrics.snapshot())
+                if len(parts) == 2 and parts[0] == "wallets" and parts[1].isdigit():
+                    status = control._wallet(int(parts[1]))
+                    if status is None:
+                        return self._reply(404, {"error": f"wallet {parts[1]} inconnu"})
+                    return self._reply(200, status)
+                self._reply(404, {"error": "route inconnue"})
+
+            def do_POST(self):
+                if not self._host_allowed():
+                    return self._reply(403, {"error": "Host non local"})
+                if not self._authorized():
+                    return self._reply(401, {"error": "jeton de contrôle manquant ou invalide"})
+                parts, query = self._route()
+                if parts == ["drain"]:
+                    control._drain()
+                    return self._reply(202, {"draining": True})
+                if len(parts) == 3 and parts[0] == "wallets" and parts[1].isdigit():
+                    wallet_id, command = int(parts[1]), parts[2]
+                    if wallet_id not in control._wallets:
+                        return self._reply(404, {"error": f"wallet {wallet_id} inconnu"})
+                    if command in (CMD_CYCLE, CMD_PAUSE, CMD_RESUME):
+                        asset = query.get("asset", [None])[0]
+                        control._submit(command, wallet_id, asset)
+                        return self._reply(202, {"queued": command, "wallet": wallet_id, "asset": asset})
+                self._reply(404, {"error": "route inconnue"})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,184 @@
+"""
+Hyperliquid Rebalancer V2 - Registre des DEXs HIP-3
+==================================================
+Découvre dynamiquement les DEXs perp HIP-3 via l'endpoint info `perpDexs`,
+au lieu d'une liste codée en dur. Le résultat est mis en cache (TTL) en mémoire
+et sur disque (dex_cache.json), partagé entre bot.py et autoconfig.py.
+
+Pour chaque DEX, on garde :
+- son offset d'asset id (110000 + i * 10000, i = position dans perpDexs)
+- son quote asset (collateralToken de la meta, résolu via spotMeta)
+
+Les DEXs sans aucun actif listé sont ignorés (aucune requête par cycle).
+
+Les lectures (get, quote_asset, hip3_dexs...) ne font jamais d'appel réseau : elles lisent
+la dernière liste connue. La découverte n'a lieu que dans refresh(), appelé une fois par cycle
+par la boucle principale (au démarrage pour autoconfig.py), hors du verrou des lectures.
+"""
+
+import json
+import time
+import threading
+from typing import Dict, Any, Optional, List, Callable
+
+DEX_CACHE_FILE = "dex_cache.json"
+DEX_CACHE_TTL_SECONDS = 3600
+# Délai avant de retenter une découverte échouée (on garde l'ancienne liste en attendant)
+DEX_RETRY_SECONDS = 60
+
+# Les DEXs HIP-3 ont des asset ids à partir de 110000, espacés de 10000
+HIP3_ASSET_OFFSET = 110000
+HIP3_ASSET_STRIDE = 10000
+
+
+class DexInfo:
+    """Informations retenues pour un DEX HIP-3"""
+
+    __slots__ = ("name", "offset", "quote_asset")
+
+    def __init__(self, name: str, offset: int, quote_asset: str):
+        self.name = name
+        self.offset = offset
+        self.quote_asset = quote_asset
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "offset": self.offset, "quote_asset": self.quote_asset}
+
+    def __repr__(self) -> str:
+        return f"DexInfo({self.name!r}, offset={self.offset}, quote={self.quote_asset!r})"
+
+
+class DexRegistry:
+    """
+    Liste des DEXs HIP-3 actifs, découverte depuis l'API et mise en cache avec un TTL.
+    `api_call` est la fonction d'appel info du module appelant (payload -> JSON).
+    """
+
+    def __init__(self, api_call: Callable[[Dict], Any], ttl_seconds: float = DEX_CACHE_TTL_SECONDS,
+                 cache_file: Optional[str] = DEX_CACHE_FILE):
+        self.api_call = api_call
+        self.ttl = ttl_seconds
+        self.cache_file = cache_file
+        self._dexs: Dict[str, DexInfo] = {}
+        self._expires_at = 0.0
+        self._listeners: List[Callable[[List[str]], None]] = []
+        # _lock protège l'état lu par les getters ; _refresh_lock sérialise les découvertes (réseau)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._load_disk_cache()
+
+    # -------------------------------------------------------------------------
+    # Cache disque
+    # -------------------------------------------------------------------------
+
+    def _load_disk_cache(self) -> None:
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+            self._dexs = {d["name"]: DexInfo(d["name"], d["offset"], d["quote_asset"]) for d in data.get("dexs", [])}
+            self._expires_at = data.get("updated", 0) + self.ttl
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save_disk_cache(self) -> None:
+        if not self.cache_file:
+            return
+        try:
+            with self._lock:
+                dexs = [d.to_dict() for d in self._dexs.values()]
+            with open(self.cache_file, "w") as f:
+                json.dump({"updated": time.time(), "dexs": dexs}, f, indent=2)
+        except OSError:
+            pass
+
+    # -------------------------------------------------------------------------
+    # Découverte
+    # -------------------------------------------------------------------------
+
+    def _discover(self, known: Dict[str, DexInfo]) -> Dict[str, DexInfo]:
+        """Interroge perpDexs + meta de chaque DEX. Lève une exception si perpDexs échoue."""
+        perp_dexs = self.api_call({"type": "perpDexs"})
+        spot_meta = self.api_call({"type": "spotMeta"})
+        token_names = {t["index"]: t["name"] for t in spot_meta.get("tokens", [])}
+
+        discovered: Dict[str, DexInfo] = {}
+        # Le premier élément (null) représente le main DEX
+        for i, entry in enumerate(perp_dexs[1:]):
+            if not entry or not entry.get("name"):
+                continue
+            name = entry["name"]
+            try:
+                meta = self.api_call({"type": "meta", "dex": name})
+            except Exception:
+                # DEX injoignable : on garde l'ancienne entrée si elle existe
+                if name in known:
+                    discovered[name] = known[name]
+                continue
+            listed = [a for a in meta.get("universe", []) if not a.get("isDelisted", False)]
+            if not listed:
+                continue
+            quote = token_names.get(meta.get("collateralToken", 0), "USDC")
+            discovered[name] = DexInfo(name, HIP3_ASSET_OFFSET + i * HIP3_ASSET_STRIDE, quote)
+        return discovered
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Rafraîchit la liste si le TTL est expiré (ou si force=True). Les requêtes de découverte
+        sont faites hors de _lock : les lectures continuent sur l'ancienne liste pendant ce temps.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                if not force and time.time() < self._expires_at:
+                    return
+                known = self._dexs
+            previous = sorted(known)
+            try:
+                discovered = self._discover(known)
+            except Exception as e:
+                print(f"⚠️  Découverte des DEXs HIP-3 impossible ({e}), utilisation de la dernière liste connue")
+                with self._lock:
+                    self._expires_at = time.time() + DEX_RETRY_SECONDS
+                return
+            with self._lock:
+                self._dexs = discovered
+                self._expires_at = time.time() + self.ttl
+            self._save_disk_cache()
+            current = sorted(discovered)
+            listeners = list(self._listeners) if current != previous else []
+        for listener in listeners:
+            listener(current)
+
+    def on_change(self, listener: Callable[[List[str]], None]) -> None:
+        """Enregistre un callback appelé avec la nouvelle liste quand l'ensemble des DEXs change"""
+        self._listeners.append(listener)
+
+    # -------------------------------------------------------------------------
+    # Lecture
+    # -------------------------------------------------------------------------
+
+    def hip3_dexs(self) -> List[str]:
+        """Noms des DEXs HIP-3 actifs (triés)"""
+        with self._lock:
+            return sorted(self._dexs)
+
+    def all_dexs(self) -> List[str]:
+        """Main DEX ("") + DEXs HIP-3"""
+        return [""] + self.hip3_dexs()
+
+    def get(self, dex_name: str) -> Optional[DexInfo]:
+        with self._lock:
+            return self._dexs.get(dex_name)
+
+    def quote_asset(self, dex_name: str, default: str = "USDC") -> str:
+        """Quote asset (collateral) d'un DEX ; "USDC" pour le main DEX"""
+        if not dex_name:
+            return "USDC"
+        info = self.get(dex_name)
+        return info.quote_asset if info else default
+
+    def quote_assets(self) -> Dict[str, str]:
+        """Table {dex: quote_asset} dérivée des données découvertes"""
+        with self._lock:
+            return {name: info.quote_asset for name, info in self._dexs.items()}
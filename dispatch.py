@@ -0,0 +1,105 @@
+"""
+Hyperliquid Rebalancer V2 - Envoi des ordres par priorité
+==================================================
+Les wallets évaluent leurs actifs (spot puis perps, dans l'ordre de la config) sans envoyer
+d'ordre : chaque action déclenchée devient un candidat, classé par l'écart au-delà de son
+seuil (points de pourcentage de déviation après le seuil d'achat ou de vente).
+
+Une fois tous les wallets évalués, les candidats de toute la flotte sont envoyés du plus
+urgent au moins urgent (file de priorité), sous un limiteur de débit : lors d'un mouvement
+brutal, les déséquilibres les plus forts sont corrigés en premier.
+"""
+
+import heapq
+import time
+import threading
+from typing import Dict, Any, List, Callable, Tuple, Optional
+
+# Débit d'envoi par défaut (ordres/seconde) et rafale autorisée.
+# Hyperliquid limite à 1200 de poids par minute et par IP (une action d'ordre pèse 1).
+DEFAULT_ORDER_RATE = 10.0
+DEFAULT_ORDER_BURST = 10
+
+
+def threshold_excess(deviation: float, action: str, buy_threshold: float, sell_threshold: float) -> float:
+    """Écart au-delà du seuil déclenché (points de %), >= 0 pour une action déclenchée"""
+    if action == "buy":
+        return -deviation - buy_threshold
+    return deviation - sell_threshold
+
+
+class OrderCandidate:
+    """Action décidée par un wallet, en attente d'envoi"""
+
+    __slots__ = ("wallet_id", "asset", "excess", "deviation", "order")
+
+    def __init__(self, wallet_id: int, asset: str, excess: float, deviation: float, order: Dict[str, Any]):
+        self.wallet_id = wallet_id
+        self.asset = asset
+        self.excess = excess
+        self.deviation = deviation
+        # Arguments de WalletBot._execute_order
+        self.order = order
+
+    def __repr__(self) -> str:
+        return f"OrderCandidate(wallet={self.wallet_id}, {self.asset!r}, excess={self.excess:+.1f}%)"
+
+
+class RateLimiter:
+    """Seau à jetons : `rate` jetons par seconde, au plus `burst` en réserve"""
+
+    def __init__(self, rate: float = DEFAULT_ORDER_RATE, burst: int = DEFAULT_ORDER_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Prend un jeton (attend si nécessaire) ; retourne le temps attendu en secondes"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class DispatchQueue:
+    """File de priorité des candidats de tous les wallets (plus grand écart en premier)"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, OrderCandidate]] = []
+        self._seq = 0
+
+    def push(self, candidate: OrderCandidate) -> None:
+        # L'ordre d'arrivée départage les égalités (ordre de la config)
+        heapq.heappush(self._heap, (-candidate.excess, self._seq, candidate))
+        self._seq += 1
+
+    def extend(self, candidates: List[OrderCandidate]) -> None:
+        for candidate in candidates:
+            self.push(candidate)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def dispatch(self, send: Callable[[OrderCandidate], bool], deadline: Optional[float] = None) -> int:
+        """
+        Passe les candidats à `send` par priorité décroissante ; `send` revérifie le candidat,
+        prend un jeton du limiteur puis envoie l'ordre (True si envoyé). Retourne le nombre d'ordres envoyés.
+        À l'échéance (time.monotonic()), les candidats restants ne sont pas envoyés et restent dans la file.
+        """
+        sent = 0
+        while self._heap:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            _, _, candidate = heapq.heappop(self._heap)
+            if send(candidate):
+                sent += 1
+        return sent
@@ -0,0 +1,181 @@
+"""
+Hyperliquid Rebalancer V2 - Endpoints info multiples (sélection par latence, requêtes couvertes)
+==================================================
+Avec un seul endpoint info, un ralentissement de l'API publique bloque toute la flotte.
+Le pool d'endpoints (--info-endpoint, ou HL_INFO_URLS=url1,url2) :
+
+- classe les endpoints par latence (moyenne mobile exponentielle des réponses réussies) ;
+  un endpoint sans mesure récente passe en tête pour une requête (sonde, couverte comme
+  les autres) ; un endpoint en échec (timeout, connexion, 5xx) passe en dernier pendant un backoff ;
+- envoie chaque requête info (lecture idempotente) au meilleur endpoint ; s'il n'a pas
+  répondu dans son p95, la même requête part vers le suivant et la première réponse gagne
+  (requête couverte, "hedged request") ; un échec rapide bascule immédiatement au suivant ;
+- une erreur 4xx (requête refusée) est retournée telle quelle : la réessayer ailleurs ne changerait rien.
+
+Les ordres ne passent pas par le pool : ils restent sur un seul endpoint choisi au démarrage
+(signature et nonce liés à une seule soumission).
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+# Délai avant la requête couverte tant que le p95 d'un endpoint n'est pas connu (secondes)
+DEFAULT_HEDGE_DELAY = 1.0
+# Délai minimum avant la requête couverte (évite de doubler toutes les requêtes rapides)
+MIN_HEDGE_DELAY = 0.05
+# Réponses nécessaires pour utiliser le p95 mesuré
+MIN_SAMPLES = 20
+MAX_SAMPLES = 200
+# Mise à l'écart d'un endpoint après un échec (secondes, doublé à chaque échec consécutif)
+BASE_BACKOFF = 5.0
+MAX_BACKOFF = 120.0
+# Âge (secondes) au-delà duquel la latence d'un endpoint est remesurée
+PROBE_SECONDS = 60.0
+
+
+def _retryable(error: Exception) -> bool:
+    """Erreur propre à l'endpoint (timeout, connexion, 5xx) : un autre endpoint peut répondre"""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status is None or status >= 500
+
+
+class Endpoint:
+    """Endpoint info et ses statistiques de latence"""
+
+    def __init__(self, url: str, pool_size: int = 8):
+        self.url = url.rstrip("/")
+        self.info_url = f"{self.url}/info"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.ewma: Optional[float] = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.measured_at = 0.0
+        self._samples: deque = deque(maxlen=MAX_SAMPLES)
+        self._lock = threading.Lock()
+
+    def post(self, payload: Dict, timeout: float) -> Any:
+        start = time.perf_counter()
+        try:
+            r = self.session.post(self.info_url, json=payload, timeout=timeout)
+            r.raise_for_status()
+            result = r.json()
+        except Exception as e:
+            if _retryable(e):
+                self.record_failure()
+            raise
+        self.record_latency(time.perf_counter() - start)
+        return result
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.ewma = seconds if self.ewma is None else 0.8 * self.ewma + 0.2 * seconds
+            self.failures = 0
+            self.down_until = 0.0
+            self.measured_at = time.monotonic()
+        metrics.set("info_endpoint_latency_ms", self.ewma * 1000, endpoint=self.url)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.down_until = time.monotonic() + min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (self.failures - 1))
+        metrics.incr("info_endpoint_failures_total", endpoint=self.url)
+
+    def p95(self) -> float:
+        """p95 des latences récentes (délai de couverture), DEFAULT_HEDGE_DELAY sans historique suffisant"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return max(MIN_HEDGE_DELAY, samples[int(len(samples) * 0.95) - 1])
+
+    def rank_key(self):
+        # Endpoints disponibles d'abord, puis par latence ; sans mesure récente : sondé en premier
+        now = time.monotonic()
+        if now < self.down_until:
+            return True, self.ewma or 0.0
+        if self.ewma is None or now - self.measured_at > PROBE_SECONDS:
+            return False, -1.0
+        return False, self.ewma
+
+
+class EndpointPool:
+    """Endpoints info classés par latence, avec requêtes couvertes après le p95 du meilleur"""
+
+    def __init__(self, urls: List[str], timeout: float = 10.0, hedge: bool = True, pool_size: int = 8):
+        self.endpoints = [Endpoint(url, pool_size) for url in dict.fromkeys(u.rstrip("/") for u in urls)]
+        self.timeout = timeout
+        self.hedge = hedge and len(self.endpoints) > 1
+        # Requête principale + couverture pour chaque requête concurrente
+        self._executor = ThreadPoolExecutor(2 * pool_size, thread_name_prefix="info-hedge") \
+            if len(self.endpoints) > 1 else None
+
+    def ranked(self) -> List[Endpoint]:
+        return sorted(self.endpoints, key=Endpoint.rank_key)
+
+    def call(self, payload: Dict) -> Any:
+        """Requête info : meilleur endpoint, couverte par le suivant après son p95"""
+        if self._executor is None:
+            return self.endpoints[0].post(payload, self.timeout)
+
+        candidates = self.ranked()
+        deadline = time.monotonic() + self.timeout
+        pending: Dict[Future, Endpoint] = {}
+        last_error: Optional[Exception] = None
+
+        def launch() -> None:
+            endpoint = candidates.pop(0)
+            pending[self._executor.submit(endpoint.post, payload, self.timeout)] = endpoint
+
+        launch()
+        while pending:
+            primary = next(iter(pending.values()))
+            # Couverture : attendre le p95 du premier endpoint avant de lancer le suivant
+            delay = primary.p95() if (self.hedge and candidates and len(pending) == 1) else None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(list(pending), timeout=min(delay, remaining) if delay is not None else remaining,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                if delay is not None:
+                    metrics.incr("info_hedged_total", endpoint=primary.url)
+                    launch()
+                continue
+            for future in done:
+                endpoint = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    if pending:
+                        metrics.incr("info_hedge_wins_total", endpoint=endpoint.url)
+                    return future.result()
+                if not _retryable(error):
+                    raise error
+                last_error = error
+            # Échec rapide : bascule immédiate sur l'endpoint suivant
+            if not pending and candidates:
+                metrics.incr("info_failover_total")
+                launch()
+        if last_error is not None:
+            raise last_error
+        raise requests.exceptions.Timeout(f"aucun endpoint info n'a répondu en {self.timeout:.0f}s")
+
+    def summary(self) -> str:
+        parts = []
+        for endpoint in self.ranked():
+            latency = f"{endpoint.ewma * 1000:.0f}ms" if endpoint.ewma is not None else "?"
+            down = " (écarté)" if time.monotonic() < endpoint.down_until else ""
+            parts.append(f"{endpoint.url} {latency}{down}")
+        return " | ".join(parts)
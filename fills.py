@@ -0,0 +1,69 @@
+"""
+Hyperliquid Rebalancer V2 - Exécutions d'ordres
+==================================================
+Extraction de l'exécution (taille remplie, prix moyen) depuis la réponse d'un ordre :
+
+    {"status": "ok", "response": {"type": "order", "data": {"statuses": [
+        {"filled": {"totalSz": "0.02", "avgPx": "1891.4", "oid": 77747314}}
+    ]}}}
+
+Un ordre IOC peut être rempli partiellement : totalSz est alors inférieur à la taille demandée.
+"""
+
+from typing import Dict, Any, Optional
+
+
+class OrderFill:
+    """Exécution d'un ordre (taille remplie et prix moyen)"""
+
+    __slots__ = ("coin", "is_buy", "size", "avg_px", "oid")
+
+    def __init__(self, coin: str, is_buy: bool, size: float, avg_px: float, oid: Optional[int] = None):
+        self.coin = coin
+        self.is_buy = is_buy
+        self.size = size
+        self.avg_px = avg_px
+        self.oid = oid
+
+    @property
+    def notional(self) -> float:
+        return self.size * self.avg_px
+
+    @property
+    def signed_size(self) -> float:
+        """Taille signée (+ achat, - vente)"""
+        return self.size if self.is_buy else -self.size
+
+
+def order_error(result: Any) -> Optional[str]:
+    """Message d'erreur d'une réponse d'ordre, None si l'ordre a été accepté"""
+    if not isinstance(result, dict) or result.get("status") != "ok":
+        return str(result)
+    response = result.get("response")
+    statuses = response.get("data", {}).get("statuses", []) if isinstance(response, dict) else []
+    if statuses and isinstance(statuses[0], dict) and "error" in statuses[0]:
+        return str(statuses[0]["error"])
+    return None
+
+
+def parse_order_fill(result: Dict[str, Any], coin: str, is_buy: bool) -> Optional[OrderFill]:
+    """Exécution du premier statut d'une réponse d'ordre, None si rien n'a été rempli"""
+    if not isinstance(result, dict) or result.get("status") != "ok":
+        return None
+    response = result.get("response")
+    if not isinstance(response, dict):
+        return None
+    statuses = response.get("data", {}).get("statuses", [])
+    if not statuses or not isinstance(statuses[0], dict):
+        return None
+    filled = statuses[0].get("filled")
+    if not filled:
+        return None
+    try:
+        size = float(filled.get("totalSz", 0))
+        avg_px = float(filled.get("avgPx", 0))
+    except (TypeError, ValueError):
+        return None
+    if size <= 0:
+        return None
+    return OrderFill(coin, is_buy, size, avg_px, filled.get("oid"))
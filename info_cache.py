@@ -0,0 +1,304 @@
+"""
+Hyperliquid Rebalancer V2 - Cache info partagé entre processus (sidecar)
+==================================================
+Plusieurs processus bot.py sur un même hôte (chacun avec ses wallets via --wallet)
+demandent les mêmes allMids et metaAndAssetCtxs à chaque cycle. Le sidecar sert ces
+lectures à tous les processus de l'hôte depuis une socket Unix :
+
+- TTL courts (allMids 1s, metaAndAssetCtxs 2s par défaut) : les données restent celles d'un cycle ;
+- une seule requête en vol par payload (single flight) : les processus qui arrivent pendant
+  l'appel attendent sa réponse au lieu d'appeler l'API à leur tour ;
+- l'amont passe par le pool d'endpoints (HL_INFO_URLS, sinon HL_API_URL).
+
+Protocole : une ligne JSON par requête ({"type": "allMids"}), une ligne JSON par réponse
+({"ok": true, "result": ..., "age": 0.4} ou {"ok": false, "error": "..."}, avec "upstream": true
+quand c'est l'appel du sidecar vers l'API qui a échoué).
+
+Les prix servis décident des ordres : la socket est créée dans un répertoire privé (0700,
+$XDG_RUNTIME_DIR ou le répertoire temporaire), jamais dans un répertoire où un autre utilisateur
+peut écrire, et chaque extrémité vérifie l'uid de l'autre (SO_PEERCRED).
+
+Le bot (--info-cache) reste autonome : sidecar absent ou type non mis en cache, la requête part
+directement vers l'API ; une socket injoignable n'est réessayée qu'après un délai. Un échec amont
+remonté par le sidecar (API lente ou en panne) est en revanche l'échec de la requête
+(InfoCacheUpstreamError) : la renvoyer directement doublerait l'attente et la charge sur l'API.
+
+Usage:
+    python info_cache.py                                   # socket <runtime>/hl-info-cache-<uid>/info.sock
+    python info_cache.py --socket ~/.hl/info.sock --ttl-mids 0.5
+    python bot.py --wallet 1 --info-cache                  # dans chaque processus bot
+"""
+
+import os
+import json
+import stat
+import time
+import socket
+import struct
+import tempfile
+import argparse
+import threading
+import socketserver
+from typing import Dict, Any, Optional, Callable, Tuple
+
+from metrics import metrics
+
+def runtime_dir(name: str) -> str:
+    """Répertoire privé de l'utilisateur pour sockets et jetons : <XDG_RUNTIME_DIR ou tmp>/<name>-<uid>"""
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    base = runtime if runtime and os.path.isdir(runtime) else tempfile.gettempdir()
+    return os.path.join(base, f"{name}-{os.getuid()}")
+
+
+DEFAULT_SOCKET_PATH = os.path.join(runtime_dir("hl-info-cache"), "info.sock")
+DEFAULT_API_URL = "https://api.hyperliquid.xyz"
+
+# TTL par type de requête mis en cache (secondes) ; les autres types ne passent pas par le sidecar
+DEFAULT_TTLS = {"allMids": 1.0, "metaAndAssetCtxs": 2.0}
+
+# Délai des appels du sidecar vers l'API (secondes)
+UPSTREAM_TIMEOUT_SECONDS = 10.0
+# Délai de réponse du sidecar côté bot : au-delà de l'appel amont, sinon un amont lent
+# désactiverait le cache et enverrait chaque processus directement vers l'API
+CLIENT_TIMEOUT_SECONDS = UPSTREAM_TIMEOUT_SECONDS + 2.0
+# Délai avant de réessayer une socket injoignable (secondes)
+CLIENT_RETRY_SECONDS = 30.0
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"))
+
+
+def peer_uid(sock: socket.socket) -> Optional[int]:
+    """uid du processus à l'autre bout d'une socket Unix (SO_PEERCRED), None si non supporté"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+def prepare_socket_dir(socket_path: str) -> None:
+    """
+    Crée le répertoire de la socket (0700) ; refuse un répertoire qui n'appartient ni à
+    l'utilisateur ni à root, ou dans lequel d'autres peuvent écrire (ex: /tmp).
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid not in (os.getuid(), 0) or st.st_mode & 0o022:
+        raise PermissionError(f"{directory}: répertoire non privé (propriétaire {st.st_uid}, "
+                              f"mode {stat.S_IMODE(st.st_mode):o}), socket refusée")
+
+
+class _Flight:
+    """Appel amont en cours pour une clé (les autres demandeurs attendent l'événement)"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+
+
+class SharedInfoCache:
+    """Réponses info par payload, avec TTL par type et une seule requête amont en vol par clé"""
+
+    def __init__(self, fetch: Callable[[Dict], Any], ttls: Optional[Dict[str, float]] = None):
+        self.fetch = fetch
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def cacheable(self, payload: Dict[str, Any]) -> bool:
+        return payload.get("type") in self.ttls
+
+    def get(self, payload: Dict[str, Any]) -> Tuple[Any, float]:
+        """Réponse (depuis le cache ou l'amont) et son âge en secondes"""
+        key = cache_key(payload)
+        ttl = self.ttls[payload["type"]]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= ttl:
+                metrics.incr("info_cache_hits_total", type=payload["type"])
+                return entry[1], time.monotonic() - entry[0]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            metrics.incr("info_cache_coalesced_total", type=payload["type"])
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, 0.0
+
+        metrics.incr("info_cache_misses_total", type=payload["type"])
+        try:
+            flight.result = self.fetch(payload)
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic(), flight.result)
+            return flight.result, 0.0
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+class _CacheServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(cache: SharedInfoCache, socket_path: str) -> _CacheServer:
+    """Crée le serveur Unix (une connexion par processus bot, une ligne JSON par requête)"""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            uid = peer_uid(self.connection)
+            if uid is not None and uid not in (os.getuid(), 0):
+                return
+            for line in self.rfile:
+                try:
+                    payload = json.loads(line)
+                except ValueError as e:
+                    response = {"ok": False, "error": str(e)}
+                else:
+                    if not isinstance(payload, dict) or not cache.cacheable(payload):
+                        response = {"ok": False, "error": f"type non mis en cache: {payload!r:.60}"}
+                    else:
+                        try:
+                            result, age = cache.get(payload)
+                            response = {"ok": True, "result": result, "age": round(age, 3)}
+                        except Exception as e:
+                            response = {"ok": False, "error": str(e), "upstream": True}
+                self.wfile.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+                self.wfile.flush()
+
+    prepare_socket_dir(socket_path)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = _CacheServer(socket_path, Handler)
+    os.chmod(socket_path, 0o600)
+    return server
+
+
+class InfoCacheUpstreamError(Exception):
+    """Le sidecar a joint la socket mais son appel vers l'API a échoué"""
+
+
+class InfoCacheClient:
+    """
+    Client du sidecar côté bot : une connexion par thread. None quand le sidecar ne peut pas servir
+    (requête à envoyer directement), InfoCacheUpstreamError quand l'API a échoué derrière lui.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, types=tuple(DEFAULT_TTLS),
+                 timeout: float = CLIENT_TIMEOUT_SECONDS):
+        self.socket_path = socket_path
+        self.types = set(types)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._retry_at = 0.0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+                uid = peer_uid(sock)
+                if uid is not None and uid not in (os.getuid(), 0):
+                    raise PermissionError(f"sidecar sous l'uid {uid}, réponses ignorées")
+            except OSError:
+                sock.close()
+                raise
+            conn = self._local.conn = (sock, sock.makefile("rwb"))
+        return conn
+
+    def _close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def get(self, payload: Dict[str, Any]) -> Optional[Any]:
+        """
+        Réponse du sidecar, ou None (type non mis en cache, sidecar absent ou injoignable).
+        Lève InfoCacheUpstreamError si le sidecar n'a pas obtenu de réponse de l'API.
+        """
+        if payload.get("type") not in self.types or time.monotonic() < self._retry_at:
+            return None
+        try:
+            _, stream = self._connection()
+            stream.write(json.dumps(payload, separators=(",", ":")).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                raise ConnectionError("connexion fermée par le sidecar")
+            response = json.loads(line)
+        except (OSError, ValueError) as e:
+            self._close()
+            if self._retry_at == 0.0:
+                print(f"⚠️  Cache info partagé indisponible ({e}), requêtes directes vers l'API")
+            self._retry_at = time.monotonic() + CLIENT_RETRY_SECONDS
+            metrics.incr("info_cache_unavailable_total")
+            return None
+        if self._retry_at:
+            print(f"✅ Cache info partagé de nouveau joignable ({self.socket_path})")
+            self._retry_at = 0.0
+        if not response.get("ok"):
+            metrics.incr("info_cache_errors_total", type=payload["type"])
+            if response.get("upstream"):
+                raise InfoCacheUpstreamError(f"{payload['type']} via le cache info partagé: {response.get('error')}")
+            return None
+        metrics.incr("info_cache_served_total", type=payload["type"])
+        return response["result"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache info partagé (sidecar) pour les processus bot.py d'un hôte")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Chemin de la socket Unix")
+    parser.add_argument("--ttl-mids", type=float, default=DEFAULT_TTLS["allMids"], help="TTL de allMids (secondes)")
+    parser.add_argument("--ttl-ctxs", type=float, default=DEFAULT_TTLS["metaAndAssetCtxs"],
+                        help="TTL de metaAndAssetCtxs (secondes)")
+    parser.add_argument("--stats-every", type=float, default=60.0, help="Affiche les compteurs toutes les N secondes")
+    args = parser.parse_args()
+
+    from endpoints import EndpointPool
+    api_url = os.getenv("HL_API_URL", DEFAULT_API_URL)
+    urls = [u.strip() for u in os.getenv("HL_INFO_URLS", "").split(",") if u.strip()] or [api_url]
+    upstream = EndpointPool(urls, timeout=UPSTREAM_TIMEOUT_SECONDS)
+    cache = SharedInfoCache(upstream.call, {"allMids": args.ttl_mids, "metaAndAssetCtxs": args.ttl_ctxs})
+    try:
+        server = serve(cache, args.socket)
+    except PermissionError as e:
+        print(f"❌ {e}")
+        exit(1)
+    threading.Thread(target=server.serve_forever, name="info-cache", daemon=True).start()
+    print(f"🗄️  Cache info partagé sur unix:{args.socket} (allMids {args.ttl_mids:g}s, "
+          f"metaAndAssetCtxs {args.ttl_ctxs:g}s) | amont: {', '.join(urls)}")
+    try:
+        while True:
+            time.sleep(args.stats_every)
+            counts = {name: sum(metrics.get(name, type=t) for t in cache.ttls)
+                      for name in ("info_cache_hits_total", "info_cache_coalesced_total", "info_cache_misses_total")}
+            print(f"📊 hits {counts['info_cache_hits_total']:.0f} | regroupées "
+                  f"{counts['info_cache_coalesced_total']:.0f} | appels amont {counts['info_cache_misses_total']:.0f}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
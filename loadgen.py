@@ -0,0 +1,418 @@
+"""
+Hyperliquid Rebalancer V2 - Générateur de charge synthétique
+==================================================
+Pour mesurer le passage à l'échelle sans clés réelles ni fonds, loadgen.py produit une
+flotte et un marché fictifs, puis les sert sur une API info locale :
+
+- generate : N fichiers config_wallet_X.json, un fichier loadgen.env (HL_ADDRESS_X /
+  HL_PRIVATE_KEY_X jetables, HL_API_URL vers le serveur local) et l'état du marché :
+  M actifs répartis entre spot, main DEX et DEXs HIP-3, K actifs par wallet dont la
+  valeur détenue vaut exactement hold_usd au prix d'ancrage ;
+- serve : répond à spotMeta, allMids, metaAndAssetCtxs, meta, perpDexs,
+  spotClearinghouseState, clearinghouseState, batchClearinghouseStates, l2Book,
+  userFillsByTime, userNonFundingLedgerUpdates et orderStatus.
+
+Chaque prix suit une marche aléatoire qui revient vers son ancrage et reste dans la bande
+des seuils ; à chaque pas (--tick-seconds), un actif sort de la bande avec la probabilité
+--cross-rate (±1.5 × seuil), ce qui fixe le taux de déclenchement des ordres. Les balances
+servies ne bougent pas : en --paper, le bot exécute ses ordres sur ses comptes virtuels.
+
+Usage:
+    python loadgen.py generate --wallets 200 --assets 60 --dexs 2 --out loadtest
+    python loadgen.py serve --dir loadtest --cross-rate 0.05
+    set -a; . loadtest/loadgen.env; set +a
+    cd loadtest && python ../autoconfig.py && python ../bot.py --paper --no-snapshots
+"""
+
+import os
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Tuple, Optional
+
+try:
+    from eth_account import Account
+except ImportError:
+    print("❌ Erreur: La dépendance 'eth-account' n'est pas installée (nécessaire pour loadgen.py).")
+    print("   Veuillez exécuter : pip install eth-account")
+    exit(1)
+
+DEFAULT_LOADGEN_DIR = "loadtest"
+STATE_FILE = "loadgen_state.json"
+ENV_FILE = "loadgen.env"
+DEFAULT_PORT = 8099
+
+DEFAULT_THRESHOLD_PCT = 10.0
+# Probabilité qu'un actif sorte de la bande des seuils à chaque pas
+DEFAULT_CROSS_RATE = 0.05
+# Écart type d'un pas de la marche aléatoire (% du prix d'ancrage)
+DEFAULT_VOLATILITY_PCT = 1.0
+DEFAULT_TICK_SECONDS = 5.0
+# Amplitude d'une sortie de bande, en multiple du seuil
+CROSS_MULTIPLE = 1.5
+# Rappel vers l'ancrage à chaque pas (0 = marche libre, 1 = bruit sans mémoire)
+MEAN_REVERSION = 0.3
+
+QUOTE_TOKEN = "USDC"
+
+
+def _fmt(value: float) -> str:
+    """Nombre au format de l'API (chaîne, sans zéros inutiles)"""
+    return f"{value:.8f}".rstrip("0").rstrip(".") or "0"
+
+
+# =============================================================================
+# GÉNÉRATION
+# =============================================================================
+
+def _sz_decimals(price: float) -> int:
+    """Décimales de taille réalistes : un ordre de quelques dollars reste représentable (BTC 5, ETH 4)"""
+    return max(0, min(5, math.ceil(math.log10(price))))
+
+
+def build_market(assets: int, dexs: int, spot_share: float, rng: random.Random) -> Dict[str, Any]:
+    """Actifs spot (paires @N contre USDC) et perps (main + DEXs HIP-3 dx1..dxN) avec leur prix d'ancrage"""
+    spot_count = round(assets * spot_share)
+    dex_names = [""] + [f"dx{i}" for i in range(1, dexs + 1)]
+    spot = []
+    for i in range(spot_count):
+        price = round(math.exp(rng.uniform(math.log(0.05), math.log(500))), 4)
+        spot.append({
+            "name": f"TK{i + 1:04d}",
+            "index": i + 1,
+            "pair": i,
+            "tokenId": "0x" + rng.getrandbits(128).to_bytes(16, "big").hex(),
+            "szDecimals": _sz_decimals(price),
+            "price": price,
+        })
+    perps: Dict[str, List[Dict[str, Any]]] = {dex: [] for dex in dex_names}
+    for i in range(assets - spot_count):
+        dex = dex_names[i % len(dex_names)]
+        name = f"PX{i + 1:04d}"
+        price = round(math.exp(rng.uniform(math.log(0.5), math.log(50000))), 2)
+        perps[dex].append({
+            "name": f"{dex}:{name}" if dex else name,
+            "szDecimals": _sz_decimals(price),
+            "price": price,
+        })
+    return {"spot": spot, "perps": perps}
+
+
+def build_wallet(address: str, market: Dict[str, Any], assets_per_wallet: int, cash: float,
+                 rng: random.Random) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Détentions d'un wallet (état servi) et sa config : valeur détenue = hold_usd au prix d'ancrage"""
+    universe = [("spot", "", a) for a in market["spot"]]
+    universe += [("perp", dex, a) for dex, listed in market["perps"].items() for a in listed]
+    chosen = rng.sample(universe, min(assets_per_wallet, len(universe)))
+
+    state: Dict[str, Any] = {"address": address, "spot": {QUOTE_TOKEN: cash}, "perps": {}}
+    spot_tokens: Dict[str, Any] = {}
+    perpetuals: Dict[str, Any] = {}
+    for kind, dex, asset in chosen:
+        hold_usd = float(rng.randrange(100, 1001, 50))
+        size = round(hold_usd / asset["price"], 8)
+        common = {
+            "enabled": True,
+            "hold_usd": hold_usd,
+            "buy_enabled": True,
+            "sell_enabled": True,
+            "fee_pct": 0.07,
+            "sz_decimals": asset["szDecimals"],
+            "price_decimals": 6,
+            "quote_asset": QUOTE_TOKEN,
+        }
+        if kind == "spot":
+            state["spot"][asset["name"]] = size
+            spot_tokens[asset["name"]] = dict(common, pair_index=asset["pair"])
+        else:
+            state["perps"].setdefault(dex, {})[asset["name"]] = size
+            perpetuals[asset["name"]] = dict(common, asset_name=asset["name"], dex=dex)
+    return state, {"spot_tokens": spot_tokens, "perpetuals": perpetuals}
+
+
+def generate(out_dir: str, wallets: int, assets: int, dexs: int, assets_per_wallet: int, threshold_pct: float,
+             cash: float, port: int, seed: int, spot_share: float = 0.5, order_size: float = 15,
+             cooldown_minutes: float = 0, interval: int = 10) -> None:
+    """Écrit les configs, loadgen.env (clés jetables) et l'état du marché dans out_dir"""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    market = build_market(assets, dexs, spot_share, rng)
+    states = []
+    env_lines = [
+        "# Clés jetables générées par loadgen.py : aucun fonds, ne jamais les utiliser sur le mainnet",
+        f"HL_API_URL=http://127.0.0.1:{port}",
+    ]
+    for wid in range(1, wallets + 1):
+        account = Account.create()
+        state, assets_config = build_wallet(account.address, market, assets_per_wallet, cash, rng)
+        states.append(state)
+        for section in assets_config.values():
+            for tc in section.values():
+                tc["buy_threshold_pct"] = threshold_pct
+                tc["sell_threshold_pct"] = threshold_pct
+        config = {
+            "settings": {
+                "order_size_usd": order_size,
+                "cooldown_minutes": cooldown_minutes,
+                "check_interval_seconds": interval,
+                "default_fee_pct": 0.07,
+                "dry_run": True,
+            },
+            **assets_config,
+        }
+        with open(os.path.join(out_dir, f"config_wallet_{wid}.json"), "w") as f:
+            json.dump(config, f, indent=2)
+        env_lines.append(f"HL_ADDRESS_{wid}={account.address}")
+        env_lines.append(f"HL_PRIVATE_KEY_{wid}=0x{bytes(account.key).hex()}")
+
+    with open(os.path.join(out_dir, ENV_FILE), "w") as f:
+        f.write("\n".join(env_lines) + "\n")
+    with open(os.path.join(out_dir, STATE_FILE), "w") as f:
+        json.dump({"seed": seed, "threshold_pct": threshold_pct, "market": market, "wallets": states}, f)
+
+
+# =============================================================================
+# MARCHÉ ET SERVEUR
+# =============================================================================
+
+class SyntheticMarket:
+    """Prix par pas de temps (marche aléatoire bornée + sorties de bande) et réponses info"""
+
+    def __init__(self, state: Dict[str, Any], cross_rate: float = DEFAULT_CROSS_RATE,
+                 volatility_pct: float = DEFAULT_VOLATILITY_PCT, tick_seconds: float = DEFAULT_TICK_SECONDS):
+        self.market = state["market"]
+        self.threshold = state["threshold_pct"] / 100
+        self.cross_rate = cross_rate
+        self.volatility = volatility_pct / 100
+        self.tick_seconds = tick_seconds
+        self.wallets = {w["address"].lower(): w for w in state["wallets"]}
+        self._rng = random.Random(state["seed"])
+        # Prix d'ancrage et écart relatif courant, par actif (clé de allMids)
+        self.anchors: Dict[str, float] = {f"@{a['pair']}": a["price"] for a in self.market["spot"]}
+        for listed in self.market["perps"].values():
+            self.anchors.update({a["name"]: a["price"] for a in listed})
+        self._walk = {coin: 0.0 for coin in self.anchors}
+        self._prices: Dict[str, float] = dict(self.anchors)
+        self.tick = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self.crossings = 0
+        self.requests: Dict[str, int] = {}
+
+    def prices(self) -> Dict[str, float]:
+        """Prix du pas courant (avance la marche jusqu'au pas correspondant à l'horloge)"""
+        with self._lock:
+            tick = int((time.monotonic() - self._started) / self.tick_seconds) if self.tick_seconds > 0 else self.tick + 1
+            # Après une longue pause, pas plus de 100 pas rattrapés
+            for _ in range(min(tick - self.tick, 100)):
+                self._step()
+            self.tick = max(self.tick, tick)
+            return dict(self._prices)
+
+    def _step(self) -> None:
+        band = 0.8 * self.threshold
+        for coin, anchor in self.anchors.items():
+            x = (1 - MEAN_REVERSION) * self._walk[coin] + self._rng.gauss(0.0, self.volatility)
+            x = max(-band, min(band, x))
+            self._walk[coin] = x
+            if self._rng.random() < self.cross_rate:
+                self.crossings += 1
+                x = self._rng.choice((-1, 1)) * CROSS_MULTIPLE * self.threshold
+            self._prices[coin] = anchor * (1 + x)
+
+    # --- Réponses info ---
+
+    def spot_meta(self) -> Dict[str, Any]:
+        tokens = [{"name": QUOTE_TOKEN, "szDecimals": 8, "weiDecimals": 8, "index": 0,
+                   "tokenId": "0x" + "00" * 16, "isCanonical": True}]
+        universe = []
+        for a in self.market["spot"]:
+            tokens.append({"name": a["name"], "szDecimals": a["szDecimals"], "weiDecimals": 8, "index": a["index"],
+                           "tokenId": a["tokenId"], "isCanonical": False})
+            universe.append({"tokens": [a["index"], 0], "name": f"@{a['pair']}", "index": a["pair"],
+                             "isCanonical": False})
+        return {"tokens": tokens, "universe": universe}
+
+    def meta(self, dex: str) -> Dict[str, Any]:
+        universe = [{"name": a["name"], "szDecimals": a["szDecimals"], "maxLeverage": 10}
+                    for a in self.market["perps"].get(dex, [])]
+        return {"universe": universe, "collateralToken": 0}
+
+    def meta_and_ctxs(self, dex: str) -> List[Any]:
+        prices = self.prices()
+        ctxs = []
+        for a in self.market["perps"].get(dex, []):
+            px = _fmt(prices[a["name"]])
+            ctxs.append({"markPx": px, "midPx": px, "oraclePx": px, "funding": "0", "openInterest": "0",
+                         "dayNtlVlm": "0", "prevDayPx": _fmt(a["price"])})
+        return [self.meta(dex), ctxs]
+
+    def all_mids(self, dex: str = "") -> Dict[str, str]:
+        prices = self.prices()
+        if dex:
+            return {a["name"]: _fmt(prices[a["name"]]) for a in self.market["perps"].get(dex, [])}
+        mids = {f"@{a['pair']}": _fmt(prices[f'@{a["pair"]}']) for a in self.market["spot"]}
+        mids.update({a["name"]: _fmt(prices[a["name"]]) for a in self.market["perps"].get("", [])})
+        return mids
+
+    def perp_dexs(self) -> List[Any]:
+        return [None] + [{"name": dex, "fullName": f"Synthetic {dex}", "deployer": "0x" + "00" * 20}
+                         for dex in self.market["perps"] if dex]
+
+    def spot_state(self, user: str) -> Dict[str, Any]:
+        wallet = self.wallets.get(user.lower(), {"spot": {}})
+        return {"balances": [{"coin": coin, "token": 0, "total": _fmt(total), "hold": "0", "entryNtl": "0"}
+                             for coin, total in wallet["spot"].items()]}
+
+    def perp_state(self, user: str, dex: str = "") -> Dict[str, Any]:
+        wallet = self.wallets.get(user.lower(), {"perps": {}})
+        prices = self.prices()
+        positions = []
+        notional = 0.0
+        for coin, szi in wallet["perps"].get(dex, {}).items():
+            px = prices[coin]
+            notional += abs(szi) * px
+            positions.append({"type": "oneWay", "position": {
+                "coin": coin, "szi": _fmt(szi), "entryPx": _fmt(self.anchors[coin]),
+                "positionValue": _fmt(abs(szi) * px), "unrealizedPnl": _fmt(szi * (px - self.anchors[coin])),
+                "leverage": {"type": "cross", "value": 1}, "liquidationPx": None, "marginUsed": _fmt(abs(szi) * px),
+            }})
+        summary = {"accountValue": _fmt(notional), "totalNtlPos": _fmt(notional), "totalMarginUsed": _fmt(notional)}
+        return {"assetPositions": positions, "marginSummary": summary, "crossMarginSummary": summary,
+                "withdrawable": "0"}
+
+    def l2_book(self, coin: str) -> Dict[str, Any]:
+        mid = self.prices().get(coin, 0.0)
+        bids = [{"px": _fmt(mid * (1 - 0.0005 * i)), "sz": _fmt(1000 / mid if mid else 0), "n": 1} for i in range(1, 11)]
+        asks = [{"px": _fmt(mid * (1 + 0.0005 * i)), "sz": _fmt(1000 / mid if mid else 0), "n": 1} for i in range(1, 11)]
+        return {"coin": coin, "time": int(time.time() * 1000), "levels": [bids, asks]}
+
+    def handle(self, payload: Dict[str, Any]) -> Any:
+        """Réponse à une requête info ; KeyError pour un type non supporté (400)"""
+        kind = payload.get("type")
+        dex = payload.get("dex", "")
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+        if kind == "spotMeta":
+            return self.spot_meta()
+        if kind == "allMids":
+            return self.all_mids(dex)
+        if kind == "metaAndAssetCtxs":
+            return self.meta_and_ctxs(dex)
+        if kind == "meta":
+            return self.meta(dex)
+        if kind == "perpDexs":
+            return self.perp_dexs()
+        if kind == "spotClearinghouseState":
+            return self.spot_state(payload["user"])
+        if kind == "clearinghouseState":
+            return self.perp_state(payload["user"], dex)
+        if kind == "batchClearinghouseStates":
+            return [self.perp_state(user, dex) for user in payload["users"]]
+        if kind == "l2Book":
+            return self.l2_book(payload["coin"])
+        if kind in ("userFillsByTime", "userNonFundingLedgerUpdates"):
+            return []
+        if kind == "orderStatus":
+            return {"status": "unknownOid"}
+        raise KeyError(kind)
+
+
+def serve(market: SyntheticMarket, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Serveur HTTP local (127.0.0.1) de l'API info synthétique"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") != "/info":
+                self._reply(404, {"error": "loadgen ne sert que /info (lancer le bot en --paper ou --dry-run)"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                self._reply(200, market.handle(payload))
+            except (KeyError, ValueError, TypeError) as e:
+                self._reply(400, {"error": f"requête non supportée: {e}"})
+
+        def _reply(self, status: int, body: Any):
+            data = json.dumps(body, separators=(",", ":")).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperliquid Rebalancer V2 - Générateur de charge synthétique")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="Écrit les configs, les clés jetables et l'état du marché")
+    gen.add_argument("--wallets", type=int, default=10, help="Nombre de wallets (N)")
+    gen.add_argument("--assets", type=int, default=40, help="Nombre d'actifs du marché (M)")
+    gen.add_argument("--dexs", type=int, default=2, help="Nombre de DEXs HIP-3 (en plus du main DEX)")
+    gen.add_argument("--spot-share", type=float, default=0.5, help="Part des actifs en spot")
+    gen.add_argument("--assets-per-wallet", type=int, default=10, help="Actifs détenus par wallet (K)")
+    gen.add_argument("--threshold-pct", type=float, default=DEFAULT_THRESHOLD_PCT, help="Seuils d'achat et de vente")
+    gen.add_argument("--cash", type=float, default=1000.0, help="USDC spot de chaque wallet")
+    gen.add_argument("--order-size", type=float, default=15, help="order_size_usd des configs")
+    gen.add_argument("--cooldown-minutes", type=float, default=0, help="cooldown_minutes des configs")
+    gen.add_argument("--interval", type=int, default=10, help="check_interval_seconds des configs")
+    gen.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port du serveur (HL_API_URL de loadgen.env)")
+    gen.add_argument("--seed", type=int, default=1, help="Graine (marché et détentions reproductibles)")
+    gen.add_argument("--out", default=DEFAULT_LOADGEN_DIR, help="Répertoire de sortie")
+
+    srv = sub.add_parser("serve", help="Sert l'API info synthétique sur 127.0.0.1")
+    srv.add_argument("--dir", default=DEFAULT_LOADGEN_DIR, help="Répertoire généré par 'generate'")
+    srv.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port d'écoute")
+    srv.add_argument("--cross-rate", type=float, default=DEFAULT_CROSS_RATE,
+                     help="Probabilité par actif et par pas de sortir de la bande des seuils")
+    srv.add_argument("--volatility-pct", type=float, default=DEFAULT_VOLATILITY_PCT,
+                     help="Écart type d'un pas de la marche aléatoire (%% du prix)")
+    srv.add_argument("--tick-seconds", type=float, default=DEFAULT_TICK_SECONDS,
+                     help="Durée d'un pas de prix (0 = un pas par requête de prix)")
+    srv.add_argument("--stats-every", type=float, default=30.0, help="Affiche les compteurs toutes les N secondes")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        started = time.perf_counter()
+        generate(args.out, args.wallets, args.assets, args.dexs, args.assets_per_wallet, args.threshold_pct,
+                 args.cash, args.port, args.seed, args.spot_share, args.order_size, args.cooldown_minutes,
+                 args.interval)
+        print(f"✅ {args.wallets} config(s), {ENV_FILE} et {STATE_FILE} écrits dans {args.out}/ "
+              f"({args.assets} actifs, {args.dexs} DEX(s) HIP-3) en {time.perf_counter() - started:.2f}s")
+        print(f"   Ensuite : python loadgen.py serve --dir {args.out} --port {args.port}")
+        return
+
+    with open(os.path.join(args.dir, STATE_FILE)) as f:
+        state = json.load(f)
+    market = SyntheticMarket(state, args.cross_rate, args.volatility_pct, args.tick_seconds)
+    server = serve(market, args.port)
+    threading.Thread(target=server.serve_forever, name="loadgen", daemon=True).start()
+    print(f"🧪 API info synthétique sur http://127.0.0.1:{args.port} ({len(market.wallets)} wallets, "
+          f"{len(market.anchors)} actifs, sortie de bande {args.cross_rate * 100:g}% par pas de {args.tick_seconds:g}s)")
+    try:
+        while True:
+            time.sleep(args.stats_every)
+            counts = " | ".join(f"{kind} {n}" for kind, n in sorted(market.requests.items()))
+            print(f"📊 pas {market.tick}, sorties de bande {market.crossings} | {counts or 'aucune requête'}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
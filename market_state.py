@@ -0,0 +1,195 @@
+"""
+Hyperliquid Rebalancer V2 - État de marché compact
+==================================================
+Représentation typée des contextes d'actifs perpétuels (metaAndAssetCtxs + allMids).
+
+Au lieu de garder chaque dict JSON tel quel (avec des nombres en chaîne re-parsés
+à chaque lecture), on ne conserve que les champs utilisés par le bot
+(markPx, szDecimals, index, DEX) dans des colonnes `array`, et les floats sont
+parsés une seule fois à la construction.
+"""
+
+from array import array
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+
+# Valeur utilisée quand szDecimals / index ne sont pas connus (ex: prix venant de allMids)
+UNKNOWN = -1
+
+
+def _to_float(value: Any) -> float:
+    """Parse un nombre (chaîne ou float) de l'API, 0.0 si absent ou invalide"""
+    if value is None or value == "N/A":
+        return 0.0
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def dex_of(coin: str) -> str:
+    """Retourne le DEX d'un coin ("flx:TSLA" -> "flx", "BTC" -> "")"""
+    return coin.split(":", 1)[0] if ":" in coin else ""
+
+
+class PerpAsset:
+    """Vue en lecture seule sur une ligne de MarketState"""
+
+    __slots__ = ("name", "dex", "index", "sz_decimals", "mark_px")
+
+    def __init__(self, name: str, dex: str, index: int, sz_decimals: int, mark_px: float):
+        self.name = name
+        self.dex = dex
+        self.index = index
+        self.sz_decimals = sz_decimals
+        self.mark_px = mark_px
+
+    def __repr__(self) -> str:
+        return (f"PerpAsset({self.name!r}, dex={self.dex!r}, index={self.index}, "
+                f"sz_decimals={self.sz_decimals}, mark_px={self.mark_px})")
+
+
+class MarketState:
+    """
+    Contextes d'actifs perpétuels stockés en colonnes.
+    Une ligne par actif (nom unique), tous DEXs confondus.
+    """
+
+    __slots__ = ("_rows", "_names", "_dexs", "_dex_ids", "mark_px", "sz_decimals", "index", "dex_id", "collateral")
+
+    def __init__(self):
+        self._rows: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._dexs: List[str] = []
+        self._dex_ids: Dict[str, int] = {}
+        self.mark_px = array("d")
+        self.sz_decimals = array("b")
+        self.index = array("i")
+        self.dex_id = array("H")
+        # collateralToken (id de token spot) par DEX, tel que retourné par la meta
+        self.collateral: Dict[str, int] = {}
+
+    # -------------------------------------------------------------------------
+    # Construction
+    # -------------------------------------------------------------------------
+
+    def _intern_dex(self, dex: str) -> int:
+        dex_id = self._dex_ids.get(dex)
+        if dex_id is None:
+            dex_id = len(self._dexs)
+            self._dexs.append(dex)
+            self._dex_ids[dex] = dex_id
+        return dex_id
+
+    def _append(self, name: str, dex: str, index: int, sz_decimals: int, mark_px: float) -> None:
+        self._rows[name] = len(self._names)
+        self._names.append(name)
+        self.mark_px.append(mark_px)
+        self.sz_decimals.append(sz_decimals)
+        self.index.append(index)
+        self.dex_id.append(self._intern_dex(dex))
+
+    def add_dex(self, dex: str, meta_and_ctxs: List[Any]) -> None:
+        """
+        Ajoute la réponse metaAndAssetCtxs d'un DEX ("" pour le main DEX).
+        Les contextes sont alignés par position sur meta.universe.
+        Un actif déjà présent (DEX ajouté précédemment) n'est pas écrasé.
+        """
+        meta, contexts = meta_and_ctxs[0], meta_and_ctxs[1]
+        if "collateralToken" in meta:
+            self.collateral[dex] = meta["collateralToken"]
+
+        for i, asset in enumerate(meta.get("universe", [])):
+            name = asset.get("name")
+            if not name or name in self._rows:
+                continue
+            ctx = contexts[i] if i < len(contexts) else {}
+            self._append(name, dex, i, asset.get("szDecimals", UNKNOWN), _to_float(ctx.get("markPx")))
+
+    def add_mids(self, mids: Dict[str, float]) -> None:
+        """Complète avec allMids (déjà parsé) pour les coins perp absents des contextes"""
+        for coin, price in mids.items():
+            if coin in self._rows or coin.startswith("@"):
+                continue
+            self._append(coin, dex_of(coin), UNKNOWN, UNKNOWN, price)
+
+    # -------------------------------------------------------------------------
+    # Lecture
+    # -------------------------------------------------------------------------
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rows
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def get(self, name: str) -> Optional[PerpAsset]:
+        row = self._rows.get(name)
+        if row is None:
+            return None
+        return PerpAsset(name, self._dexs[self.dex_id[row]], self.index[row],
+                         self.sz_decimals[row], self.mark_px[row])
+
+    def mark_price(self, name: str, default: float = 0.0) -> float:
+        row = self._rows.get(name)
+        if row is None:
+            return default
+        return self.mark_px[row]
+
+    def asset_info(self, name: str, default_sz_decimals: int = 3) -> Tuple[Optional[int], int]:
+        """Retourne (asset_index, sz_decimals) ; (None, default) si inconnu"""
+        row = self._rows.get(name)
+        if row is None or self.index[row] == UNKNOWN:
+            return None, default_sz_decimals
+        return self.index[row], self.sz_decimals[row]
+
+    def dexs(self) -> List[str]:
+        return list(self._dexs)
+
+
+class PerpPosition:
+    """Position perpétuelle d'un utilisateur, floats parsés une seule fois"""
+
+    __slots__ = ("dex", "coin", "szi", "entry_px", "unrealized_pnl", "mark_px")
+
+    def __init__(self, dex: str, coin: str, szi: float, entry_px: float,
+                 unrealized_pnl: float, mark_px: float = 0.0):
+        self.dex = dex
+        self.coin = coin
+        self.szi = szi
+        self.entry_px = entry_px
+        self.unrealized_pnl = unrealized_pnl
+        self.mark_px = mark_px
+
+    @classmethod
+    def from_api(cls, dex: str, pos: Dict[str, Any]) -> "PerpPosition":
+        """dex: "main" ou nom du DEX HIP-3 ; pos: assetPositions[].position"""
+        return cls(dex, pos.get("coin", ""), _to_float(pos.get("szi")), _to_float(pos.get("entryPx")),
+                   _to_float(pos.get("unrealizedPnl")), _to_float(pos.get("markPx")))
+
+    def apply_fill(self, signed_size: float, price: float) -> float:
+        """
+        Applique une exécution (taille signée, prix moyen) : szi, prix d'entrée moyen et PnL.
+        Retourne la variation de notionnel engagé (|szi| * prix), soit la marge à x1.
+        """
+        old = self.szi
+        new = old + signed_size
+        if abs(new) < 1e-12:
+            new, entry = 0.0, 0.0
+        elif old == 0 or old * new < 0:
+            # Ouverture ou retournement : le reste de la position est au prix d'exécution
+            entry = price
+        elif abs(new) > abs(old):
+            entry = (abs(old) * self.entry_px + abs(signed_size) * price) / abs(new)
+        else:
+            entry = self.entry_px
+        self.szi = new
+        self.entry_px = entry
+        self.mark_px = price
+        self.unrealized_pnl = new * (price - entry)
+        return (abs(new) - abs(old)) * price
+
+    def __repr__(self) -> str:
+        return f"PerpPosition({self.coin!r}, dex={self.dex!r}, szi={self.szi}, entry_px={self.entry_px})"
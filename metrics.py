@@ -0,0 +1,68 @@
+"""
+Hyperliquid Rebalancer V2 - Métriques
+==================================================
+Registre de métriques en mémoire (compteurs et jauges avec labels), partagé par
+les modules du bot. Un instantané JSON peut être écrit sur disque à chaque cycle
+(option --metrics-file de bot.py) pour être lu par un outil externe.
+"""
+
+import json
+import os
+import time
+import threading
+from typing import Dict, Any, Tuple
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format(key: LabelKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class Metrics:
+    """Compteurs (cumulés) et jauges (dernière valeur), thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[LabelKey, float] = {}
+        self._gauges: Dict[LabelKey, float] = {}
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def get(self, name: str, **labels: Any) -> float:
+        key = _key(name, labels)
+        with self._lock:
+            return self._gauges.get(key, self._counters.get(key, 0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "counters": {_format(k): v for k, v in self._counters.items()},
+                "gauges": {_format(k): v for k, v in self._gauges.items()},
+            }
+
+    def write(self, path: str) -> None:
+        """Écrit l'instantané en JSON (écriture atomique via fichier temporaire)"""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+
+# Registre global
+metrics = Metrics()
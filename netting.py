@@ -0,0 +1,196 @@
+"""
+Hyperliquid Rebalancer V2 - Compensation des ordres entre wallets
+==================================================
+Les wallets détiennent souvent les mêmes actifs : sur un même cycle, un wallet peut vendre
+HYPE pendant qu'un autre en achète, et les deux paient frais et spread. Avant l'envoi par
+priorité, la couche portefeuille (--netting) regroupe les ordres de toute la flotte par actif :
+
+- report   : affiche l'exposition achetée, vendue et nette par actif, sans rien changer ;
+- skip     : les ordres opposés de wallets différents se compensent et ne sont pas envoyés
+             (exposition totale de la flotte inchangée, moins d'ordres sur l'exchange) ;
+- transfer : comme skip, mais pour le spot, le vendeur transfère les tokens à l'acheteur
+             et l'acheteur lui règle la quote au mid (spotSend), chaque wallet atteint ainsi
+             sa cible sans frais ; les perps (non transférables) sont compensés comme skip.
+
+Les paires sont formées de la plus grosse vente vers le plus gros achat, puis réglées une à une :
+seules les paires réglées retirent des ordres (une paire non réglée, transfert refusé par exemple,
+laisse partir ses deux ordres). Un ordre partiellement compensé part avec sa taille résiduelle,
+ou pas du tout si le reliquat est sous le notionnel minimum d'un ordre (réévalué au cycle suivant).
+
+Une compensation sans transfert ne change ni les balances ni les cooldowns : la même paire
+reviendrait à chaque cycle sans qu'aucun des deux wallets n'atteigne sa cible. Elle n'est donc
+retenue que pendant un nombre limité de cycles consécutifs, après quoi ses ordres partent.
+"""
+
+from typing import Dict, List, Set, Tuple
+
+from dispatch import OrderCandidate
+
+NETTING_OFF = "off"
+NETTING_REPORT = "report"
+NETTING_SKIP = "skip"
+NETTING_TRANSFER = "transfer"
+NETTING_MODES = (NETTING_OFF, NETTING_REPORT, NETTING_SKIP, NETTING_TRANSFER)
+
+# Notionnel minimum d'un ordre Hyperliquid (USD)
+MIN_ORDER_NOTIONAL = 10.0
+
+# Cycles consécutifs où une même paire peut être compensée sans transfert
+DEFAULT_MAX_SKIP_TICKS = 3
+
+
+def order_notional(candidate: OrderCandidate) -> float:
+    return candidate.order["size_tokens"] * candidate.order["price"]
+
+
+def netting_key(candidate: OrderCandidate) -> Tuple[int, str]:
+    """Actif d'un ordre : (type spot/perp, coin de l'ordre)"""
+    return candidate.order["kind"], candidate.order["coin"]
+
+
+class AssetExposure:
+    """Ordres d'un actif sur le cycle, tous wallets confondus"""
+
+    __slots__ = ("asset", "buys", "sells", "buy_usd", "sell_usd", "netted_usd")
+
+    def __init__(self, asset: str):
+        self.asset = asset
+        self.buys: List[OrderCandidate] = []
+        self.sells: List[OrderCandidate] = []
+        self.buy_usd = 0.0
+        self.sell_usd = 0.0
+        self.netted_usd = 0.0
+
+    @property
+    def net_usd(self) -> float:
+        return self.buy_usd - self.sell_usd
+
+
+class NettingMatch:
+    """Compensation entre un vendeur et un acheteur (taille en tokens, au mid du vendeur)"""
+
+    __slots__ = ("seller", "buyer", "size_tokens", "price")
+
+    def __init__(self, seller: OrderCandidate, buyer: OrderCandidate, size_tokens: float, price: float):
+        self.seller = seller
+        self.buyer = buyer
+        self.size_tokens = size_tokens
+        self.price = price
+
+    @property
+    def notional(self) -> float:
+        return self.size_tokens * self.price
+
+
+def exposures(candidates: List[OrderCandidate]) -> Dict[Tuple[int, str], AssetExposure]:
+    """Exposition achetée / vendue par actif"""
+    by_asset: Dict[Tuple[int, str], AssetExposure] = {}
+    for candidate in candidates:
+        key = netting_key(candidate)
+        exposure = by_asset.get(key)
+        if exposure is None:
+            exposure = by_asset[key] = AssetExposure(candidate.asset)
+        if candidate.order["is_buy"]:
+            exposure.buys.append(candidate)
+            exposure.buy_usd += order_notional(candidate)
+        else:
+            exposure.sells.append(candidate)
+            exposure.sell_usd += order_notional(candidate)
+    return by_asset
+
+
+def match_candidates(candidates: List[OrderCandidate]
+                     ) -> Tuple[List[NettingMatch], Dict[Tuple[int, str], AssetExposure]]:
+    """
+    Paires de compensation entre achats et ventes opposés d'un même actif (wallets différents).
+    Retourne (compensations proposées ; exposition par actif). Rien n'est retiré tant qu'elles
+    ne sont pas réglées (voir apply_matches).
+    """
+    by_asset = exposures(candidates)
+    matches: List[NettingMatch] = []
+
+    for exposure in by_asset.values():
+        if not exposure.buys or not exposure.sells:
+            continue
+        # Tailles restantes (tokens), plus gros notionnel en premier
+        remaining = {id(c): c.order["size_tokens"] for c in exposure.buys + exposure.sells}
+        buys = sorted(exposure.buys, key=order_notional, reverse=True)
+        sells = sorted(exposure.sells, key=order_notional, reverse=True)
+        for seller in sells:
+            for buyer in buys:
+                if buyer.wallet_id == seller.wallet_id or remaining[id(buyer)] <= 0:
+                    continue
+                size = min(remaining[id(seller)], remaining[id(buyer)])
+                if size <= 0:
+                    break
+                remaining[id(seller)] -= size
+                remaining[id(buyer)] -= size
+                matches.append(NettingMatch(seller, buyer, size, seller.order["price"]))
+                if remaining[id(seller)] <= 0:
+                    break
+    return matches, by_asset
+
+
+def apply_matches(candidates: List[OrderCandidate], settled: List[NettingMatch],
+                  by_asset: Dict[Tuple[int, str], AssetExposure],
+                  min_notional: float = MIN_ORDER_NOTIONAL) -> List[OrderCandidate]:
+    """
+    Ordres restant à envoyer une fois les compensations `settled` réglées (tailles résiduelles).
+    Les ordres modifiés sont des copies : les candidats d'origine ne changent pas.
+    """
+    netted: Dict[int, float] = {}
+    for match in settled:
+        netted[id(match.seller)] = netted.get(id(match.seller), 0.0) + match.size_tokens
+        netted[id(match.buyer)] = netted.get(id(match.buyer), 0.0) + match.size_tokens
+        by_asset[netting_key(match.seller)].netted_usd += match.notional
+
+    kept = []
+    for candidate in candidates:
+        if id(candidate) not in netted:
+            kept.append(candidate)
+            continue
+        left = candidate.order["size_tokens"] - netted[id(candidate)]
+        if left * candidate.order["price"] < min_notional:
+            continue
+        order = dict(candidate.order, size_tokens=left)
+        order["label"] = f"{order['label']} (reliquat {left:.6f} après compensation)"
+        kept.append(OrderCandidate(candidate.wallet_id, candidate.asset, candidate.excess,
+                                   candidate.deviation, order))
+    return kept
+
+
+class SkipLimiter:
+    """Cycles consécutifs compensés sans transfert, par paire (actif, vendeur, acheteur)"""
+
+    def __init__(self, max_ticks: int):
+        self.max_ticks = max_ticks
+        self._counts: Dict[Tuple[int, str, int, int], int] = {}
+        self._seen: Set[Tuple[int, str, int, int]] = set()
+
+    def allow(self, match: NettingMatch) -> bool:
+        """True si la paire peut encore être compensée sans transfert ce cycle"""
+        key = netting_key(match.seller) + (match.seller.wallet_id, match.buyer.wallet_id)
+        self._seen.add(key)
+        count = self._counts.get(key, 0)
+        if count >= self.max_ticks:
+            # Ordres envoyés ce cycle ; la paire pourra de nouveau être compensée ensuite
+            self._counts[key] = 0
+            return False
+        self._counts[key] = count + 1
+        return True
+
+    def end_tick(self) -> None:
+        """Oublie les paires absentes de ce cycle (seuls les cycles consécutifs comptent)"""
+        self._counts = {k: v for k, v in self._counts.items() if k in self._seen}
+        self._seen = set()
+
+
+def format_exposures(by_asset: Dict[Tuple[int, str], AssetExposure]) -> List[str]:
+    """Lignes du rapport d'exposition (actifs avec ordres dans les deux sens en premier)"""
+    lines = []
+    ordered = sorted(by_asset.values(), key=lambda e: (not (e.buys and e.sells), -(e.buy_usd + e.sell_usd)))
+    for e in ordered:
+        netted = f", compensé ${e.netted_usd:.2f}" if e.netted_usd else ""
+        lines.append(f"   {e.asset}: achats ${e.buy_usd:.2f} ({len(e.buys)}) | ventes ${e.sell_usd:.2f} "
+                     f"({len(e.sells)}) | net ${e.net_usd:+.2f}{netted}")
+    return lines
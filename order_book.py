@@ -0,0 +1,152 @@
+"""
+Hyperliquid Rebalancer V2 - Prix limite depuis le carnet d'ordres (l2Book)
+==================================================
+Au mid ±1%, un IOC traverse beaucoup trop profond dans un carnet épais, ou n'est pas
+exécuté du tout dans un carnet mince (DEX HIP-3) ; un ordre manqué coûte un cycle.
+Avec --l2-pricing, le prix limite vient d'un instantané l2Book récent :
+
+    {"coin": "BTC", "time": 1700000000000, "levels": [
+        [{"px": "99990", "sz": "0.5", "n": 3}, ...],    # bids (du meilleur au pire)
+        [{"px": "100010", "sz": "0.2", "n": 1}, ...]    # asks
+    ]}
+
+- on parcourt le côté opposé (asks pour un achat) jusqu'au niveau qui couvre la taille,
+  puis on ajoute un petit buffer ;
+- le prix est borné à un écart maximum du mid (carnet aberrant ou trop mince : exécution partielle) ;
+- les instantanés sont mis en cache par coin pour quelques secondes et partagés par tous
+  les wallets d'un même cycle ; la taille envoyée est retirée de l'instantané local
+  pour que les ordres suivants (tranches, autres wallets) visent les niveaux restants ;
+- sans instantané (erreur, circuit ouvert), le prix revient au mid ± budget de slippage.
+"""
+
+import time
+import threading
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+from circuit_breaker import BreakerBoard
+from metrics import metrics
+
+DEFAULT_L2_BUFFER_BPS = 10.0
+DEFAULT_L2_MAX_AGE_SECONDS = 2.0
+# Écart maximum du prix limite au mid
+DEFAULT_L2_MAX_DEVIATION_BPS = 500.0
+
+
+class L2Snapshot:
+    """Niveaux d'un carnet (px, taille restante), du meilleur au pire, pour chaque côté"""
+
+    __slots__ = ("coin", "bids", "asks", "fetched_at")
+
+    def __init__(self, coin: str, bids: List[List[float]], asks: List[List[float]], fetched_at: float):
+        self.coin = coin
+        self.bids = bids
+        self.asks = asks
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def from_api(cls, coin: str, response: Dict[str, Any]) -> "L2Snapshot":
+        levels = response.get("levels") or [[], []]
+        sides = []
+        for side in (levels[0] if levels else [], levels[1] if len(levels) > 1 else []):
+            sides.append([[float(level["px"]), float(level["sz"])] for level in side])
+        return cls(coin, sides[0], sides[1], time.monotonic())
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def covering_price(self, is_buy: bool, size: float) -> Tuple[Optional[float], bool]:
+        """
+        Prix du niveau qui couvre `size` sur le côté opposé.
+        Retourne (prix, couvert) ; sans couverture, le pire niveau disponible (None si côté vide).
+        """
+        remaining = size
+        price = None
+        for px, sz in (self.asks if is_buy else self.bids):
+            if sz <= 0:
+                continue
+            price = px
+            remaining -= sz
+            if remaining <= 1e-12:
+                return price, True
+        return price, False
+
+    def consume(self, is_buy: bool, size: float) -> None:
+        """Retire `size` des meilleurs niveaux (ordre envoyé sur cet instantané)"""
+        remaining = size
+        for level in (self.asks if is_buy else self.bids):
+            if remaining <= 0:
+                break
+            taken = min(level[1], remaining)
+            level[1] -= taken
+            remaining -= taken
+
+
+class L2BookCache:
+    """Instantanés l2Book par coin, partagés entre wallets pendant `max_age` secondes"""
+
+    def __init__(self, api_call: Callable[[Dict], Any], breakers: Optional[BreakerBoard] = None,
+                 max_age: float = DEFAULT_L2_MAX_AGE_SECONDS, buffer_bps: float = DEFAULT_L2_BUFFER_BPS,
+                 max_deviation_bps: float = DEFAULT_L2_MAX_DEVIATION_BPS):
+        self.api_call = api_call
+        self.breakers = breakers
+        self.max_age = max_age
+        self.buffer_bps = buffer_bps
+        self.max_deviation_bps = max_deviation_bps
+        self._snapshots: Dict[str, L2Snapshot] = {}
+        # Un verrou par coin : un seul appel l2Book à la fois pour un même coin
+        self._coin_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _coin_lock(self, coin: str) -> threading.Lock:
+        with self._lock:
+            lock = self._coin_locks.get(coin)
+            if lock is None:
+                lock = self._coin_locks[coin] = threading.Lock()
+            return lock
+
+    def snapshot(self, coin: str, dex: str = "") -> Optional[L2Snapshot]:
+        """Instantané récent du coin (récupéré si absent ou trop vieux), None si indisponible"""
+        with self._coin_lock(coin):
+            snapshot = self._snapshots.get(coin)
+            if snapshot is not None and snapshot.age <= self.max_age:
+                metrics.incr("l2_cache_hits_total")
+                return snapshot
+            breaker = self.breakers.get("l2Book", dex) if self.breakers is not None else None
+            if breaker is not None and not breaker.allow():
+                return None
+            try:
+                response = self.api_call({"type": "l2Book", "coin": coin})
+                snapshot = L2Snapshot.from_api(coin, response)
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record_failure()
+                print(f"   ⚠️  l2Book {coin} indisponible ({e}), prix limite depuis le mid")
+                return None
+            if breaker is not None:
+                breaker.record_success()
+            metrics.incr("l2_fetch_total", dex=dex or "main")
+            self._snapshots[coin] = snapshot
+            return snapshot
+
+    def limit_price(self, coin: str, is_buy: bool, size: float, mid: float, dex: str = "") -> Optional[float]:
+        """
+        Prix limite IOC depuis le carnet : niveau couvrant `size` + buffer, borné à l'écart maximum du mid.
+        La taille est retirée de l'instantané partagé. None sans instantané exploitable.
+        """
+        snapshot = self.snapshot(coin, dex)
+        if snapshot is None:
+            return None
+        with self._coin_lock(coin):
+            price, covered = snapshot.covering_price(is_buy, size)
+            if price is None:
+                return None
+            snapshot.consume(is_buy, size)
+        if not covered:
+            metrics.incr("l2_uncovered_total", dex=dex or "main")
+        buffer = self.buffer_bps / 10000
+        price = price * (1 + buffer) if is_buy else price * (1 - buffer)
+        if mid > 0:
+            bound = self.max_deviation_bps / 10000
+            price = min(price, mid * (1 + bound)) if is_buy else max(price, mid * (1 - bound))
+        return price
@@ -0,0 +1,241 @@
+"""
+Hyperliquid Rebalancer V2 - Pipeline de signature et d'envoi des ordres
+==================================================
+Quand un mouvement de marché déclenche de nombreux ordres sur plusieurs wallets, signer
+(eth_account) puis poster chaque ordre l'un après l'autre dans la boucle principale
+retarde les derniers ordres de plusieurs secondes. Le pipeline :
+
+1. construit l'action d'ordre et attribue le nonce dans le thread appelant
+   (nonces strictement croissants par signataire, dans l'ordre des décisions)
+2. signe les actions dans un pool de processus (en parallèle entre wallets)
+3. poste les actions signées en parallèle sur une requests.Session à connexions poolées ;
+   les ordres d'un même signataire sont postés dans l'ordre de leurs nonces (une file par signataire)
+
+Chaque ticket mesure la latence décision -> acquittement (réponse de /exchange).
+Les callbacks de fin d'ordre sont exécutés dans le thread appelant, lors de `drain()`.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable, Deque, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from order_specs import OrderSpec
+from fills import OrderFill, order_error, parse_order_fill
+from metrics import metrics
+from order_tracker import is_ambiguous_error
+
+try:
+    from hyperliquid.utils.constants import MAINNET_API_URL
+    from hyperliquid.utils.signing import order_request_to_order_wire, order_wires_to_order_action, sign_l1_action
+    from hyperliquid.utils.types import Cloid
+    from eth_account import Account
+except ImportError:
+    print("❌ Erreur: Les dépendances 'hyperliquid-python-sdk' et 'eth-account' ne sont pas installées.")
+    print("   Veuillez exécuter : pip install hyperliquid-python-sdk eth-account")
+    exit(1)
+
+DEFAULT_SIGN_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_POST_WORKERS = 8
+
+# =============================================================================
+# SIGNATURE (processus workers)
+# =============================================================================
+
+# Comptes déjà dérivés dans le processus worker (clé privée -> LocalAccount)
+_worker_accounts: Dict[str, Any] = {}
+
+
+def sign_order_action(private_key: str, action: Dict[str, Any], vault_address: Optional[str],
+                      nonce: int, is_mainnet: bool) -> Dict[str, Any]:
+    """Signe une action L1 (exécuté dans un processus du pool)"""
+    account = _worker_accounts.get(private_key)
+    if account is None:
+        account = Account.from_key(private_key)
+        _worker_accounts[private_key] = account
+    return sign_l1_action(account, action, vault_address, nonce, None, is_mainnet)
+
+# =============================================================================
+# TICKETS
+# =============================================================================
+
+class OrderTicket:
+    """Un ordre IOC dans le pipeline, avec ses horodatages (perf_counter)"""
+
+    def __init__(self, wallet_id: int, spec: OrderSpec, is_buy: bool, size: float, limit_px: float,
+                 on_done: Optional[Callable[["OrderTicket"], None]] = None, cloid: Optional[Cloid] = None):
+        self.wallet_id = wallet_id
+        self.spec = spec
+        self.is_buy = is_buy
+        self.size = size
+        self.limit_px = limit_px
+        self.on_done = on_done
+        self.cloid = cloid
+        self.nonce = 0
+        self.decided_at = time.perf_counter()
+        self.signed_at = 0.0
+        self.acked_at = 0.0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.fill: Optional[OrderFill] = None
+        # True si l'envoi a échoué sans réponse exploitable (l'ordre a pu être exécuté)
+        self.ambiguous = False
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and self.acked_at > 0
+
+    @property
+    def ack_ms(self) -> float:
+        """Latence décision -> acquittement (ms)"""
+        return (self.acked_at - self.decided_at) * 1000 if self.acked_at else 0.0
+
+    @property
+    def sign_ms(self) -> float:
+        return (self.signed_at - self.decided_at) * 1000 if self.signed_at else 0.0
+
+    def action(self) -> Dict[str, Any]:
+        order = {
+            "coin": self.spec.coin,
+            "is_buy": self.is_buy,
+            "sz": self.size,
+            "limit_px": self.limit_px,
+            "order_type": {"limit": {"tif": "Ioc"}},
+            "reduce_only": False,
+        }
+        if self.cloid is not None:
+            order["cloid"] = self.cloid
+        return order_wires_to_order_action([order_request_to_order_wire(order, self.spec.asset_id)])
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+class OrderPipeline:
+    """Signature parallèle (processus) et envoi concurrent (threads), ordonné par signataire"""
+
+    def __init__(self, base_url: str = MAINNET_API_URL, sign_workers: int = DEFAULT_SIGN_WORKERS,
+                 post_workers: int = DEFAULT_POST_WORKERS, timeout: float = 10):
+        self.base_url = base_url
+        self.is_mainnet = base_url == MAINNET_API_URL
+        self.timeout = timeout
+        # sign_workers = 0 : signature dans le thread d'envoi (pas de processus)
+        self._signer = ProcessPoolExecutor(sign_workers) if sign_workers > 0 else None
+        self._poster = ThreadPoolExecutor(post_workers, thread_name_prefix="order-post")
+        self._session = requests.Session()
+        self._session.headers.update({"Content-Type": "application/json"})
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=post_workers))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=post_workers))
+
+        self._lock = threading.Lock()
+        self._last_nonce: Dict[str, int] = {}
+        # signataire -> file de (ticket, action, signature future, clé, vault) ; un seul thread d'envoi actif par file
+        self._lanes: Dict[str, Deque[Tuple[OrderTicket, Dict[str, Any], Optional[Future], str, Optional[str]]]] = {}
+        self._active_lanes: set = set()
+        self._in_flight: List[OrderTicket] = []
+        self._done: List[OrderTicket] = []
+        self._done_cond = threading.Condition(self._lock)
+
+    def _next_nonce(self, signer: str) -> int:
+        """Nonce (ms) strictement croissant par signataire"""
+        now = int(time.time() * 1000)
+        nonce = max(now, self._last_nonce.get(signer, 0) + 1)
+        self._last_nonce[signer] = nonce
+        return nonce
+
+    def submit(self, ticket: OrderTicket, private_key: str, vault_address: Optional[str] = None) -> OrderTicket:
+        """Met un ordre dans le pipeline (non bloquant)"""
+        action = ticket.action()
+        with self._lock:
+            ticket.nonce = self._next_nonce(private_key)
+            signature = None
+            if self._signer is not None:
+                signature = self._signer.submit(sign_order_action, private_key, action, vault_address,
+                                                ticket.nonce, self.is_mainnet)
+            lane = self._lanes.setdefault(private_key, deque())
+            lane.append((ticket, action, signature, private_key, vault_address))
+            self._in_flight.append(ticket)
+            start_lane = private_key not in self._active_lanes
+            if start_lane:
+                self._active_lanes.add(private_key)
+        if start_lane:
+            self._poster.submit(self._run_lane, private_key)
+        metrics.incr("orders_submitted_total", wallet=ticket.wallet_id)
+        return ticket
+
+    def _run_lane(self, signer: str) -> None:
+        """Poste les ordres d'un signataire dans l'ordre des nonces"""
+        while True:
+            with self._lock:
+                lane = self._lanes.get(signer)
+                if not lane:
+                    self._active_lanes.discard(signer)
+                    return
+                ticket, action, signature, private_key, vault_address = lane.popleft()
+            try:
+                if signature is None:
+                    signed = sign_order_action(private_key, action, vault_address, ticket.nonce, self.is_mainnet)
+                else:
+                    signed = signature.result()
+                ticket.signed_at = time.perf_counter()
+                response = self._session.post(f"{self.base_url}/exchange", json={
+                    "action": action,
+                    "nonce": ticket.nonce,
+                    "signature": signed,
+                    "vaultAddress": vault_address,
+                    "expiresAfter": None,
+                }, timeout=self.timeout)
+                ticket.acked_at = time.perf_counter()
+                response.raise_for_status()
+                ticket.result = response.json()
+                ticket.error = order_error(ticket.result)
+                if ticket.error is None:
+                    ticket.fill = parse_order_fill(ticket.result, ticket.spec.coin, ticket.is_buy)
+            except Exception as e:
+                ticket.error = str(e)
+                ticket.ambiguous = is_ambiguous_error(e)
+            with self._done_cond:
+                self._done.append(ticket)
+                self._done_cond.notify_all()
+
+    def pending(self) -> int:
+        """Nombre d'ordres soumis dont le résultat n'a pas encore été drainé"""
+        with self._lock:
+            return len(self._in_flight)
+
+    def drain(self, timeout: Optional[float] = None) -> List[OrderTicket]:
+        """
+        Attend la fin de tous les ordres en cours, exécute leurs callbacks (dans le thread appelant)
+        et retourne les tickets terminés, dans l'ordre de soumission.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._done_cond:
+            while len(self._done) < len(self._in_flight):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._done_cond.wait(remaining)
+            done_ids = {id(t) for t in self._done}
+            finished = [t for t in self._in_flight if id(t) in done_ids]
+            self._in_flight = [t for t in self._in_flight if id(t) not in done_ids]
+            self._done = []
+
+        for ticket in finished:
+            status = "ok" if ticket.success else ("ambiguous" if ticket.ambiguous else "error")
+            metrics.incr("orders_total", wallet=ticket.wallet_id, status=status)
+            if ticket.acked_at:
+                metrics.set("order_ack_ms", ticket.ack_ms, wallet=ticket.wallet_id, coin=ticket.spec.coin)
+            if ticket.on_done is not None:
+                ticket.on_done(ticket)
+        return finished
+
+    def close(self) -> None:
+        self._poster.shutdown(wait=True)
+        if self._signer is not None:
+            self._signer.shutdown(wait=True)
+        self._session.close()
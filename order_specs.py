@@ -0,0 +1,89 @@
+"""
+Hyperliquid Rebalancer V2 - Spécifications d'ordres précompilées
+==================================================
+Pour chaque actif, une OrderSpec immuable contient tout ce dont place_order a besoin :
+asset id, quantum de taille, quantum de prix (Decimal exact), quote asset
+et le nom de coin final à envoyer au SDK.
+
+Les specs sont compilées au démarrage et à chaque rafraîchissement des métadonnées
+(création d'un Exchange). Le chemin par ordre se limite ensuite à une lecture de dict
+et à deux `Decimal.quantize`, sans log10/floor ni recherche dans les métadonnées.
+
+Règles de prix Hyperliquid : 5 chiffres significatifs maximum (les prix entiers sont
+toujours valides) et au plus 6 décimales (perps) / 8 décimales (spot) moins szDecimals.
+"""
+
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Dict, Any, NamedTuple, Callable
+
+PERP_MAX_DECIMALS = 6
+SPOT_MAX_DECIMALS = 8
+MAX_SIG_FIGS = 5
+
+# Asset ids spot : 10000 + index de la paire ; HIP-3 : à partir de 110000
+SPOT_ASSET_OFFSET = 10000
+HIP3_ASSET_OFFSET = 110000
+
+_ONE = Decimal(1)
+
+
+class OrderSpec(NamedTuple):
+    """Spécification d'ordre immuable pour un actif"""
+    coin: str               # Nom envoyé au SDK ("BTC", "flx:TSLA", "@107", "PURR/USDC")
+    asset_id: int           # -1 si inconnu du SDK (spec construite depuis la config)
+    sz_decimals: int
+    size_quantum: Decimal   # 10^-szDecimals
+    tick_quantum: Decimal   # 10^-(max_decimals - szDecimals)
+    quote_asset: str
+    is_spot: bool
+
+    @classmethod
+    def build(cls, coin: str, asset_id: int, sz_decimals: int, is_spot: bool, quote_asset: str) -> "OrderSpec":
+        max_decimals = SPOT_MAX_DECIMALS if is_spot else PERP_MAX_DECIMALS
+        px_decimals = max(max_decimals - sz_decimals, 0)
+        return cls(coin, asset_id, sz_decimals, _ONE.scaleb(-sz_decimals), _ONE.scaleb(-px_decimals),
+                   quote_asset, is_spot)
+
+    def quantize_size(self, size: float) -> float:
+        """Arrondit la taille au pas de szDecimals"""
+        return float(Decimal(repr(size)).quantize(self.size_quantum, rounding=ROUND_HALF_EVEN))
+
+    def quantize_price(self, price: float) -> float:
+        """Arrondit le prix à 5 chiffres significatifs et au tick du marché"""
+        if price <= 0:
+            return price
+        px = Decimal(repr(price))
+        # Quantum des 5 chiffres significatifs (exposant exact, sans log10)
+        sig_quantum = _ONE.scaleb(px.adjusted() - (MAX_SIG_FIGS - 1))
+        # Les prix entiers sont toujours acceptés
+        if sig_quantum > _ONE:
+            sig_quantum = _ONE
+        quantum = sig_quantum if sig_quantum > self.tick_quantum else self.tick_quantum
+        return float(px.quantize(quantum, rounding=ROUND_HALF_EVEN))
+
+
+def compile_order_specs(info: Any, spot_meta: Dict[str, Any],
+                        quote_for_dex: Callable[[str], str]) -> Dict[str, OrderSpec]:
+    """
+    Compile les specs de tous les actifs connus d'un `hyperliquid.info.Info`.
+    Les paires spot sont indexées par leur nom SDK et par "@pair_index".
+    """
+    token_names = {t["index"]: t["name"] for t in spot_meta.get("tokens", [])}
+    spot_pairs = {p["name"]: p for p in spot_meta.get("universe", [])}
+
+    specs: Dict[str, OrderSpec] = {}
+    for coin, asset_id in info.coin_to_asset.items():
+        sz_decimals = info.asset_to_sz_decimals.get(asset_id, 0)
+        is_spot = SPOT_ASSET_OFFSET <= asset_id < HIP3_ASSET_OFFSET
+        if is_spot:
+            pair = spot_pairs.get(coin, {})
+            tokens = pair.get("tokens", [])
+            quote = token_names.get(tokens[1], "USDC") if len(tokens) > 1 else "USDC"
+            spec = OrderSpec.build(coin, asset_id, sz_decimals, True, quote)
+            specs[coin] = spec
+            specs[f"@{asset_id - SPOT_ASSET_OFFSET}"] = spec
+        else:
+            dex = coin.split(":", 1)[0] if ":" in coin else ""
+            quote = quote_for_dex(dex) if dex else "USDC"
+            specs[coin] = OrderSpec.build(coin, asset_id, sz_decimals, False, quote)
+    return specs
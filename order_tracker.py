@@ -0,0 +1,357 @@
+"""
+Hyperliquid Rebalancer V2 - Ordres idempotents (cloid et ordres en vol)
+==================================================
+Un timeout ou une coupure pendant l'envoi d'un ordre laisse son résultat inconnu :
+l'ordre a pu être exécuté sans que la réponse nous parvienne. Renvoyer un nouvel ordre
+à l'aveugle risque alors de doubler la position. Pour l'éviter :
+
+- chaque ordre reçoit un cloid déterministe, dérivé de (adresse, actif, sens, créneau, tentative),
+  le créneau étant la fenêtre de cooldown courante ;
+- les ordres envoyés sont suivis dans une table des ordres en vol, persistée sur disque
+  (inflight_orders.json, réécrit atomiquement) pour survivre à un redémarrage ;
+- un résultat ambigu (timeout, erreur réseau, 5xx) bloque tout nouvel ordre sur l'actif
+  jusqu'à sa résolution par une requête orderStatus sur le cloid :
+    * rempli (même partiellement) : l'ordre compte comme exécuté (cooldown) ;
+    * annulé / rejeté sans exécution : un nouvel ordre (tentative suivante, nouveau cloid) est permis ;
+    * cloid inconnu après UNKNOWN_OID_GRACE_SECONDS : l'ordre n'a jamais atteint l'exchange.
+
+Le même fichier garde les règlements de compensation (--netting transfer) en cours : deux spotSend
+successifs (tokens du vendeur, puis quote de l'acheteur). Chaque étape est écrite avant l'envoi ;
+une quote restée due est renvoyée aux cycles suivants, un envoi sans réponse est à vérifier à la main.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+import requests
+
+try:
+    from hyperliquid.utils.types import Cloid
+    from hyperliquid.utils.error import ServerError
+except ImportError:
+    print("❌ Erreur: La dépendance 'hyperliquid-python-sdk' n'est pas installée.")
+    print("   Veuillez exécuter : pip install hyperliquid-python-sdk")
+    exit(1)
+
+INFLIGHT_FILE = "inflight_orders.json"
+
+# Délai après lequel un cloid inconnu de l'exchange est considéré comme jamais reçu
+UNKNOWN_OID_GRACE_SECONDS = 30
+
+# Durée de conservation des compteurs de tentatives (créneaux passés)
+ATTEMPTS_TTL_SECONDS = 86400
+
+# États d'un ordre en vol
+PENDING = "pending"        # envoyé, réponse attendue
+AMBIGUOUS = "ambiguous"    # pas de réponse exploitable : à vérifier via orderStatus
+
+# Résolutions
+FILLED = "filled"
+NOT_FILLED = "not_filled"
+
+# États d'un règlement de compensation (étape écrite sur disque avant chaque envoi)
+SETTLE_TOKENS_SENT = "tokens_sent"  # transfert des tokens envoyé, résultat inconnu
+SETTLE_QUOTE_DUE = "quote_due"      # tokens transférés, quote à régler (renvoyée au cycle suivant)
+SETTLE_QUOTE_SENT = "quote_sent"    # règlement de la quote envoyé, résultat inconnu
+
+# Statuts orderStatus d'un ordre encore actif (jamais le cas d'un IOC, sauf délai de propagation)
+_LIVE_STATUSES = ("open", "triggered")
+
+
+class OrderAmbiguousError(Exception):
+    """Envoi d'un ordre sans réponse exploitable : il a peut-être été exécuté"""
+
+
+def is_ambiguous_error(error: BaseException) -> bool:
+    """
+    True si l'erreur laisse le résultat de l'ordre inconnu (timeout, connexion coupée, 5xx).
+    Les erreurs 4xx et les erreurs levées avant l'envoi sont des échecs certains.
+    """
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError, ServerError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+def make_cloid(address: str, asset: str, is_buy: bool, slot: int, attempt: int) -> Cloid:
+    """Cloid déterministe (16 octets) d'une décision d'ordre"""
+    key = f"{address.lower()}|{asset}|{'B' if is_buy else 'A'}|{slot}|{attempt}"
+    return Cloid("0x" + hashlib.sha256(key.encode()).hexdigest()[:32])
+
+
+def classify_order_status(response: Any, age_seconds: float) -> Tuple[Optional[str], float]:
+    """
+    Interprète une réponse orderStatus : (FILLED | NOT_FILLED | None si encore indéterminé, taille remplie).
+
+        {"status": "order", "order": {"order": {"origSz": "0.02", "sz": "0.0", ...}, "status": "filled"}}
+        {"status": "unknownOid"}
+    """
+    if not isinstance(response, dict):
+        return None, 0.0
+    if response.get("status") == "unknownOid":
+        return (NOT_FILLED if age_seconds >= UNKNOWN_OID_GRACE_SECONDS else None), 0.0
+    entry = response.get("order")
+    if not isinstance(entry, dict):
+        return None, 0.0
+    order = entry.get("order", {})
+    try:
+        filled = float(order.get("origSz", 0)) - float(order.get("sz", 0))
+    except (TypeError, ValueError):
+        filled = 0.0
+    status = entry.get("status")
+    if status == "filled" or filled > 0:
+        return FILLED, max(filled, 0.0)
+    if status in _LIVE_STATUSES:
+        return None, 0.0
+    return NOT_FILLED, 0.0
+
+
+class InFlightOrder:
+    """Ordre envoyé dont le résultat n'est pas encore connu"""
+
+    __slots__ = ("cloid", "wallet_id", "asset", "coin", "is_buy", "size", "sent_at", "state")
+
+    def __init__(self, cloid: str, wallet_id: int, asset: str, coin: str, is_buy: bool, size: float,
+                 sent_at: float, state: str = PENDING):
+        self.cloid = cloid
+        self.wallet_id = wallet_id
+        self.asset = asset
+        self.coin = coin
+        self.is_buy = is_buy
+        self.size = size
+        self.sent_at = sent_at
+        self.state = state
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.sent_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {s: getattr(self, s) for s in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InFlightOrder":
+        return cls(**{s: data[s] for s in cls.__slots__})
+
+    def __repr__(self) -> str:
+        side = "BUY" if self.is_buy else "SELL"
+        return f"InFlightOrder({self.cloid}, wallet={self.wallet_id}, {side} {self.size:g} {self.coin}, {self.state})"
+
+
+class PendingSettlement:
+    """Règlement de compensation entre deux wallets (spot) dont les deux transferts ne sont pas confirmés"""
+
+    __slots__ = ("settlement_id", "seller_id", "buyer_id", "seller_address", "buyer_address",
+                 "token", "quote_asset", "size", "amount", "created_at", "state")
+
+    def __init__(self, settlement_id: str, seller_id: int, buyer_id: int, seller_address: str, buyer_address: str,
+                 token: str, quote_asset: str, size: float, amount: float, created_at: float,
+                 state: str = SETTLE_TOKENS_SENT):
+        self.settlement_id = settlement_id
+        self.seller_id = seller_id
+        self.buyer_id = buyer_id
+        self.seller_address = seller_address
+        self.buyer_address = buyer_address
+        self.token = token
+        self.quote_asset = quote_asset
+        self.size = size
+        self.amount = amount
+        self.created_at = created_at
+        self.state = state
+
+    @property
+    def needs_review(self) -> bool:
+        """Un transfert est parti sans réponse : son effet doit être vérifié avant tout renvoi"""
+        return self.state != SETTLE_QUOTE_DUE
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {s: getattr(self, s) for s in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PendingSettlement":
+        return cls(**{s: data[s] for s in cls.__slots__})
+
+    def __repr__(self) -> str:
+        return (f"PendingSettlement(W{self.seller_id}→W{self.buyer_id} {self.size:g} {self.token} "
+                f"contre {self.amount:.2f} {self.quote_asset}, {self.state})")
+
+
+class InFlightTable:
+    """
+    Ordres en vol de tous les wallets (par cloid), compteurs de tentatives par décision et
+    règlements de compensation en cours, persistés sur disque à chaque changement (cache_file=None : en mémoire uniquement).
+
+    L'écriture se fait hors du verrou de la table (fichier temporaire puis os.replace) et est
+    partagée : un appel dont le changement a déjà été écrit par un autre thread n'écrit pas.
+    Chaque begin() retourne une fois son ordre sur disque, avant l'envoi.
+    """
+
+    def __init__(self, cache_file: Optional[str] = INFLIGHT_FILE):
+        self.cache_file = cache_file
+        self._orders: Dict[str, InFlightOrder] = {}
+        # "wallet|actif|sens|créneau" -> nombre de cloids déjà attribués
+        self._attempts: Dict[str, int] = {}
+        self._settlements: Dict[str, PendingSettlement] = {}
+        self._lock = threading.Lock()
+        # Versions de l'état : modifiée (sous _lock) et écrite sur disque (sous _write_lock)
+        self._version = 0
+        self._written = 0
+        self._write_lock = threading.Lock()
+        self._load_disk_cache()
+
+    # -------------------------------------------------------------------------
+    # Cache disque
+    # -------------------------------------------------------------------------
+
+    def _load_disk_cache(self) -> None:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+            self._orders = {o["cloid"]: InFlightOrder.from_dict(o) for o in data.get("orders", [])}
+            self._attempts = {k: int(v) for k, v in data.get("attempts", {}).items()}
+            self._settlements = {p["settlement_id"]: PendingSettlement.from_dict(p)
+                                 for p in data.get("settlements", [])}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Fichier illisible : conservé à part pour vérification manuelle, jamais écrasé
+            backup = f"{self.cache_file}.corrupt-{int(time.time())}"
+            print(f"⚠️  {self.cache_file} illisible ({e}) : ordres en vol inconnus, copie dans {backup}")
+            try:
+                os.replace(self.cache_file, backup)
+            except OSError:
+                pass
+
+    def _changed(self) -> int:
+        """Marque l'état comme modifié (appelé sous _lock) ; retourne la version à écrire"""
+        self._version += 1
+        return self._version
+
+    def _flush(self, version: int) -> None:
+        """Écrit l'état sur disque s'il n'a pas déjà été écrit jusqu'à `version` (hors _lock)"""
+        if not self.cache_file:
+            return
+        with self._write_lock:
+            if self._written >= version:
+                return
+            with self._lock:
+                current = self._version
+                data = {
+                    "orders": [o.to_dict() for o in self._orders.values()],
+                    "attempts": dict(self._attempts),
+                    "settlements": [p.to_dict() for p in self._settlements.values()],
+                }
+            tmp = f"{self.cache_file}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.cache_file)
+                self._written = current
+            except OSError as e:
+                print(f"⚠️  Écriture de {self.cache_file} impossible: {e}")
+
+    # -------------------------------------------------------------------------
+    # Cycle de vie
+    # -------------------------------------------------------------------------
+
+    def begin(self, wallet_id: int, address: str, asset: str, coin: str, is_buy: bool, size: float,
+              slot_seconds: float) -> Cloid:
+        """Attribue le cloid de la décision (tentative suivante du créneau) et enregistre l'ordre en vol"""
+        now = time.time()
+        slot = int(now // max(slot_seconds, 1))
+        key = f"{wallet_id}|{asset}|{'B' if is_buy else 'A'}|{slot}"
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+            if len(self._attempts) > 1000:
+                oldest = int((now - ATTEMPTS_TTL_SECONDS) // max(slot_seconds, 1))
+                self._attempts = {k: v for k, v in self._attempts.items() if int(k.rsplit("|", 1)[1]) >= oldest}
+            cloid = make_cloid(address, asset, is_buy, slot, attempt)
+            self._orders[cloid.to_raw()] = InFlightOrder(cloid.to_raw(), wallet_id, asset, coin, is_buy, size, now)
+            version = self._changed()
+        self._flush(version)
+        return cloid
+
+    def settle(self, cloid: Cloid) -> None:
+        """Résultat connu (acquittement ou résolution) : l'ordre quitte la table"""
+        with self._lock:
+            if self._orders.pop(cloid.to_raw(), None) is None:
+                return
+            version = self._changed()
+        self._flush(version)
+
+    def mark_ambiguous(self, cloid: Cloid) -> None:
+        with self._lock:
+            order = self._orders.get(cloid.to_raw())
+            if order is None or order.state == AMBIGUOUS:
+                return
+            order.state = AMBIGUOUS
+            version = self._changed()
+        self._flush(version)
+
+    def begin_settlement(self, seller_id: int, buyer_id: int, seller_address: str, buyer_address: str,
+                         token: str, quote_asset: str, size: float, amount: float) -> PendingSettlement:
+        """Enregistre un règlement avant l'envoi du transfert des tokens (état SETTLE_TOKENS_SENT)"""
+        now = time.time()
+        settlement_id = hashlib.sha256(
+            f"{seller_address.lower()}|{buyer_address.lower()}|{token}|{now}".encode()
+        ).hexdigest()[:16]
+        pending = PendingSettlement(settlement_id, seller_id, buyer_id, seller_address, buyer_address,
+                                    token, quote_asset, size, amount, now)
+        with self._lock:
+            self._settlements[settlement_id] = pending
+            version = self._changed()
+        self._flush(version)
+        return pending
+
+    def update_settlement(self, pending: PendingSettlement, state: str) -> None:
+        """Nouvelle étape d'un règlement, sur disque avant l'envoi correspondant"""
+        with self._lock:
+            if pending.state == state:
+                return
+            pending.state = state
+            version = self._changed()
+        self._flush(version)
+
+    def end_settlement(self, pending: PendingSettlement) -> None:
+        """Règlement terminé (ou transfert des tokens refusé) : il quitte la table"""
+        with self._lock:
+            if self._settlements.pop(pending.settlement_id, None) is None:
+                return
+            version = self._changed()
+        self._flush(version)
+
+    # -------------------------------------------------------------------------
+    # Lecture
+    # -------------------------------------------------------------------------
+
+    def blocking(self, wallet_id: int, asset: str) -> Optional[InFlightOrder]:
+        """Ordre ambigu qui interdit un nouvel ordre sur cet actif, None sinon"""
+        with self._lock:
+            for order in self._orders.values():
+                if order.wallet_id == wallet_id and order.asset == asset and order.state == AMBIGUOUS:
+                    return order
+        return None
+
+    def unresolved(self, wallet_id: int) -> List[InFlightOrder]:
+        """
+        Ordres du wallet à vérifier via orderStatus : ambigus, ou restés en attente
+        d'un run précédent (arrêt entre l'envoi et la réponse).
+        """
+        with self._lock:
+            return [o for o in self._orders.values() if o.wallet_id == wallet_id]
+
+    def settlements(self) -> List[PendingSettlement]:
+        """Règlements de compensation en cours (quote due ou transfert à vérifier)"""
+        with self._lock:
+            return list(self._settlements.values())
+
+    def __len__(self) -> int:
+        return len(self._orders)
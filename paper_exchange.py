@@ -0,0 +1,191 @@
+"""
+Hyperliquid Rebalancer V2 - Exchange simulé (paper trading)
+==================================================
+En dry-run simple, les ordres ne changent rien : impossible d'observer sur plusieurs cycles
+les cooldowns, la convergence vers hold_usd ou l'épuisement de la balance de quote.
+Le PaperExchange tient des balances et positions virtuelles par wallet et exécute les ordres
+IOC contre le mid du cycle :
+
+- prix d'exécution = mid ± (slippage fixe + impact proportionnel au notionnel), en bps ;
+- l'IOC n'est pas exécuté si ce prix dépasse le prix limite ;
+- frais (fee_pct de l'actif) prélevés sur la quote ;
+- rejet si la quote (achat, marge perp à x1) ou le token (vente spot) est insuffisant.
+
+Les comptes sont initialisés depuis l'état réel du premier cycle, ou depuis un capital
+fixe en quote (aucun état utilisateur récupéré). Tout est en mémoire : une simple table
+de dicts par wallet, ce qui permet de simuler toute la flotte dans un seul processus.
+"""
+
+from typing import Dict, Optional, Tuple, Iterable
+
+from market_state import PerpPosition
+from fills import OrderFill
+
+DEFAULT_SLIPPAGE_BPS = 5.0
+DEFAULT_IMPACT_BPS_PER_1K = 0.0
+
+
+class PaperAccount:
+    """Balances et positions virtuelles d'un wallet, avec les totaux de la simulation"""
+
+    __slots__ = ("balances", "positions", "orders", "rejected", "volume", "fees", "next_oid")
+
+    def __init__(self, balances: Dict[str, float], positions: Iterable[PerpPosition]):
+        self.balances: Dict[str, float] = dict(balances)
+        self.positions: Dict[Tuple[str, str], PerpPosition] = {}
+        for pos in positions:
+            if pos.coin:
+                self.positions[(pos.dex, pos.coin)] = PerpPosition(
+                    pos.dex, pos.coin, pos.szi, pos.entry_px, pos.unrealized_pnl, pos.mark_px
+                )
+        self.orders = 0
+        self.rejected = 0
+        self.volume = 0.0
+        self.fees = 0.0
+        self.next_oid = 1
+
+    def view(self) -> Tuple[Dict[str, float], Dict[Tuple[str, str], PerpPosition]]:
+        """Copie de l'état (vue locale d'un cycle, modifiable sans toucher au compte)"""
+        positions = {
+            key: PerpPosition(p.dex, p.coin, p.szi, p.entry_px, p.unrealized_pnl, p.mark_px)
+            for key, p in self.positions.items()
+        }
+        return dict(self.balances), positions
+
+
+class PaperExchange:
+    """Comptes virtuels de tous les wallets et modèle d'exécution IOC"""
+
+    def __init__(self, slippage_bps: float = DEFAULT_SLIPPAGE_BPS,
+                 impact_bps_per_1k: float = DEFAULT_IMPACT_BPS_PER_1K,
+                 start_cash: Optional[float] = None, cash_asset: str = "USDC"):
+        self.slippage_bps = slippage_bps
+        self.impact_bps_per_1k = impact_bps_per_1k
+        # Capital de départ fixe (sinon, état réel du premier cycle)
+        self.start_cash = start_cash
+        self.cash_asset = cash_asset
+        self._accounts: Dict[int, PaperAccount] = {}
+
+    # -------------------------------------------------------------------------
+    # Comptes
+    # -------------------------------------------------------------------------
+
+    def account(self, wallet_id: int) -> Optional[PaperAccount]:
+        """Compte virtuel du wallet ; créé depuis le capital de départ s'il est configuré"""
+        account = self._accounts.get(wallet_id)
+        if account is None and self.start_cash is not None:
+            account = self.seed(wallet_id, {self.cash_asset: self.start_cash}, [])
+        return account
+
+    def seed(self, wallet_id: int, balances: Dict[str, float], positions: Iterable[PerpPosition]) -> PaperAccount:
+        """Initialise le compte virtuel depuis un état (réel ou synthétique)"""
+        account = PaperAccount(balances, positions)
+        self._accounts[wallet_id] = account
+        return account
+
+    def refresh_marks(self, wallet_id: int, mids: Dict[str, float]) -> None:
+        """Met à jour mark et PnL non réalisé des positions virtuelles avec les prix du cycle"""
+        account = self._accounts.get(wallet_id)
+        if account is None:
+            return
+        for pos in account.positions.values():
+            mark = mids.get(pos.coin, 0.0)
+            if mark > 0:
+                pos.mark_px = mark
+                pos.unrealized_pnl = pos.szi * (mark - pos.entry_px)
+
+    # -------------------------------------------------------------------------
+    # Exécution
+    # -------------------------------------------------------------------------
+
+    def fill_price(self, mid: float, is_buy: bool, notional: float) -> float:
+        bps = self.slippage_bps + self.impact_bps_per_1k * notional / 1000
+        return mid * (1 + bps / 10000) if is_buy else mid * (1 - bps / 10000)
+
+    def execute(self, wallet_id: int, coin: str, is_buy: bool, size: float, mid: float, limit_px: float,
+                fee_pct: float, quote_asset: str, base_asset: Optional[str] = None,
+                position_key: Optional[Tuple[str, str]] = None) -> Tuple[bool, str, Optional[OrderFill]]:
+        """
+        Exécute un ordre IOC sur le compte virtuel.
+        Spot : base_asset = token de la balance ; perp : position_key = (dex ou "main", coin).
+        Retourne (success, message, exécution) comme place_order.
+        """
+        account = self._accounts.get(wallet_id)
+        if account is None:
+            return False, "❌ [PAPER] Compte virtuel non initialisé", None
+        action = "BUY" if is_buy else "SELL"
+        if size <= 0 or mid <= 0:
+            account.rejected += 1
+            return False, f"❌ [PAPER] Taille ou prix invalide ({size:g} @ ${mid:g})", None
+
+        price = self.fill_price(mid, is_buy, size * mid)
+        if (is_buy and price > limit_px) or (not is_buy and price < limit_px):
+            account.rejected += 1
+            return False, f"⚪ [PAPER] IOC non exécuté: ${price:g} au-delà de la limite ${limit_px:g}", None
+
+        notional = size * price
+        fee = notional * fee_pct / 100
+        balances = account.balances
+        quote = balances.get(quote_asset, 0.0)
+
+        if base_asset is not None:
+            if is_buy and quote < notional + fee:
+                account.rejected += 1
+                return False, f"❌ [PAPER] {quote_asset} insuffisant (${quote:.2f} < ${notional + fee:.2f})", None
+            if not is_buy and balances.get(base_asset, 0.0) < size:
+                account.rejected += 1
+                return False, f"❌ [PAPER] {base_asset} insuffisant ({balances.get(base_asset, 0.0):g} < {size:g})", None
+            signed = size if is_buy else -size
+            balances[base_asset] = balances.get(base_asset, 0.0) + signed
+            balances[quote_asset] = quote - signed * price - fee
+        else:
+            key = position_key or ("main", coin)
+            pos = account.positions.get(key)
+            old_szi = pos.szi if pos is not None else 0.0
+            new_szi = old_szi + (size if is_buy else -size)
+            margin_delta = (abs(new_szi) - abs(old_szi)) * price
+            if margin_delta > 0 and quote < margin_delta + fee:
+                account.rejected += 1
+                return False, f"❌ [PAPER] Marge {quote_asset} insuffisante (${quote:.2f} < ${margin_delta + fee:.2f})", None
+            if pos is None:
+                pos = PerpPosition(key[0], key[1], 0.0, 0.0, 0.0)
+                account.positions[key] = pos
+            # Levier x1 : la marge engagée suit le notionnel (la marge libérée au prix d'exécution inclut le PnL)
+            pos.apply_fill(size if is_buy else -size, price)
+            balances[quote_asset] = quote - margin_delta - fee
+
+        account.orders += 1
+        account.volume += notional
+        account.fees += fee
+        oid = account.next_oid
+        account.next_oid += 1
+        msg = f"✅ [PAPER] {action} {size:g} {coin} @ ${price:g} (frais ${fee:.4f})"
+        return True, msg, OrderFill(coin, is_buy, size, price, oid)
+
+    def transfer(self, from_wallet: int, to_wallet: int, asset: str, amount: float) -> Tuple[bool, str]:
+        """Transfert spot interne entre deux comptes virtuels (sans frais)"""
+        source = self._accounts.get(from_wallet)
+        destination = self._accounts.get(to_wallet)
+        if source is None or destination is None:
+            return False, "❌ [PAPER] Compte virtuel non initialisé"
+        available = source.balances.get(asset, 0.0)
+        if available < amount:
+            return False, f"❌ [PAPER] {asset} insuffisant ({available:g} < {amount:g})"
+        source.balances[asset] = available - amount
+        destination.balances[asset] = destination.balances.get(asset, 0.0) + amount
+        return True, f"✅ [PAPER] {amount:g} {asset} transféré(s)"
+
+    # -------------------------------------------------------------------------
+    # Résumé
+    # -------------------------------------------------------------------------
+
+    def totals(self) -> Dict[str, float]:
+        """Totaux de la simulation, tous wallets confondus"""
+        accounts = self._accounts.values()
+        return {
+            "wallets": len(self._accounts),
+            "orders": sum(a.orders for a in accounts),
+            "rejected": sum(a.rejected for a in accounts),
+            "volume": sum(a.volume for a in accounts),
+            "fees": sum(a.fees for a in accounts),
+        }
@@ -0,0 +1,186 @@
+"""
+Hyperliquid Rebalancer V2 - Cache de positions alimenté par le flux d'exécutions
+==================================================
+Récupérer clearinghouseState sur chaque DEX (et spotClearinghouseState) à chaque cycle
+est le coût principal par wallet, alors que positions et balances ne changent qu'avec
+nos ordres, une liquidation ou un mouvement de fonds. Le cache :
+
+- part d'un état complet (réconciliation) ;
+- applique ensuite les exécutions de userFillsByTime depuis la dernière vue
+  (les exécutions de nos propres ordres, déjà appliquées à l'acquittement, sont ignorées par oid) ;
+- demande une nouvelle réconciliation :
+    * périodiquement (settings.position_reconcile_seconds),
+    * en cas de dérive (startPosition d'une exécution perp différent du szi en cache),
+    * si le ledger signale un mouvement de fonds (dépôt, retrait, transfert...),
+    * si le flux est incomplet (limite de réponse atteinte, coin inconnu) ou indisponible.
+
+Le funding n'apparaît pas dans les exécutions : la balance de quote en cache peut s'écarter
+légèrement de la réalité entre deux réconciliations.
+"""
+
+import time
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable
+
+from market_state import PerpPosition, MarketState, dex_of
+
+DEFAULT_RECONCILE_SECONDS = 900
+
+# Nombre maximum d'exécutions retournées par userFillsByTime
+FILLS_PAGE_LIMIT = 2000
+
+# Durée de conservation des oids acquittés (pour ignorer leurs exécutions dans le flux)
+ACKED_OID_TTL = 86400
+
+# Le flux reprend un peu avant le lancement de la réconciliation (décalage d'horloge,
+# exécutions arrivées pendant la récupération) ; les exécutions déjà dans l'état sont écartées
+RECONCILE_OVERLAP_MS = 5000
+
+
+def _same_size(a: float, b: float) -> bool:
+    return abs(a - b) <= 1e-9 * max(1.0, abs(b))
+
+
+class PositionCache:
+    """Balances spot (+ USDC withdrawable) et positions perp d'un wallet, tenues à jour par le flux"""
+
+    def __init__(self, reconcile_seconds: float = DEFAULT_RECONCILE_SECONDS):
+        self.reconcile_seconds = reconcile_seconds
+        self.balances: Dict[str, float] = {}
+        # (dex ou "main", coin) -> position
+        self.positions: Dict[Tuple[str, str], PerpPosition] = {}
+        self.last_fill_ms = 0
+        # Exécutions jusqu'à ce timestamp (ms) peut-être déjà incluses dans l'état réconcilié
+        self._overlap_ms = 0
+        self.last_reconcile = 0.0
+        self.reconcile_reason: Optional[str] = "initialisation"
+        # tids déjà appliqués au timestamp last_fill_ms (startTime est inclusif)
+        self._boundary_tids: set = set()
+        self._acked_oids: Dict[int, float] = {}
+
+    # -------------------------------------------------------------------------
+    # État
+    # -------------------------------------------------------------------------
+
+    def is_fresh(self) -> bool:
+        """True si le cache peut remplacer les états complets pour ce cycle"""
+        if self.reconcile_reason is None and time.time() - self.last_reconcile >= self.reconcile_seconds:
+            self.reconcile_reason = "périodique"
+        return self.reconcile_reason is None
+
+    def invalidate(self, reason: str) -> None:
+        if self.reconcile_reason is None:
+            self.reconcile_reason = reason
+
+    def reconcile(self, balances: Dict[str, float], positions: Iterable[PerpPosition],
+                  fetched_at: Optional[float] = None) -> None:
+        """
+        Remplace le contenu du cache par un état complet fraîchement récupéré.
+        fetched_at : time.time() au lancement de la récupération (défaut : maintenant) ;
+        le flux reprend RECONCILE_OVERLAP_MS avant, les doublons sont écartés par apply_fills.
+        """
+        self.balances.clear()
+        self.balances.update(balances)
+        self.positions.clear()
+        for pos in positions:
+            if pos.coin:
+                self.positions[(pos.dex, pos.coin)] = pos
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        self.last_reconcile = fetched_at
+        self._overlap_ms = int(fetched_at * 1000)
+        self.last_fill_ms = self._overlap_ms - RECONCILE_OVERLAP_MS
+        self._boundary_tids = set()
+        self.reconcile_reason = None
+
+    def note_acked(self, oid: Optional[int]) -> None:
+        """Ordre déjà appliqué depuis son acquittement : ses exécutions du flux seront ignorées"""
+        if oid is None:
+            return
+        now = time.time()
+        self._acked_oids[oid] = now
+        if len(self._acked_oids) > 1000:
+            self._acked_oids = {o: t for o, t in self._acked_oids.items() if now - t < ACKED_OID_TTL}
+
+    # -------------------------------------------------------------------------
+    # Flux
+    # -------------------------------------------------------------------------
+
+    def apply_ledger(self, updates: Any) -> None:
+        """Tout mouvement de fonds hors trading invalide les balances : réconciliation"""
+        if updates:
+            self.invalidate(f"{len(updates)} mouvement(s) de fonds")
+
+    def apply_fills(self, fills: List[Dict[str, Any]], spot_pairs: Dict[str, Tuple[str, str]],
+                    perp_quote: Callable[[str], str]) -> int:
+        """
+        Applique les exécutions de userFillsByTime (ordre chronologique).
+        spot_pairs : coin spot ("@107", "PURR/USDC") -> (token de base, quote asset)
+        perp_quote : dex -> quote asset
+        Retourne le nombre d'exécutions appliquées.
+        """
+        if len(fills) >= FILLS_PAGE_LIMIT:
+            self.invalidate("flux d'exécutions tronqué")
+            return 0
+
+        applied = 0
+        for fill in sorted(fills, key=lambda f: f.get("time", 0)):
+            fill_ms = int(fill.get("time", 0))
+            tid = fill.get("tid")
+            if fill_ms < self.last_fill_ms or (fill_ms == self.last_fill_ms and tid in self._boundary_tids):
+                continue
+            if fill_ms > self.last_fill_ms:
+                self.last_fill_ms = fill_ms
+                self._boundary_tids = set()
+            self._boundary_tids.add(tid)
+            if fill.get("oid") in self._acked_oids:
+                continue
+            # Exécution proche de la réconciliation : peut-être déjà comptée dans l'état
+            in_overlap = fill_ms <= self._overlap_ms
+
+            coin = fill.get("coin", "")
+            size = float(fill.get("sz", 0))
+            price = float(fill.get("px", 0))
+            signed = size if fill.get("side") == "B" else -size
+            fee = float(fill.get("fee", 0) or 0)
+            fee_token = fill.get("feeToken") or "USDC"
+
+            if coin in spot_pairs:
+                if in_overlap:
+                    # Rien dans une exécution spot ne dit si l'état l'inclut déjà
+                    self.invalidate(f"exécution spot {coin} pendant la réconciliation")
+                    continue
+                base, quote = spot_pairs[coin]
+                self.balances[base] = self.balances.get(base, 0) + signed
+                self.balances[quote] = self.balances.get(quote, 0) - signed * price
+            elif coin.startswith("@") or "/" in coin:
+                # Paire spot non configurée : impossible de savoir quelles balances bougent
+                self.invalidate(f"exécution spot inconnue ({coin})")
+                continue
+            else:
+                dex = dex_of(coin)
+                key = (dex or "main", coin)
+                pos = self.positions.get(key)
+                if pos is None:
+                    pos = PerpPosition(key[0], coin, 0.0, 0.0, 0.0)
+                    self.positions[key] = pos
+                start = fill.get("startPosition")
+                if start is not None:
+                    start = float(start)
+                    if in_overlap and not _same_size(start, pos.szi) and _same_size(start + signed, pos.szi):
+                        # Déjà incluse dans l'état réconcilié (taille et frais)
+                        continue
+                    if not _same_size(start, pos.szi):
+                        self.invalidate(f"dérive sur {coin} ({pos.szi:g} en cache, {start:g} réel)")
+                # Levier x1 : la marge libérée au prix d'exécution inclut déjà le PnL réalisé (closedPnl)
+                quote = perp_quote(dex)
+                self.balances[quote] = self.balances.get(quote, 0) - pos.apply_fill(signed, price)
+            self.balances[fee_token] = self.balances.get(fee_token, 0) - fee
+            applied += 1
+        return applied
+
+    def refresh_marks(self, market: MarketState, mids: Dict[str, float]) -> None:
+        """Met à jour mark et PnL non réalisé des positions en cache avec les prix du cycle"""
+        for pos in self.positions.values():
+            mark = mids.get(pos.coin) or market.mark_price(pos.coin)
+            if mark > 0:
+                pos.mark_px = mark
+                pos.unrealized_pnl = pos.szi * (mark - pos.entry_px)
@@ -0,0 +1,271 @@
+"""
+Hyperliquid Rebalancer V2 - Profilage par échantillonnage
+==================================================
+Quand un cycle ralentit, il faut savoir si le temps part dans le réseau, le décodage JSON,
+le parsing des floats, la signature ou les print. Le profileur (--profile) :
+
+- échantillonne les piles Python de tous les threads actifs depuis un thread dédié
+  (sys._current_frames, ~100 Hz par défaut) : pas d'instrumentation des fonctions,
+  surcoût de l'ordre de 1% d'un cœur, utilisable en production ;
+- pondère chaque échantillon par le temps écoulé depuis le précédent : un appel C long
+  (json.loads, signature) retarde l'échantillonneur (GIL) sans fausser les durées ;
+- étiquette chaque échantillon avec l'étape courante de la boucle principale
+  (plan, fetch, wallets, ordres...), déclarée par `with profiler.stage("fetch"):` ;
+- ignore les threads inactifs (workers de pool en attente de tâche, threads de service
+  sans code du projet) et l'étape "sleep" ;
+- classe la feuille de chaque pile (réseau, json, signature, float, print, attente, python) ;
+  les appels C (print, float) n'ont pas de frame : la ligne source de la feuille sert d'indice.
+
+Tous les K cycles, un rapport est écrit dans le répertoire de profils :
+- profile_<horodatage>.folded : piles repliées ("stage;thread;f1;f2;... N"),
+  lisibles par flamegraph.pl ou speedscope ;
+- profile_<horodatage>.txt    : temps par étape, par catégorie et top-N des fonctions
+  (temps propre et cumulé), aussi affiché dans la console.
+"""
+
+import os
+import sys
+import time
+import linecache
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Iterator
+
+DEFAULT_INTERVAL_MS = 10
+DEFAULT_REPORT_EVERY = 10
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_TOP = 25
+
+# Étape exclue des rapports (attente entre deux cycles)
+IDLE_STAGE = "sleep"
+
+# Profondeur maximale d'une pile échantillonnée
+MAX_DEPTH = 64
+
+# Répertoire du projet : un thread secondaire sans aucune frame du projet est un thread de service
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Catégories de la feuille d'une pile, selon le fichier (premier motif trouvé)
+_FILE_CATEGORIES = (
+    (("/json/",), "json"),
+    (("eth_account", "eth_keys", "eth_utils", "eth_abi", "eth_hash", "coincurve", "Crypto", "msgpack",
+      "hyperliquid/utils/signing"), "signature"),
+    (("socket.py", "ssl.py", "urllib3", "http/client.py", "requests/", "selectors.py"), "réseau"),
+    (("threading.py", "concurrent/futures", "queue.py"), "attente"),
+)
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def categorize(filename: str, lineno: int) -> str:
+    """Catégorie de la feuille d'une pile (fichier, puis ligne source pour les appels C)"""
+    path = filename.replace("\\", "/")
+    for patterns, category in _FILE_CATEGORIES:
+        if any(p in path for p in patterns):
+            return category
+    line = linecache.getline(filename, lineno)
+    if "print(" in line:
+        return "print"
+    if "float(" in line:
+        return "float"
+    return "python"
+
+
+class SamplingProfiler:
+    """Échantillonneur de piles, agrégé par étape, fonction et pile repliée"""
+
+    def __init__(self, interval_ms: float = DEFAULT_INTERVAL_MS, report_every: int = DEFAULT_REPORT_EVERY,
+                 out_dir: str = DEFAULT_PROFILE_DIR, top: int = DEFAULT_TOP):
+        self.interval = interval_ms / 1000
+        self.report_every = max(1, report_every)
+        self.out_dir = out_dir
+        self.top = top
+        self.enabled = False
+        self._stage = "autre"
+        self._main_ident = threading.main_thread().ident
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._cycles = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        # (étape, thread, pile repliée) -> secondes
+        self._stacks: Counter = Counter()
+        # (étape, fichier, ligne) de la feuille -> secondes (catégorisées au rapport)
+        self._leaves: Counter = Counter()
+        self._stage_seconds: Counter = Counter()
+        self._samples = 0
+        self._sampling_seconds = 0.0
+        self._started_at = time.perf_counter()
+
+    # -------------------------------------------------------------------------
+    # Contrôle
+    # -------------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        self._stop.clear()
+        self._reset()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Étape courante de la boucle principale (sans effet si le profileur est arrêté)"""
+        previous = self._stage
+        self._stage = name
+        try:
+            yield
+        finally:
+            self._stage = previous
+
+    def end_cycle(self) -> Optional[str]:
+        """Fin d'un cycle : écrit un rapport tous les K cycles, retourne le chemin du rapport texte"""
+        if not self.enabled:
+            return None
+        self._cycles += 1
+        if self._cycles % self.report_every:
+            return None
+        return self.write_report()
+
+    # -------------------------------------------------------------------------
+    # Échantillonnage
+    # -------------------------------------------------------------------------
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            t0 = time.perf_counter()
+            weight, last = t0 - last, t0
+            stage = self._stage
+            if stage == IDLE_STAGE:
+                continue
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    stack = self._stack_of(frame, ident == self._main_ident)
+                    if stack is None:
+                        continue
+                    labels, leaf = stack
+                    thread = "main" if ident == self._main_ident else names.get(ident, "thread").rsplit("_", 1)[0]
+                    self._stacks[(stage, thread, ";".join(labels))] += weight
+                    self._leaves[(stage,) + leaf] += weight
+                    self._stage_seconds[stage] += weight
+                    self._samples += 1
+                self._sampling_seconds += time.perf_counter() - t0
+            last = time.perf_counter()
+
+    @staticmethod
+    def _stack_of(frame, is_main: bool) -> Optional[Tuple[List[str], Tuple[str, int]]]:
+        """(labels racine -> feuille, (fichier, ligne) de la feuille) ; None pour un thread inactif"""
+        leaf = (frame.f_code.co_filename, frame.f_lineno)
+        labels = []
+        in_project = is_main
+        depth = 0
+        while frame is not None and depth < MAX_DEPTH:
+            labels.append(_frame_label(frame.f_code))
+            if not in_project and frame.f_code.co_filename.startswith(_PROJECT_DIR):
+                in_project = True
+            frame = frame.f_back
+            depth += 1
+        if not in_project:
+            return None
+        labels.reverse()
+        # Worker de pool en attente de tâche : _worker -> get -> wait
+        for i, label in enumerate(labels[:-1]):
+            if label == "thread.py:_worker" and labels[i + 1].endswith(":get"):
+                return None
+        return labels, leaf
+
+    # -------------------------------------------------------------------------
+    # Rapports
+    # -------------------------------------------------------------------------
+
+    def write_report(self) -> Optional[str]:
+        """Écrit les piles repliées et le rapport texte, affiche le rapport puis remet les compteurs à zéro"""
+        with self._lock:
+            stacks, leaves, stage_seconds = self._stacks, self._leaves, self._stage_seconds
+            samples, sampling_seconds = self._samples, self._sampling_seconds
+            elapsed = time.perf_counter() - self._started_at
+            self._reset()
+        if not samples:
+            return None
+
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            folded_path = os.path.join(self.out_dir, f"profile_{stamp}.folded")
+            with open(folded_path, "w") as f:
+                # Poids en ms (entiers) pour les outils de flame graph
+                for (stage, thread, stack), seconds in stacks.most_common():
+                    if seconds >= 0.0005:
+                        f.write(f"{stage};{thread};{stack} {round(seconds * 1000)}\n")
+            report = self._format_report(stacks, leaves, stage_seconds, samples, sampling_seconds, elapsed)
+            report_path = os.path.join(self.out_dir, f"profile_{stamp}.txt")
+            with open(report_path, "w") as f:
+                f.write(report)
+        except OSError as e:
+            print(f"⚠️  Écriture du profil impossible: {e}")
+            return None
+        print(report)
+        print(f"[PROFILE] Piles repliées: {folded_path}")
+        return report_path
+
+    def _format_report(self, stacks: Counter, leaves: Counter, stage_seconds: Counter, samples: int,
+                       sampling_seconds: float, elapsed: float) -> str:
+        total_seconds = sum(stage_seconds.values()) or 1e-9
+        lines = [f"\n{'='*60}",
+                 f"📊 PROFIL - {samples} échantillons sur {elapsed:.0f}s "
+                 f"(pas {self.interval * 1000:.0f}ms, surcoût {sampling_seconds / max(elapsed, 1e-9) * 100:.2f}%)",
+                 f"{'='*60}"]
+
+        lines.append("\nTemps par étape (tous threads actifs) :")
+        for stage, seconds in stage_seconds.most_common():
+            lines.append(f"   {stage:<16} {seconds * 1000:>10.0f}ms  {seconds / total_seconds * 100:5.1f}%")
+
+        categories: Counter = Counter()
+        by_stage: Dict[str, Counter] = {}
+        for (stage, filename, lineno), seconds in leaves.items():
+            category = categorize(filename, lineno)
+            categories[category] += seconds
+            by_stage.setdefault(stage, Counter())[category] += seconds
+        lines.append("\nTemps par catégorie :")
+        for category, seconds in categories.most_common():
+            split = ", ".join(f"{stage} {c / seconds * 100:.0f}%" for stage, c in
+                              sorted(((st, c[category]) for st, c in by_stage.items() if c[category]),
+                                     key=lambda x: -x[1]))
+            lines.append(f"   {category:<12} {seconds * 1000:>10.0f}ms  {seconds / total_seconds * 100:5.1f}%  ({split})")
+
+        own: Counter = Counter()
+        cumulative: Counter = Counter()
+        for (stage, thread, stack), seconds in stacks.items():
+            labels = stack.split(";")
+            own[labels[-1]] += seconds
+            for label in set(labels):
+                cumulative[label] += seconds
+        lines.append(f"\nTop {self.top} fonctions (temps propre / cumulé) :")
+        for label, seconds in own.most_common(self.top):
+            lines.append(f"   {seconds * 1000:>9.0f}ms {seconds / total_seconds * 100:5.1f}%  "
+                         f"{cumulative[label] * 1000:>9.0f}ms {cumulative[label] / total_seconds * 100:5.1f}%  {label}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,580 @@
+"""
+Hyperliquid Rebalancer V2 - Planificateur de requêtes
+==================================================
+Détermine, à partir de la config de chaque wallet (spot_tokens / perpetuals activés),
+l'ensemble minimal de requêtes info nécessaires pour un cycle :
+
+- allMids                       : dès qu'un actif est activé
+- spotClearinghouseState(user)  : tokens spot activés, ou achat possible (balances de quote)
+- clearinghouseState(user, dex) : uniquement les DEXs ayant des perps activés
+                                  (+ main DEX pour l'USDC withdrawable si un achat en USDC est possible)
+- metaAndAssetCtxs(dex)         : uniquement les DEXs ayant des perps activés
+
+Un wallet dont le cache de positions est à jour (voir position_cache.py) remplace ses
+requêtes d'état complet par userFillsByTime et userNonFundingLedgerUpdates depuis la
+dernière exécution vue.
+
+Les requêtes identiques entre wallets (allMids, metaAndAssetCtxs) ne sont exécutées
+qu'une fois par cycle et leurs résultats sont partagés.
+
+Chaque requête passe par le circuit breaker de son (type, DEX) ; si l'appel est refusé
+ou échoue, la dernière réponse valide est réutilisée tant qu'elle est assez récente.
+
+Les clearinghouseState de plusieurs wallets sur un même DEX sont regroupés en une requête
+batchClearinghouseStates quand l'API la supporte (sondée au premier usage) ; batchs et autres
+requêtes sont lancés ensemble en parallèle (pool de threads, connexions HTTP poolées côté api_call).
+
+Avec une échéance (deadline), les requêtes encore en cours à l'échéance sont abandonnées :
+celles pas encore démarrées sont annulées, les réponses tardives ne modifient plus les
+résultats du cycle (elles alimentent seulement la dernière réponse valide pour les suivants)
+et chaque requête abandonnée est traitée comme un échec (repli sur le cache récent, sinon erreur).
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, Optional, List, Callable, Iterable, NamedTuple, Tuple
+
+from market_state import MarketState, PerpPosition, dex_of
+from circuit_breaker import BreakerBoard, CircuitOpenError
+from metrics import metrics
+
+
+class InfoQuery(NamedTuple):
+    """Requête info hashable (sert de clé de déduplication et de résultat)"""
+    type: str
+    user: Optional[str] = None
+    dex: Optional[str] = None
+    start_time: Optional[int] = None  # ms, pour les flux (userFillsByTime...)
+
+    def payload(self) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"type": self.type}
+        if self.user is not None:
+            payload["user"] = self.user
+        if self.dex:
+            payload["dex"] = self.dex
+        if self.start_time is not None:
+            payload["startTime"] = self.start_time
+        return payload
+
+    def label(self) -> str:
+        parts = [self.type]
+        if self.dex:
+            parts.append(self.dex)
+        if self.user:
+            parts.append(self.user[:10])
+        return "/".join(parts)
+
+
+ALL_MIDS = InfoQuery("allMids")
+
+
+class FetchDeadlineError(Exception):
+    """Requête abandonnée : pas de réponse avant l'échéance du cycle"""
+
+    def __init__(self, query: InfoQuery, budget: float):
+        super().__init__(f"{query.label()}: pas de réponse dans le budget de {budget:.1f}s")
+        self.query = query
+        self.budget = budget
+
+
+def spot_state_query(address: str) -> InfoQuery:
+    return InfoQuery("spotClearinghouseState", user=address)
+
+
+def perp_state_query(address: str, dex: str) -> InfoQuery:
+    return InfoQuery("clearinghouseState", user=address, dex=dex)
+
+
+def meta_query(dex: str) -> InfoQuery:
+    return InfoQuery("metaAndAssetCtxs", dex=dex)
+
+
+def user_fills_query(address: str, since_ms: int) -> InfoQuery:
+    return InfoQuery("userFillsByTime", user=address, start_time=since_ms)
+
+
+def ledger_query(address: str, since_ms: int) -> InfoQuery:
+    return InfoQuery("userNonFundingLedgerUpdates", user=address, start_time=since_ms)
+
+
+def perp_dex_for(asset_name: str, tc: Dict[str, Any]) -> str:
+    """DEX d'un perp configuré ("" pour le main DEX)"""
+    return tc.get("dex") or dex_of(asset_name)
+
+# =============================================================================
+# PLAN
+# =============================================================================
+
+class WalletPlan:
+    """Requêtes nécessaires pour un wallet sur un cycle"""
+
+    def __init__(self, wallet_id: int, address: str):
+        self.wallet_id = wallet_id
+        self.address = address
+        self.needs_mids = False
+        self.spot_state: Optional[InfoQuery] = None
+        # dex -> clearinghouseState
+        self.perp_states: Dict[str, InfoQuery] = {}
+        # DEXs dont les contextes d'actifs sont nécessaires
+        self.meta_dexs: List[str] = []
+        # Flux incrémental (cache de positions) à la place des états complets
+        self.fills_query: Optional[InfoQuery] = None
+        self.ledger_query: Optional[InfoQuery] = None
+
+    def queries(self) -> List[InfoQuery]:
+        queries = []
+        if self.needs_mids:
+            queries.append(ALL_MIDS)
+        if self.spot_state is not None:
+            queries.append(self.spot_state)
+        queries.extend(self.perp_states.values())
+        queries.extend(meta_query(dex) for dex in self.meta_dexs)
+        if self.fills_query is not None:
+            queries.append(self.fills_query)
+        if self.ledger_query is not None:
+            queries.append(self.ledger_query)
+        return queries
+
+    def use_fill_stream(self, since_ms: int) -> None:
+        """Remplace les états complets (spot et perps) par le flux des exécutions et du ledger"""
+        if self.spot_state is None and not self.perp_states:
+            return
+        self.spot_state = None
+        self.perp_states = {}
+        self.fills_query = user_fills_query(self.address, since_ms)
+        self.ledger_query = ledger_query(self.address, since_ms)
+
+    def use_local_state(self) -> None:
+        """Supprime les états utilisateur : balances et positions sont tenues localement (paper trading)"""
+        self.spot_state = None
+        self.perp_states = {}
+
+    def is_empty(self) -> bool:
+        return not self.queries()
+
+
+def plan_wallet(wallet_id: int, address: str, config: Dict[str, Any]) -> WalletPlan:
+    """Construit le plan minimal d'un wallet à partir de ses actifs activés"""
+    plan = WalletPlan(wallet_id, address)
+
+    enabled_spot = {t: tc for t, tc in config.get("spot_tokens", {}).items() if tc.get("enabled", False)}
+    enabled_perps = {a: tc for a, tc in config.get("perpetuals", {}).items() if tc.get("enabled", False)}
+    if not enabled_spot and not enabled_perps:
+        return plan
+
+    plan.needs_mids = True
+
+    # Les balances spot servent aux tokens spot et aux vérifications de quote avant un achat
+    any_buy = any(tc.get("buy_enabled", False) for tc in list(enabled_spot.values()) + list(enabled_perps.values()))
+    if enabled_spot or any_buy:
+        plan.spot_state = spot_state_query(address)
+
+    perp_dexs = []
+    for asset_name, tc in enabled_perps.items():
+        dex = perp_dex_for(asset_name, tc)
+        if dex not in perp_dexs:
+            perp_dexs.append(dex)
+
+    # L'USDC withdrawable du main DEX compte dans la balance USDC pour les achats
+    usdc_buy = any(
+        tc.get("buy_enabled", False) and tc.get("quote_asset", "USDC") == "USDC"
+        for tc in list(enabled_spot.values()) + list(enabled_perps.values())
+    )
+    state_dexs = list(perp_dexs)
+    if usdc_buy and "" not in state_dexs:
+        state_dexs.insert(0, "")
+
+    for dex in state_dexs:
+        plan.perp_states[dex] = perp_state_query(address, dex)
+    plan.meta_dexs = perp_dexs
+    return plan
+
+
+class CyclePlan:
+    """Plans de tous les wallets d'un cycle, avec requêtes dédupliquées"""
+
+    def __init__(self, wallet_plans: Iterable[WalletPlan]):
+        self.wallets: Dict[int, WalletPlan] = {p.wallet_id: p for p in wallet_plans}
+
+    def queries(self) -> List[InfoQuery]:
+        """Requêtes uniques, dans l'ordre de première apparition"""
+        seen: Dict[InfoQuery, None] = {}
+        for plan in self.wallets.values():
+            for query in plan.queries():
+                seen.setdefault(query, None)
+        return list(seen)
+
+# =============================================================================
+# EXÉCUTION ET RÉSULTATS
+# =============================================================================
+
+class CycleData:
+    """
+    Résultats des requêtes d'un cycle, partagés entre wallets.
+    Une requête échouée est stockée dans `errors` ; la lire relève l'exception.
+    """
+
+    def __init__(self, results: Optional[Dict[InfoQuery, Any]] = None,
+                 errors: Optional[Dict[InfoQuery, Exception]] = None):
+        self.results: Dict[InfoQuery, Any] = results or {}
+        self.errors: Dict[InfoQuery, Exception] = errors or {}
+        # time.time() avant la première requête (les états récupérés sont au moins aussi récents)
+        self.started_at = time.time()
+        # Requêtes servies depuis la dernière réponse valide -> âge en secondes
+        self.stale: Dict[InfoQuery, float] = {}
+        # Appels HTTP effectués pour remplir ces résultats (une requête batch compte pour un)
+        self.http_calls = 0
+        # Fermé à l'échéance : les réponses tardives sont ignorées
+        self.closed = False
+        self._lock = threading.Lock()
+        self._mids: Optional[Dict[str, float]] = None
+        self._market: Optional[MarketState] = None
+
+    def has(self, query: InfoQuery) -> bool:
+        return query in self.results
+
+    def store(self, query: InfoQuery, result: Any, age: Optional[float] = None) -> bool:
+        """Range un résultat (avec son âge s'il vient du cache) ; False si le cycle est déjà fermé"""
+        with self._lock:
+            if self.closed:
+                return False
+            self.results[query] = result
+            if age is not None:
+                self.stale[query] = age
+            return True
+
+    def fail(self, query: InfoQuery, error: Exception) -> bool:
+        with self._lock:
+            if self.closed:
+                return False
+            self.errors[query] = error
+            return True
+
+    def close(self) -> None:
+        """Ferme le cycle (échéance) ; plus aucun résultat n'est rangé par les threads de requête"""
+        with self._lock:
+            self.closed = True
+
+    def missing_for(self, queries: Iterable[InfoQuery]) -> Dict[InfoQuery, Exception]:
+        """Parmi `queries`, celles sans résultat (avec leur erreur)"""
+        return {q: self.errors[q] for q in queries if q in self.errors}
+
+    def get(self, query: InfoQuery) -> Any:
+        if query in self.errors:
+            raise self.errors[query]
+        return self.results[query]
+
+    def mids(self) -> Dict[str, float]:
+        """allMids parsé une seule fois pour tous les wallets"""
+        if self._mids is None:
+            self._mids = {k: float(v) for k, v in self.get(ALL_MIDS).items()}
+        return self._mids
+
+    def market(self) -> MarketState:
+        """Contextes d'actifs de tous les DEXs récupérés, construit une seule fois"""
+        if self._market is None:
+            market = MarketState()
+            for query, data in self.results.items():
+                if query.type == "metaAndAssetCtxs":
+                    market.add_dex(query.dex or "", data)
+            if ALL_MIDS in self.results:
+                market.add_mids(self.mids())
+            self._market = market
+        return self._market
+
+    def spot_balances(self, address: str) -> Dict[str, float]:
+        """Balances spot + USDC withdrawable du main DEX (si récupéré)"""
+        balances: Dict[str, float] = {}
+        spot_query = spot_state_query(address)
+        if spot_query in self.results or spot_query in self.errors:
+            for bal in self.get(spot_query).get("balances", []):
+                total = float(bal.get("total", 0))
+                if total > 0:
+                    balances[bal.get("coin", "")] = total
+        main_query = perp_state_query(address, "")
+        if main_query in self.results:
+            withdrawable = float(self.results[main_query].get("withdrawable", 0))
+            if withdrawable > 0:
+                balances["USDC"] = balances.get("USDC", 0) + withdrawable
+        return balances
+
+    def perp_positions(self, address: str, dexs: Iterable[str]) -> Tuple[List[PerpPosition], List[str]]:
+        """
+        Positions ouvertes sur les DEXs demandés.
+        Retourne (positions, dexs_en_erreur) ; dex = "main" pour le main DEX dans les positions.
+        """
+        positions = []
+        failed = []
+        for dex in dexs:
+            query = perp_state_query(address, dex)
+            if query not in self.results:
+                failed.append(dex)
+                continue
+            for asset_pos in self.results[query].get("assetPositions", []):
+                position = PerpPosition.from_api(dex if dex else "main", asset_pos.get("position", {}))
+                if abs(position.szi) > 1e-8:
+                    positions.append(position)
+        return positions, failed
+
+    def stale_for(self, queries: Iterable[InfoQuery]) -> Dict[InfoQuery, float]:
+        """Parmi `queries`, celles servies depuis le cache (avec leur âge)"""
+        return {q: self.stale[q] for q in queries if q in self.stale}
+
+    def count_call(self) -> None:
+        with self._lock:
+            self.http_calls += 1
+
+
+class LastGoodCache:
+    """Dernière réponse valide de chaque requête, pour le repli quand un DEX est indisponible"""
+
+    def __init__(self):
+        self._entries: Dict[InfoQuery, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, query: InfoQuery, result: Any) -> None:
+        with self._lock:
+            self._entries[query] = (time.time(), result)
+
+    def get(self, query: InfoQuery, max_age: float) -> Optional[Tuple[Any, float]]:
+        """Retourne (résultat, âge) si une réponse de moins de `max_age` secondes existe"""
+        with self._lock:
+            entry = self._entries.get(query)
+        if entry is None:
+            return None
+        age = time.time() - entry[0]
+        if age > max_age:
+            return None
+        return entry[1], age
+
+
+def run_query(query: InfoQuery, api_call: Callable[[Dict], Any], data: CycleData,
+              breakers: Optional[BreakerBoard] = None, last_good: Optional[LastGoodCache] = None,
+              max_stale_seconds: float = 0) -> None:
+    """Exécute une requête (via son circuit breaker) et range le résultat ou l'erreur dans `data`"""
+    breaker = breakers.get(query.type, query.dex or "") if breakers is not None else None
+    if breaker is not None and not breaker.allow():
+        error: Exception = CircuitOpenError(breaker.name, breaker.retry_in())
+    else:
+        try:
+            data.count_call()
+            result = api_call(query.payload())
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure()
+            error = e
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            if last_good is not None:
+                last_good.put(query, result)
+            data.store(query, result)
+            return
+    serve_fallback(query, error, data, last_good, max_stale_seconds)
+
+
+def serve_fallback(query: InfoQuery, error: Exception, data: CycleData,
+                   last_good: Optional[LastGoodCache] = None, max_stale_seconds: float = 0) -> None:
+    """Requête échouée : dernière réponse valide si assez récente, sinon erreur"""
+    cached = last_good.get(query, max_stale_seconds) if last_good is not None else None
+    if cached is not None:
+        if data.store(query, cached[0], cached[1]):
+            metrics.incr("info_stale_served_total", endpoint=query.type, dex=query.dex or "main")
+    else:
+        data.fail(query, error)
+
+
+# =============================================================================
+# REQUÊTES MULTI-UTILISATEURS
+# =============================================================================
+
+def _is_client_error(error: Exception) -> bool:
+    """Erreur HTTP 4xx (requête refusée par l'API, ex: type inconnu)"""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status is not None and 400 <= status < 500
+
+
+class UserStateBatcher:
+    """
+    Regroupe les clearinghouseState de plusieurs utilisateurs d'un même DEX en requêtes
+    batchClearinghouseStates ({"users": [...], "dex": ...} -> liste d'états dans le même ordre).
+    Si l'API refuse ce type (erreur 4xx ou réponse inattendue), le batch est désactivé et
+    les requêtes sont exécutées une par une ; si l'endpoint est en panne (timeout, 5xx),
+    les requêtes du batch échouent ensemble (repli sur la dernière réponse valide).
+    """
+
+    BATCH_TYPE = "batchClearinghouseStates"
+
+    def __init__(self, max_users: int = 50):
+        self.max_users = max_users
+        # None : pas encore sondé ; False : non supporté par l'endpoint
+        self.supported: Optional[bool] = None
+        self._lock = threading.Lock()
+
+    def _disable(self, reason: str) -> None:
+        with self._lock:
+            if self.supported is not False:
+                self.supported = False
+                print(f"ℹ️  {self.BATCH_TYPE} non supporté ({reason}), requêtes par utilisateur en parallèle")
+
+    def _run_batch(self, dex: str, queries: List[InfoQuery], api_call: Callable[[Dict], Any], data: CycleData,
+                   breakers: Optional[BreakerBoard], last_good: Optional[LastGoodCache],
+                   max_stale_seconds: float = 0) -> List[InfoQuery]:
+        """
+        Exécute un batch ; retourne les requêtes à exécuter individuellement (batch refusé).
+        Un échec de l'endpoint (timeout, 5xx, circuit ouvert) est l'échec de toutes ses requêtes :
+        les réessayer une par une sur le même endpoint doublerait l'attente et la charge.
+        """
+        breaker = breakers.get(self.BATCH_TYPE, dex) if breakers is not None else None
+        if breaker is not None and not breaker.allow():
+            error: Exception = CircuitOpenError(breaker.name, breaker.retry_in())
+            for query in queries:
+                serve_fallback(query, error, data, last_good, max_stale_seconds)
+            return []
+        payload: Dict[str, Any] = {"type": self.BATCH_TYPE, "users": [q.user for q in queries]}
+        if dex:
+            payload["dex"] = dex
+        try:
+            data.count_call()
+            states = api_call(payload)
+        except Exception as e:
+            if not _is_client_error(e):
+                if breaker is not None:
+                    breaker.record_failure()
+                for query in queries:
+                    serve_fallback(query, e, data, last_good, max_stale_seconds)
+                return []
+            # Type de requête refusé : ce n'est pas une panne de l'endpoint
+            if breaker is not None:
+                breaker.record_success()
+            self._disable(str(e))
+            return queries
+        if not isinstance(states, list) or len(states) != len(queries):
+            if breaker is not None:
+                breaker.record_success()
+            self._disable("réponse inattendue")
+            return queries
+
+        if breaker is not None:
+            breaker.record_success()
+        with self._lock:
+            self.supported = True
+        remaining = []
+        for query, state in zip(queries, states):
+            if not isinstance(state, dict):
+                remaining.append(query)
+                continue
+            if last_good is not None:
+                last_good.put(query, state)
+            data.store(query, state)
+        metrics.incr("info_batched_users_total", len(queries) - len(remaining), dex=dex or "main")
+        return remaining
+
+    def split(self, queries: List[InfoQuery]) -> Tuple[List[Tuple[str, List[InfoQuery]]], List[InfoQuery]]:
+        """Sépare les clearinghouseState groupables en batchs (dex, requêtes) des autres requêtes"""
+        if self.supported is False:
+            return [], queries
+        by_dex: Dict[str, List[InfoQuery]] = {}
+        remaining = []
+        for query in queries:
+            if query.type == "clearinghouseState" and query.user:
+                by_dex.setdefault(query.dex or "", []).append(query)
+            else:
+                remaining.append(query)
+        chunks = []
+        for dex, group in by_dex.items():
+            if len(group) < 2:
+                remaining.extend(group)
+                continue
+            chunks.extend((dex, group[i:i + self.max_users]) for i in range(0, len(group), self.max_users))
+        return chunks, remaining
+
+    def run_chunk(self, dex: str, queries: List[InfoQuery], api_call: Callable[[Dict], Any], data: CycleData,
+                  breakers: Optional[BreakerBoard] = None, last_good: Optional[LastGoodCache] = None,
+                  max_stale_seconds: float = 0) -> None:
+        """Sert un batch ; ses requêtes passent une par une si le type batch est refusé"""
+        remaining = queries
+        if self.supported is not False:
+            remaining = self._run_batch(dex, queries, api_call, data, breakers, last_good, max_stale_seconds)
+        for query in remaining:
+            run_query(query, api_call, data, breakers, last_good, max_stale_seconds)
+
+
+def _fetch_tasks(queries: List[InfoQuery], api_call: Callable[[Dict], Any], data: CycleData,
+                 breakers: Optional[BreakerBoard], last_good: Optional[LastGoodCache], max_stale_seconds: float,
+                 batcher: Optional[UserStateBatcher]) -> List[Callable[[], None]]:
+    """
+    Tâches indépendantes d'un cycle (requêtes individuelles et batchs), à lancer ensemble :
+    les requêtes partagées par tous les wallets (allMids, metaAndAssetCtxs) d'abord.
+    """
+    chunks, queries = batcher.split(queries) if batcher is not None else ([], queries)
+    shared = [q for q in queries if q.user is None]
+    per_user = [q for q in queries if q.user is not None]
+
+    def query_task(query: InfoQuery) -> Callable[[], None]:
+        return lambda: run_query(query, api_call, data, breakers, last_good, max_stale_seconds)
+
+    def chunk_task(dex: str, chunk: List[InfoQuery]) -> Callable[[], None]:
+        return lambda: batcher.run_chunk(dex, chunk, api_call, data, breakers, last_good, max_stale_seconds)
+
+    return ([query_task(q) for q in shared] + [chunk_task(dex, chunk) for dex, chunk in chunks]
+            + [query_task(q) for q in per_user])
+
+
+def execute_plan(plan: CyclePlan, api_call: Callable[[Dict], Any],
+                 breakers: Optional[BreakerBoard] = None, last_good: Optional[LastGoodCache] = None,
+                 max_stale_seconds: float = 0, max_workers: int = 1,
+                 batcher: Optional[UserStateBatcher] = None, deadline: Optional[float] = None) -> CycleData:
+    """
+    Exécute chaque requête unique du plan une seule fois : batchs multi-utilisateurs (si `batcher`)
+    et requêtes individuelles ensemble, en parallèle sur `max_workers` threads.
+    `deadline` (time.monotonic()) : les requêtes sans réponse à l'échéance sont abandonnées.
+    """
+    if deadline is not None:
+        return _execute_with_deadline(plan.queries(), api_call, breakers, last_good, max_stale_seconds,
+                                      max_workers, batcher, deadline)
+    data = CycleData()
+    tasks = _fetch_tasks(plan.queries(), api_call, data, breakers, last_good, max_stale_seconds, batcher)
+    if max_workers > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(min(max_workers, len(tasks)), thread_name_prefix="info-fetch") as pool:
+            list(pool.map(lambda task: task(), tasks))
+    else:
+        for task in tasks:
+            task()
+    return data
+
+
+def _execute_with_deadline(queries: List[InfoQuery], api_call: Callable[[Dict], Any],
+                           breakers: Optional[BreakerBoard], last_good: Optional[LastGoodCache],
+                           max_stale_seconds: float, max_workers: int, batcher: Optional[UserStateBatcher],
+                           deadline: float) -> CycleData:
+    """
+    execute_plan avec échéance : tout passe par un pool (même en séquentiel, max_workers=1)
+    pour pouvoir cesser d'attendre une requête lente sans bloquer le cycle.
+    """
+    data = CycleData()
+    budget = max(0.0, deadline - time.monotonic())
+    tasks = _fetch_tasks(queries, api_call, data, breakers, last_good, max_stale_seconds, batcher)
+    pool = ThreadPoolExecutor(max(1, min(max_workers, len(tasks) or 1)), thread_name_prefix="info-fetch")
+    try:
+        futures = [pool.submit(task) for task in tasks]
+        if futures:
+            wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    finally:
+        # Requêtes non démarrées annulées ; celles en cours finissent en arrière-plan sans effet sur `data`
+        pool.shutdown(wait=False, cancel_futures=True)
+    data.close()
+
+    for query in queries:
+        if query in data.results or query in data.errors:
+            continue
+        metrics.incr("info_deadline_cancelled_total", endpoint=query.type, dex=query.dex or "main")
+        cached = last_good.get(query, max_stale_seconds) if last_good is not None else None
+        if cached is not None:
+            data.results[query], data.stale[query] = cached
+            metrics.incr("info_stale_served_total", endpoint=query.type, dex=query.dex or "main")
+        else:
+            data.errors[query] = FetchDeadlineError(query, budget)
+    return data
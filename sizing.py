@@ -0,0 +1,83 @@
+"""
+Hyperliquid Rebalancer V2 - Taille des ordres
+==================================================
+Mode "fixed" (défaut) : chaque action est un ordre de `order_size_usd`, suivi du cooldown ;
+un actif loin de sa cible demande de nombreux cycles et autant d'ordres signés.
+
+Mode "target" (settings.sizing_mode) : le notionnel nécessaire pour revenir à `hold_usd`
+est calculé puis plafonné :
+
+- par actif : `max_order_usd` (notionnel maximum par cycle) ;
+- par la balance de quote disponible pour un achat (prix limite compris) ;
+- par le budget de slippage : avec une estimation de l'impact (`impact_bps_per_1k`, bps par
+  tranche de $1000), un ordre ne dépasse pas le notionnel dont l'impact estimé tient dans
+  `slippage_budget_bps` ; au-delà, le notionnel est découpé en tranches.
+
+Le budget de slippage sert aussi de marge du prix limite IOC. Sans estimation d'impact,
+le notionnel part en un seul ordre. Les vérifications existantes (quote insuffisante,
+vente bloquée à PnL négatif, cooldown) restent appliquées avant le calcul de la taille.
+"""
+
+import math
+from typing import Dict, Any, List
+
+SIZING_FIXED = "fixed"
+SIZING_TARGET = "target"
+
+# Marge du prix limite IOC (bps) : 1% historique
+DEFAULT_SLIPPAGE_BUDGET_BPS = 100.0
+# Notionnel maximum par cycle en mode "target", en multiple de order_size_usd si non configuré
+DEFAULT_MAX_ORDER_MULTIPLE = 10
+# Nombre maximum de tranches envoyées pour un actif sur un cycle
+DEFAULT_MAX_SLICES = 5
+
+
+class SizingPolicy:
+    """Paramètres de taille des ordres d'un wallet (settings), surchargeables par actif"""
+
+    def __init__(self, settings: Dict[str, Any], order_size: float):
+        self.order_size = order_size
+        self.mode = settings.get("sizing_mode", SIZING_FIXED)
+        self.max_order_usd = settings.get("max_order_usd", order_size * DEFAULT_MAX_ORDER_MULTIPLE)
+        self.slippage_budget_bps = settings.get("slippage_budget_bps", DEFAULT_SLIPPAGE_BUDGET_BPS)
+        self.impact_bps_per_1k = settings.get("impact_bps_per_1k", 0.0)
+        self.max_slices = max(1, settings.get("max_slices", DEFAULT_MAX_SLICES))
+
+    def slippage_bps(self, tc: Dict[str, Any]) -> float:
+        """Marge du prix limite de l'actif (bps)"""
+        if self.mode != SIZING_TARGET:
+            return DEFAULT_SLIPPAGE_BUDGET_BPS
+        return tc.get("slippage_budget_bps", self.slippage_budget_bps)
+
+    def slice_cap(self, tc: Dict[str, Any]) -> float:
+        """Notionnel maximum d'un ordre dont l'impact estimé tient dans le budget (inf sans estimation)"""
+        impact = tc.get("impact_bps_per_1k", self.impact_bps_per_1k)
+        if impact <= 0:
+            return math.inf
+        return max(self.order_size, self.slippage_bps(tc) / impact * 1000)
+
+    def slices(self, tc: Dict[str, Any], current_usd: float, target_usd: float, is_buy: bool,
+               quote_balance: float) -> List[float]:
+        """
+        Notionnels (USD) des ordres à envoyer pour l'action décidée.
+        Mode "fixed" : un ordre de order_size_usd. Mode "target" : l'écart à la cible,
+        plafonné puis découpé en tranches égales d'au moins order_size_usd.
+        """
+        if self.mode != SIZING_TARGET:
+            return [self.order_size]
+
+        notional = min(abs(target_usd - current_usd), tc.get("max_order_usd", self.max_order_usd))
+        if is_buy:
+            # Le prix limite (marge de slippage) est réservé sur la quote
+            notional = min(notional, quote_balance / (1 + self.slippage_bps(tc) / 10000))
+        notional = max(notional, self.order_size)
+        if not is_buy:
+            # Jamais plus que la valeur détenue (pas de retournement de position)
+            notional = min(notional, current_usd)
+
+        count = min(self.max_slices, math.ceil(notional / self.slice_cap(tc)))
+        if count > 1:
+            # Tranches plafonnées par le budget de slippage : le reste attend le cycle suivant
+            notional = min(notional, count * self.slice_cap(tc))
+            count = max(1, min(count, int(notional // self.order_size)))
+        return [notional / count] * count
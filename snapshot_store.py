@@ -0,0 +1,365 @@
+"""
+Hyperliquid Rebalancer V2 - Historique colonnaire des cycles
+==================================================
+Stocke, à chaque cycle, l'état de chaque actif évalué (balance, prix, notionnel,
+cible, déviation, PnL, seuils) dans des fichiers colonnaires append-only,
+partitionnés par wallet et par jour :
+
+    snapshots/wallet_3/2026-10-19/ts.col
+                                  asset.col
+                                  balance.col ...
+    snapshots/wallet_3/2026-10-19/fills/ts.col ...   (ordres exécutés)
+    snapshots/wallet_3/assets.json      (dictionnaire id -> nom d'actif)
+
+Chaque colonne est un tableau binaire natif (module `array`), écrit avec `tofile`.
+L'écriture d'un cycle coûte quelques `write` sur des fichiers déjà ouverts
+(< 1 ms). Les lectures chargent uniquement les colonnes demandées et utilisent
+une recherche dichotomique sur `ts` (croissant dans une partition).
+
+Usage (requête en ligne de commande):
+    python snapshot_store.py --wallet 3 --asset flx:TSLA --field deviation --days 7
+"""
+
+import os
+import json
+import time
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, List, Tuple, Iterable
+
+DEFAULT_SNAPSHOT_DIR = "snapshots"
+
+KIND_SPOT = 0
+KIND_PERP = 1
+KIND_NAMES = {"spot": KIND_SPOT, "perp": KIND_PERP}
+
+
+def _uint32_typecode() -> str:
+    return "I" if array("I").itemsize == 4 else "L"
+
+
+# Colonnes : nom -> typecode array
+COLUMNS: Dict[str, str] = {
+    "ts": "d",            # timestamp unix (s)
+    "asset": _uint32_typecode(),  # id dans assets.json
+    "kind": "B",          # 0 spot, 1 perp
+    "balance": "d",       # quantité spot ou szi perp
+    "price": "d",
+    "notional": "d",      # valeur USD actuelle
+    "target": "d",        # hold_usd
+    "deviation": "d",     # % vs cible
+    "pnl": "d",           # PnL non réalisé USD (perps)
+    "buy_thr": "f",       # buy_threshold_pct au moment du cycle
+    "sell_thr": "f",      # sell_threshold_pct au moment du cycle
+}
+FLOAT_FIELDS = [c for c in COLUMNS if c not in ("ts", "asset", "kind")]
+
+# Table des exécutions (une ligne par ordre rempli), dans le sous-répertoire fills/
+FILLS_TABLE = "fills"
+FILL_COLUMNS: Dict[str, str] = {
+    "ts": "d",
+    "asset": _uint32_typecode(),
+    "kind": "B",
+    "side": "b",          # +1 achat, -1 vente
+    "size": "d",          # taille exécutée (totalSz)
+    "price": "d",         # prix moyen d'exécution (avgPx)
+    "mid": "d",           # prix de référence (mid/mark) au moment de la décision
+    "notional": "d",      # size * price (USD)
+    "fee_pct": "f",       # fee_pct de la config au moment de l'ordre
+}
+FILL_FLOAT_FIELDS = ["size", "price", "mid", "notional", "fee_pct"]
+
+# Colonnes de chaque table ("" = table des snapshots, à la racine de la partition)
+TABLES: Dict[str, Dict[str, str]] = {"": COLUMNS, FILLS_TABLE: FILL_COLUMNS}
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class SnapshotRow:
+    """Une ligne à écrire (un actif sur un cycle)"""
+
+    __slots__ = ("asset", "kind", "balance", "price", "notional", "target", "deviation", "pnl",
+                 "buy_thr", "sell_thr")
+
+    def __init__(self, asset: str, kind: int, balance: float, price: float, notional: float,
+                 target: float, deviation: float, pnl: float = 0.0,
+                 buy_thr: float = 0.0, sell_thr: float = 0.0):
+        self.asset = asset
+        self.kind = kind
+        self.balance = balance
+        self.price = price
+        self.notional = notional
+        self.target = target
+        self.deviation = deviation
+        self.pnl = pnl
+        self.buy_thr = buy_thr
+        self.sell_thr = sell_thr
+
+
+class FillRow:
+    """Un ordre exécuté"""
+
+    __slots__ = ("asset", "kind", "side", "size", "price", "mid", "notional", "fee_pct")
+
+    def __init__(self, asset: str, kind: int, is_buy: bool, size: float, price: float,
+                 mid: float, fee_pct: float = 0.0):
+        self.asset = asset
+        self.kind = kind
+        self.side = 1 if is_buy else -1
+        self.size = size
+        self.price = price
+        self.mid = mid
+        self.notional = size * price
+        self.fee_pct = fee_pct
+
+# =============================================================================
+# DICTIONNAIRE D'ACTIFS
+# =============================================================================
+
+class AssetDictionary:
+    """Encodage nom d'actif <-> id entier, persistant par wallet (append-only)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        try:
+            with open(path, "r") as f:
+                self.names = json.load(f)
+        except (OSError, ValueError):
+            self.names = []
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+    def id_for(self, name: str) -> int:
+        asset_id = self.ids.get(name)
+        if asset_id is None:
+            asset_id = len(self.names)
+            self.names.append(name)
+            self.ids[name] = asset_id
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.names, f)
+            os.replace(tmp, self.path)
+        return asset_id
+
+# =============================================================================
+# ÉCRITURE
+# =============================================================================
+
+class _Partition:
+    """Fichiers ouverts (mode append) d'une partition wallet/jour"""
+
+    def __init__(self, directory: str, columns: Dict[str, str] = COLUMNS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.files = {name: open(os.path.join(directory, f"{name}.col"), "ab") for name in columns}
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+
+
+class SnapshotWriter:
+    """Écrit les lignes de chaque cycle dans la partition wallet/jour courante"""
+
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR):
+        self.root = root
+        self._partitions: Dict[Tuple[int, str], Tuple[str, _Partition]] = {}
+        self._dictionaries: Dict[int, AssetDictionary] = {}
+
+    def _partition(self, wallet_id: int, day: str, table: str = "") -> _Partition:
+        current = self._partitions.get((wallet_id, table))
+        if current is not None and current[0] == day:
+            return current[1]
+        if current is not None:
+            current[1].close()
+        partition = _Partition(os.path.join(self.root, f"wallet_{wallet_id}", day, table), TABLES[table])
+        self._partitions[(wallet_id, table)] = (day, partition)
+        return partition
+
+    def _dictionary(self, wallet_id: int) -> AssetDictionary:
+        dictionary = self._dictionaries.get(wallet_id)
+        if dictionary is None:
+            os.makedirs(os.path.join(self.root, f"wallet_{wallet_id}"), exist_ok=True)
+            dictionary = AssetDictionary(os.path.join(self.root, f"wallet_{wallet_id}", "assets.json"))
+            self._dictionaries[wallet_id] = dictionary
+        return dictionary
+
+    def append(self, wallet_id: int, rows: List[SnapshotRow], ts: Optional[float] = None) -> float:
+        """Ajoute les lignes d'un cycle ; retourne la durée d'écriture en secondes"""
+        if not rows:
+            return 0.0
+        start = time.perf_counter()
+        ts = time.time() if ts is None else ts
+        dictionary = self._dictionary(wallet_id)
+        partition = self._partition(wallet_id, _day(ts))
+
+        columns = {name: array(code) for name, code in COLUMNS.items()}
+        for row in rows:
+            columns["ts"].append(ts)
+            columns["asset"].append(dictionary.id_for(row.asset))
+            columns["kind"].append(row.kind)
+            for field in FLOAT_FIELDS:
+                columns[field].append(getattr(row, field))
+        for name, values in columns.items():
+            f = partition.files[name]
+            values.tofile(f)
+            f.flush()
+        return time.perf_counter() - start
+
+    def append_fills(self, wallet_id: int, fills: List[FillRow], ts: Optional[float] = None) -> None:
+        """Ajoute les ordres exécutés d'un cycle"""
+        if not fills:
+            return
+        ts = time.time() if ts is None else ts
+        dictionary = self._dictionary(wallet_id)
+        partition = self._partition(wallet_id, _day(ts), FILLS_TABLE)
+
+        columns = {name: array(code) for name, code in FILL_COLUMNS.items()}
+        for fill in fills:
+            columns["ts"].append(ts)
+            columns["asset"].append(dictionary.id_for(fill.asset))
+            columns["kind"].append(fill.kind)
+            columns["side"].append(fill.side)
+            for field in FILL_FLOAT_FIELDS:
+                columns[field].append(getattr(fill, field))
+        for name, values in columns.items():
+            f = partition.files[name]
+            values.tofile(f)
+            f.flush()
+
+    def close(self) -> None:
+        for _day_name, partition in self._partitions.values():
+            partition.close()
+        self._partitions.clear()
+
+# =============================================================================
+# LECTURE
+# =============================================================================
+
+def _read_column(directory: str, name: str, columns: Dict[str, str] = COLUMNS) -> array:
+    values = array(columns[name])
+    path = os.path.join(directory, f"{name}.col")
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            values.fromfile(f, size // values.itemsize)
+    except OSError:
+        pass
+    return values
+
+
+class SnapshotStore:
+    """Lecture des partitions : requêtes par wallet, actif, champ et plage de temps"""
+
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR):
+        self.root = root
+
+    def wallets(self) -> List[int]:
+        try:
+            entries = os.listdir(self.root)
+        except OSError:
+            return []
+        return sorted(int(e.split("_", 1)[1]) for e in entries if e.startswith("wallet_") and e.split("_", 1)[1].isdigit())
+
+    def assets(self, wallet_id: int) -> List[str]:
+        return AssetDictionary(os.path.join(self.root, f"wallet_{wallet_id}", "assets.json")).names
+
+    def days(self, wallet_id: int, start_ts: float = 0.0, end_ts: Optional[float] = None) -> List[str]:
+        directory = os.path.join(self.root, f"wallet_{wallet_id}")
+        try:
+            entries = sorted(e for e in os.listdir(directory) if os.path.isdir(os.path.join(directory, e)))
+        except OSError:
+            return []
+        first = _day(start_ts)
+        last = _day(end_ts if end_ts is not None else time.time())
+        return [d for d in entries if first <= d <= last]
+
+    def partition_dir(self, wallet_id: int, day: str, table: str = "") -> str:
+        return os.path.join(self.root, f"wallet_{wallet_id}", day, table)
+
+    def read_partition(self, wallet_id: int, day: str, fields: Iterable[str],
+                       start_ts: float = 0.0, end_ts: Optional[float] = None,
+                       table: str = "") -> Dict[str, array]:
+        """
+        Colonnes brutes d'une partition (table des snapshots ou FILLS_TABLE) restreintes
+        à [start_ts, end_ts]. Les colonnes sont tronquées à la longueur minimale (écriture interrompue).
+        """
+        directory = self.partition_dir(wallet_id, day, table)
+        names = ["ts"] + [f for f in fields if f != "ts"]
+        columns = {name: _read_column(directory, name, TABLES[table]) for name in names}
+        length = min(len(c) for c in columns.values())
+        ts = columns["ts"]
+        lo = bisect_left(ts, start_ts, 0, length)
+        hi = bisect_right(ts, end_ts, lo, length) if end_ts is not None else length
+        return {name: values[lo:hi] for name, values in columns.items()}
+
+    def query(self, wallet_id: int, asset: str, fields: Iterable[str] = ("deviation",),
+              start_ts: float = 0.0, end_ts: Optional[float] = None,
+              kind: Optional[int] = None) -> Dict[str, List[float]]:
+        """Série temporelle d'un actif : {"ts": [...], field: [...]} sur la plage demandée"""
+        fields = list(fields)
+        result: Dict[str, List[float]] = {name: [] for name in ["ts"] + fields}
+        dictionary = AssetDictionary(os.path.join(self.root, f"wallet_{wallet_id}", "assets.json"))
+        asset_id = dictionary.ids.get(asset)
+        if asset_id is None:
+            return result
+        wanted = ["asset"] + (["kind"] if kind is not None else []) + fields
+        for day in self.days(wallet_id, start_ts, end_ts):
+            columns = self.read_partition(wallet_id, day, wanted, start_ts, end_ts)
+            assets = columns["asset"]
+            kinds = columns.get("kind")
+            for i, row_asset in enumerate(assets):
+                if row_asset != asset_id or (kinds is not None and kinds[i] != kind):
+                    continue
+                for name in result:
+                    result[name].append(columns[name][i])
+        return result
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Requête sur l'historique des cycles")
+    parser.add_argument("--dir", default=DEFAULT_SNAPSHOT_DIR, help="Répertoire des snapshots")
+    parser.add_argument("--wallet", type=int, required=True, help="ID du wallet")
+    parser.add_argument("--asset", help="Actif (ex: BTC, flx:TSLA) ; sans --asset liste les actifs")
+    parser.add_argument("--field", default="deviation", help=f"Champ(s) séparés par des virgules : {', '.join(FLOAT_FIELDS)}")
+    parser.add_argument("--kind", choices=sorted(KIND_NAMES), help="Filtrer spot / perp")
+    parser.add_argument("--days", type=float, default=1, help="Fenêtre en jours (depuis maintenant)")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.dir)
+    if not args.asset:
+        print(f"Actifs enregistrés pour le wallet {args.wallet}: {', '.join(store.assets(args.wallet)) or 'aucun'}")
+        return
+
+    fields = [f.strip() for f in args.field.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in FLOAT_FIELDS]
+    if unknown:
+        print(f"❌ Champ(s) inconnu(s): {', '.join(unknown)}")
+        return
+
+    end_ts = time.time()
+    start_ts = end_ts - timedelta(days=args.days).total_seconds()
+    series = store.query(args.wallet, args.asset, fields, start_ts, end_ts,
+                         KIND_NAMES[args.kind] if args.kind else None)
+    if not series["ts"]:
+        print(f"Aucune donnée pour {args.asset} (wallet {args.wallet}) sur {args.days:g} jour(s)")
+        return
+
+    print(f"{'date':<20}" + "".join(f"{f:>14}" for f in fields))
+    for i, ts in enumerate(series["ts"]):
+        stamp = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{stamp:<20}" + "".join(f"{series[f][i]:>14.4f}" for f in fields))
+    for f in fields:
+        values = series[f]
+        print(f"{f}: n={len(values)} min={min(values):.4f} max={max(values):.4f} moy={sum(values) / len(values):.4f}")
+
+if __name__ == "__main__":
+    main()
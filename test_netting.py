@@ -0,0 +1,99 @@
+"""Compensation des ordres entre wallets et règlements en cours (python -m pytest)"""
+
+from dispatch import OrderCandidate
+from snapshot_store import KIND_SPOT
+from netting import match_candidates, apply_matches, SkipLimiter, MIN_ORDER_NOTIONAL
+from order_tracker import InFlightTable, SETTLE_QUOTE_DUE, SETTLE_TOKENS_SENT
+
+
+def _candidate(wallet_id, is_buy, size, price=10.0, asset="HYPE"):
+    order = {"kind": KIND_SPOT, "coin": f"@{asset}", "asset": asset, "is_buy": is_buy,
+             "size_tokens": size, "price": price, "label": f"W{wallet_id} {asset}"}
+    return OrderCandidate(wallet_id, asset, 5.0, 5.0, order)
+
+
+def test_match_pairs_largest_sell_with_largest_buy_across_wallets():
+    sell = _candidate(1, False, 10.0)
+    small_buy = _candidate(2, True, 3.0)
+    big_buy = _candidate(3, True, 5.0)
+    own_buy = _candidate(1, True, 4.0)
+    other = _candidate(4, True, 2.0, asset="PURR")
+
+    matches, by_asset = match_candidates([sell, small_buy, big_buy, own_buy, other])
+
+    assert [(m.seller.wallet_id, m.buyer.wallet_id, m.size_tokens) for m in matches] == [(1, 3, 5.0), (1, 2, 3.0)]
+    assert all(m.price == 10.0 for m in matches)
+    assert by_asset[(KIND_SPOT, "@HYPE")].sell_usd == 100.0
+    assert by_asset[(KIND_SPOT, "@HYPE")].buy_usd == 120.0
+
+
+def test_apply_keeps_unsettled_pairs_and_residual_sizes():
+    sell = _candidate(1, False, 10.0)
+    buy_a = _candidate(2, True, 5.0)
+    buy_b = _candidate(3, True, 3.0)
+    candidates = [sell, buy_a, buy_b]
+    matches, by_asset = match_candidates(candidates)
+
+    # Seule la première paire est réglée : W3 part en entier, W1 avec son reliquat
+    kept = apply_matches(candidates, matches[:1], by_asset)
+
+    assert [(c.wallet_id, c.order["size_tokens"]) for c in kept] == [(1, 5.0), (3, 3.0)]
+    assert kept[1] is buy_b
+    assert sell.order["size_tokens"] == 10.0
+    assert by_asset[(KIND_SPOT, "@HYPE")].netted_usd == 50.0
+
+
+def test_apply_drops_residual_below_min_notional():
+    sell = _candidate(1, False, 5.5)
+    buy = _candidate(2, True, 5.0)
+    matches, by_asset = match_candidates([sell, buy])
+
+    kept = apply_matches([sell, buy], matches, by_asset)
+
+    assert 0.5 * 10.0 < MIN_ORDER_NOTIONAL
+    assert kept == []
+
+
+def test_skip_limiter_releases_pair_after_consecutive_ticks():
+    matches, _ = match_candidates([_candidate(1, False, 5.0), _candidate(2, True, 5.0)])
+    limiter = SkipLimiter(2)
+
+    allowed = []
+    for _ in range(4):
+        allowed.append(limiter.allow(matches[0]))
+        limiter.end_tick()
+
+    assert allowed == [True, True, False, True]
+
+
+def test_skip_limiter_only_counts_consecutive_ticks():
+    matches, _ = match_candidates([_candidate(1, False, 5.0), _candidate(2, True, 5.0)])
+    limiter = SkipLimiter(1)
+
+    assert limiter.allow(matches[0])
+    limiter.end_tick()
+    limiter.end_tick()  # paire absente de ce cycle : compteur oublié
+    assert limiter.allow(matches[0])
+
+
+def test_pending_settlement_survives_restart(tmp_path):
+    path = str(tmp_path / "inflight.json")
+    table = InFlightTable(path)
+    pending = table.begin_settlement(1, 2, "0xseller", "0xbuyer", "HYPE", "USDC", 5.0, 50.0)
+    table.update_settlement(pending, SETTLE_QUOTE_DUE)
+
+    reloaded = InFlightTable(path).settlements()
+    assert len(reloaded) == 1
+    assert reloaded[0].state == SETTLE_QUOTE_DUE and not reloaded[0].needs_review
+    assert (reloaded[0].seller_address, reloaded[0].amount) == ("0xseller", 50.0)
+
+    table.end_settlement(pending)
+    assert InFlightTable(path).settlements() == []
+
+
+def test_settlement_without_answer_needs_review(tmp_path):
+    path = str(tmp_path / "inflight.json")
+    InFlightTable(path).begin_settlement(1, 2, "0xseller", "0xbuyer", "HYPE", "USDC", 5.0, 50.0)
+
+    pending = InFlightTable(path).settlements()[0]
+    assert pending.state == SETTLE_TOKENS_SENT and pending.needs_review
@@ -0,0 +1,80 @@
+"""Arrondis des specs d'ordres (taille, prix) et noms envoyés au SDK (python -m pytest)"""
+
+import pytest
+
+from order_specs import OrderSpec, compile_order_specs
+
+
+@pytest.mark.parametrize("sz_decimals, size, expected", [
+    (3, 0.12345, 0.123),
+    (3, 1.0005, 1.0),           # égalité : au pair (ROUND_HALF_EVEN)
+    (3, 1.0015, 1.002),
+    (0, 2.5, 2.0),
+    (0, 3.5, 4.0),
+    (5, 0.000015, 0.00002),
+    (2, 0.1 + 0.2, 0.3),        # bruit flottant (0.30000000000000004)
+    (2, 1e-3, 0.0),
+])
+def test_quantize_size(sz_decimals, size, expected):
+    spec = OrderSpec.build("X", 0, sz_decimals, False, "USDC")
+    assert spec.quantize_size(size) == expected
+
+
+@pytest.mark.parametrize("is_spot, sz_decimals, price, expected", [
+    # Perps : 5 chiffres significatifs, au plus 6 - szDecimals décimales
+    (False, 5, 97123.456, 97123.0),
+    (False, 5, 97123.5, 97124.0),       # égalité : au pair
+    (False, 0, 1.234567, 1.2346),
+    (False, 0, 1.00005, 1.0),           # égalité : au pair
+    (False, 0, 1.00015, 1.0002),
+    (False, 2, 25.123456, 25.123),
+    (False, 4, 0.0123456, 0.01),        # le tick (2 décimales) l'emporte sur les chiffres significatifs
+    (False, 6, 3.7, 4.0),               # szDecimals = 6 : prix entiers uniquement
+    (False, 7, 3.2, 3.0),
+    (False, 0, 123456.7, 123457.0),     # prix entier toujours valide, même au-delà de 5 chiffres
+    # Spot : au plus 8 - szDecimals décimales
+    (True, 0, 0.000123456, 0.00012346),
+    (True, 2, 0.000123456, 0.000123),
+    (True, 2, 1.23456, 1.2346),
+    (True, 0, 0.0, 0.0),
+    (True, 0, -1.5, -1.5),
+])
+def test_quantize_price(is_spot, sz_decimals, price, expected):
+    spec = OrderSpec.build("X", 0, sz_decimals, is_spot, "USDC")
+    assert spec.quantize_price(price) == expected
+
+
+def test_quantized_price_has_at_most_five_significant_figures():
+    spec = OrderSpec.build("X", 0, 1, False, "USDC")
+    for price in (0.987654321, 9.87654321, 98.7654321, 987.654321, 9876.54321):
+        digits = repr(spec.quantize_price(price)).replace(".", "").lstrip("0")
+        assert len(digits) <= 5
+
+
+class FakeInfo:
+    """Champs de hyperliquid.info.Info lus par compile_order_specs"""
+
+    def __init__(self):
+        self.coin_to_asset = {"BTC": 0, "PURR/USDC": 10000, "@1": 10001, "flx:TSLA": 110000}
+        self.asset_to_sz_decimals = {0: 5, 10000: 0, 10001: 2, 110000: 3}
+
+
+SPOT_META = {
+    "tokens": [{"index": 0, "name": "USDC"}, {"index": 1, "name": "PURR"}, {"index": 2, "name": "HYPE"},
+               {"index": 3, "name": "USDH"}],
+    "universe": [{"name": "PURR/USDC", "tokens": [1, 0]}, {"name": "@1", "tokens": [2, 3]}],
+}
+
+
+def test_compile_maps_spot_pairs_hip3_and_main_names():
+    specs = compile_order_specs(FakeInfo(), SPOT_META, lambda dex: {"flx": "USDH"}.get(dex, "USDC"))
+
+    assert specs["BTC"] == OrderSpec.build("BTC", 0, 5, False, "USDC")
+    # Paire spot nommée : indexée par son nom SDK et par "@index"
+    assert specs["@0"] is specs["PURR/USDC"]
+    assert (specs["@0"].coin, specs["@0"].is_spot, specs["@0"].quote_asset) == ("PURR/USDC", True, "USDC")
+    assert (specs["@1"].coin, specs["@1"].quote_asset, specs["@1"].sz_decimals) == ("@1", "USDH", 2)
+    # HIP-3 : nom "dex:ASSET" envoyé tel quel, quote du DEX
+    assert (specs["flx:TSLA"].coin, specs["flx:TSLA"].is_spot, specs["flx:TSLA"].quote_asset) == \
+        ("flx:TSLA", False, "USDH")
+    assert specs["flx:TSLA"].tick_quantum == OrderSpec.build("flx:TSLA", 110000, 3, False, "USDH").tick_quantum
@@ -0,0 +1,47 @@
+"""Cache de positions : application des exécutions perp du flux (python -m pytest)"""
+
+import time
+
+from market_state import PerpPosition
+from position_cache import PositionCache, RECONCILE_OVERLAP_MS
+
+
+def _fill(side, sz, px, start, tid, time_ms, closed_pnl="0.0"):
+    return {"coin": "BTC", "side": side, "sz": str(sz), "px": str(px), "startPosition": str(start),
+            "closedPnl": closed_pnl, "fee": "0.0", "feeToken": "USDC", "time": time_ms, "tid": tid, "oid": tid}
+
+
+def test_close_at_other_price_moves_quote_by_realized_pnl():
+    fetched_at = time.time()
+    now_ms = int(fetched_at * 1000)
+    cache = PositionCache()
+    cache.reconcile({"USDC": 1000.0}, [], fetched_at=fetched_at)
+    applied = cache.apply_fills([
+        _fill("B", 1, 100, start=0, tid=1, time_ms=now_ms + 1),
+        _fill("A", 1, 110, start=1, tid=2, time_ms=now_ms + 2, closed_pnl="10.0"),
+    ], {}, lambda dex: "USDC")
+
+    assert applied == 2
+    assert cache.is_fresh()
+    assert cache.positions[("main", "BTC")].szi == 0.0
+    # Ouverture : -100 de marge ; clôture : +110 rendus (marge + PnL réalisé de 10, compté une seule fois)
+    assert abs(cache.balances["USDC"] - 1010.0) < 1e-9
+
+
+def test_fills_around_reconcile_are_applied_once():
+    fetched_at = time.time()
+    now_ms = int(fetched_at * 1000)
+    cache = PositionCache()
+    # L'état récupéré inclut déjà l'achat tid 1, exécuté juste avant le lancement de la récupération
+    cache.reconcile({"USDC": 900.0}, [PerpPosition("main", "BTC", 1.0, 100.0, 0.0)], fetched_at=fetched_at)
+    assert cache.last_fill_ms == now_ms - RECONCILE_OVERLAP_MS
+
+    applied = cache.apply_fills([
+        _fill("B", 1, 100, start=0, tid=1, time_ms=now_ms - 200),
+        _fill("B", 1, 120, start=1, tid=5, time_ms=now_ms + 300),
+    ], {}, lambda dex: "USDC")
+
+    assert applied == 1
+    assert cache.is_fresh()
+    assert cache.positions[("main", "BTC")].szi == 2.0
+    assert abs(cache.balances["USDC"] - 780.0) < 1e-9
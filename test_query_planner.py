@@ -0,0 +1,139 @@
+"""Planificateur de requêtes : batchs clearinghouseState multi-utilisateurs (python -m pytest)"""
+
+import time
+
+import requests
+
+from circuit_breaker import BreakerBoard
+from query_planner import (
+    CyclePlan, LastGoodCache, UserStateBatcher, WalletPlan, ALL_MIDS, execute_plan, perp_state_query,
+    spot_state_query,
+)
+
+
+class FakeInfo:
+    """Endpoint info local : états marqués par utilisateur, pannes du type batch à la demande"""
+
+    def __init__(self, batch_error=None, batch_response=None):
+        self.batch_error = batch_error
+        self.batch_response = batch_response
+        self.payloads = []
+
+    def post(self, payload):
+        self.payloads.append(payload)
+        if payload["type"] == UserStateBatcher.BATCH_TYPE:
+            if self.batch_error is not None:
+                raise self.batch_error
+            if self.batch_response is not None:
+                return self.batch_response
+            return [{"user": user, "dex": payload.get("dex", "")} for user in payload["users"]]
+        if payload["type"] == "clearinghouseState":
+            return {"user": payload["user"], "dex": payload.get("dex", "")}
+        if payload["type"] == "allMids":
+            return {"BTC": "100.0"}
+        return {"user": payload.get("user")}
+
+    def count(self, type_):
+        return sum(1 for p in self.payloads if p["type"] == type_)
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(f"{status}", response=response)
+
+
+def _plan(users, dexs=("",)):
+    plans = []
+    for i, user in enumerate(users):
+        plan = WalletPlan(i + 1, user)
+        plan.needs_mids = True
+        plan.spot_state = spot_state_query(user)
+        plan.perp_states = {dex: perp_state_query(user, dex) for dex in dexs}
+        plans.append(plan)
+    return CyclePlan(plans)
+
+
+def test_split_groups_by_dex_in_chunks_of_max_users():
+    users = [f"0x{i}" for i in range(5)]
+    queries = [perp_state_query(u, "") for u in users] + [perp_state_query(users[0], "flx"), spot_state_query(users[0])]
+
+    chunks, remaining = UserStateBatcher(max_users=2).split(queries)
+
+    assert [(dex, [q.user for q in chunk]) for dex, chunk in chunks] == [
+        ("", ["0x0", "0x1"]), ("", ["0x2", "0x3"]), ("", ["0x4"]),
+    ]
+    # Un seul utilisateur sur flx : requête individuelle, comme les états spot
+    assert remaining == [spot_state_query(users[0]), perp_state_query(users[0], "flx")]
+
+
+def test_batch_results_are_routed_back_to_each_wallet():
+    users = [f"0x{i}" for i in range(5)]
+    info = FakeInfo()
+
+    data = execute_plan(_plan(users, dexs=("", "flx")), info.post, max_workers=4,
+                        batcher=UserStateBatcher(max_users=3))
+
+    for user in users:
+        for dex in ("", "flx"):
+            assert data.get(perp_state_query(user, dex)) == {"user": user, "dex": dex}
+    assert info.count(UserStateBatcher.BATCH_TYPE) == 4
+    assert info.count("clearinghouseState") == 0
+    assert data.get(ALL_MIDS) == {"BTC": "100.0"}
+
+
+def test_refused_batch_type_falls_back_to_single_queries():
+    users = ["0xa", "0xb", "0xc"]
+    info = FakeInfo(batch_error=_http_error(422))
+    batcher = UserStateBatcher()
+
+    data = execute_plan(_plan(users), info.post, batcher=batcher)
+
+    assert batcher.supported is False
+    assert info.count("clearinghouseState") == 3
+    assert all(data.get(perp_state_query(u, "")) == {"user": u, "dex": ""} for u in users)
+    # Type désactivé : plus de tentative de batch aux cycles suivants
+    execute_plan(_plan(users), info.post, batcher=batcher)
+    assert info.count(UserStateBatcher.BATCH_TYPE) == 1
+
+
+def test_unexpected_batch_response_falls_back_to_single_queries():
+    users = ["0xa", "0xb"]
+    info = FakeInfo(batch_response=[{"user": "0xa"}])
+    batcher = UserStateBatcher()
+
+    data = execute_plan(_plan(users), info.post, batcher=batcher)
+
+    assert batcher.supported is False
+    assert all(data.get(perp_state_query(u, "")) == {"user": u, "dex": ""} for u in users)
+
+
+def test_endpoint_failure_fails_the_chunk_without_single_retries():
+    users = ["0xa", "0xb", "0xc"]
+    last_good = LastGoodCache()
+    last_good.put(perp_state_query("0xa", ""), {"user": "0xa", "cached": True})
+    info = FakeInfo(batch_error=_http_error(503))
+    batcher = UserStateBatcher()
+
+    data = execute_plan(_plan(users), info.post, breakers=BreakerBoard(), last_good=last_good,
+                        max_stale_seconds=60, batcher=batcher)
+
+    assert info.count("clearinghouseState") == 0
+    assert batcher.supported is None
+    assert data.get(perp_state_query("0xa", "")) == {"user": "0xa", "cached": True}
+    assert perp_state_query("0xa", "") in data.stale
+    assert set(data.missing_for(perp_state_query(u, "") for u in users)) == {
+        perp_state_query("0xb", ""), perp_state_query("0xc", ""),
+    }
+
+
+def test_timeout_under_deadline_serves_every_query_of_the_chunk():
+    users = ["0xa", "0xb"]
+    info = FakeInfo(batch_error=requests.exceptions.Timeout("lent"))
+
+    data = execute_plan(_plan(users), info.post, max_workers=2, batcher=UserStateBatcher(),
+                        deadline=time.monotonic() + 5)
+
+    assert info.count("clearinghouseState") == 0
+    assert all(isinstance(data.errors[perp_state_query(u, "")], requests.exceptions.Timeout) for u in users)
+    assert data.get(spot_state_query("0xa")) == {"user": "0xa"}